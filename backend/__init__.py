@@ -1,6 +1,14 @@
 __version__ = "0.1"
-from .main import app
 
 __all__ = [
     "app"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    # 延迟导入FastAPI应用：导入backend下的任意子模块时不再连带初始化数据库、加载API密钥等，
+    # 命令行工具与MCP服务只加载实际用到的模块
+    if name == "app":
+        from .main import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,150 @@
+"""
+SQLite并发写入基准测试
+模拟多个抽取任务并发写入进度，同时有查询任务状态的读请求，对比：
+- legacy：每次操作新建连接并关闭，默认回滚日志模式（原api_key_db的访问方式）
+- pooled：线程内复用连接，WAL模式、busy_timeout、synchronous=NORMAL（database.get_db_connection）
+- batched：在pooled基础上每个事务批量提交多条进度
+
+用法：
+    python -m backend.benchmark.db_benchmark --threads 8 --updates 300
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.database import init_db, task_db
+
+MODES = ("legacy", "pooled", "batched")
+
+
+def _legacy_update(path: str, task_id: str, progress: int, message: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE tasks SET progress = ?, message = ? WHERE task_id = ?", (progress, message, task_id))
+    conn.commit()
+    conn.close()
+
+
+def _legacy_read(path: str, task_id: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+    conn.close()
+
+
+def run_mode(mode: str, threads: int, updates: int, readers: int, batch: int) -> Dict:
+    """
+    在独立的临时数据库上执行一种访问方式
+
+    Returns:
+        Dict: 吞吐、写入时延分位数与错误数
+    """
+    directory = tempfile.mkdtemp(prefix="db_bench_")
+    path = os.path.join(directory, "bench.db")
+    init_db.DB_PATH = path
+    task_ids = [f"task-{i}" for i in range(threads)]
+    if mode == "legacy":
+        # 建表后切回默认的回滚日志模式
+        init_db.get_db_connection().execute("PRAGMA journal_mode = DELETE")
+        init_db.close_db_connection()
+    for task_id in task_ids:
+        task_db.upsert_task(task_id, {"status": "processing", "progress": 0, "message": "", "filename": task_id})
+    init_db.close_db_connection()
+
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def writer(task_id: str) -> None:
+        local_latencies = []
+        pending = []
+        for i in range(updates):
+            start = time.perf_counter()
+            try:
+                if mode == "legacy":
+                    _legacy_update(path, task_id, i, f"第{i}步")
+                elif mode == "pooled":
+                    if not task_db.update_progress(task_id, i, f"第{i}步"):
+                        raise RuntimeError("update failed")
+                else:
+                    pending.append((task_id, i, f"第{i}步", None))
+                    if len(pending) >= batch or i == updates - 1:
+                        if not task_db.update_progress_batch(pending):
+                            raise RuntimeError("update failed")
+                        pending = []
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            local_latencies.append(time.perf_counter() - start)
+        init_db.close_db_connection()
+        with lock:
+            latencies.extend(local_latencies)
+
+    def reader() -> None:
+        i = 0
+        while not stop.is_set():
+            task_id = task_ids[i % len(task_ids)]
+            try:
+                if mode == "legacy":
+                    _legacy_read(path, task_id)
+                else:
+                    task_db.query_task(task_id)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+            i += 1
+        init_db.close_db_connection()
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer, args=(task_id,)) for task_id in task_ids]
+    wall_start = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    wall_time = time.perf_counter() - wall_start
+    stop.set()
+    for thread in reader_threads:
+        thread.join()
+    init_db.close_db_connection()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    latencies.sort()
+    total = threads * updates
+    return {
+        "mode": mode,
+        "writes": total,
+        "wall_time": round(wall_time, 3),
+        "writes_per_sec": round(total / wall_time, 1) if wall_time else None,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+        "errors": errors[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite并发进度写入基准测试")
+    parser.add_argument("--threads", type=int, default=8, help="并发写入的任务数")
+    parser.add_argument("--updates", type=int, default=300, help="每个任务写入的进度条数")
+    parser.add_argument("--readers", type=int, default=2, help="并发读取任务状态的线程数")
+    parser.add_argument("--batch", type=int, default=20, help="batched模式下每个事务的进度条数")
+    parser.add_argument("--modes", default=",".join(MODES), help="逗号分隔的访问方式")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'writes':>8}{'wall(s)':>10}{'writes/s':>12}{'p50(ms)':>10}{'p99(ms)':>10}{'errors':>8}")
+    for mode in args.modes.split(","):
+        result = run_mode(mode.strip(), args.threads, args.updates, args.readers, args.batch)
+        print(f"{result['mode']:<10}{result['writes']:>8}{result['wall_time']:>10}{result['writes_per_sec']:>12}"
+              f"{result['p50_ms']:>10}{result['p99_ms']:>10}{result['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
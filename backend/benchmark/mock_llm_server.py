@@ -0,0 +1,340 @@
+"""
+本地OpenAI兼容的模拟大模型服务
+按提示词识别抽取阶段并生成结构合法的模拟输出，以SSE流式返回，
+支持配置首token时延、生成速度、错误注入以及按提示词回放已记录的响应
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+# 各阶段提示词中的特征文本，按顺序匹配
+STAGE_MARKERS = (
+    ("judge_batch", "批量判断"),
+    ("core", "==临床问题=="),
+    ("layout", "文档分割类别"),
+    ("segmentation", "细粒度分割"),
+    ("edge", "非核心内容进行知识抽取"),
+    ("judge", "医疗指南分析助手"),
+)
+
+# 布局分析各部分的起始关键词
+LAYOUT_SECTIONS = (
+    ("evidence", ("证据质量", "推荐强度", "证据等级")),
+    ("core", ("临床问题",)),
+    ("other", ("利益冲突", "项目组成员", "致谢")),
+    ("reference", ("参考文献",)),
+)
+
+MISSING_SECTION = "该部分内容不存在"
+
+
+def prompt_key(prompt: str) -> str:
+    """提示词摘要，用于匹配回放记录"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def detect_stage(prompt: str) -> str:
+    for stage, marker in STAGE_MARKERS:
+        if marker in prompt:
+            return stage
+    return "unknown"
+
+
+def _payload(prompt: str, marker: str) -> str:
+    """截取提示词中marker之后的待处理文本"""
+    index = prompt.rfind(marker)
+    return prompt[index + len(marker):].strip() if index >= 0 else prompt
+
+
+def _split_layout(text: str) -> Dict[str, str]:
+    positions = []
+    for section, keywords in LAYOUT_SECTIONS:
+        found = [text.find(keyword) for keyword in keywords if text.find(keyword) >= 0]
+        if found:
+            positions.append((min(found), section))
+    positions.sort()
+    result = {"base": MISSING_SECTION, "evidence": MISSING_SECTION, "core": MISSING_SECTION,
+              "other": MISSING_SECTION, "reference": MISSING_SECTION}
+    start = 0
+    current = "base"
+    for position, section in positions:
+        if position > start and text[start:position].strip():
+            result[current] = text[start:position].strip()
+        start, current = position, section
+    if text[start:].strip():
+        result[current] = text[start:].strip()
+    return result
+
+
+def _split_atoms(text: str) -> List[str]:
+    starts = [m.start() for m in re.finditer(r"临床问题\s*\d+", text)]
+    if not starts:
+        return [text] if text.strip() else []
+    bounds = starts + [len(text)]
+    return [text[bounds[i]:bounds[i + 1]].strip() for i in range(len(starts))]
+
+
+def _rows(text: str, entity_tag: str, value_tag: str, level: int, limit: int = 200) -> str:
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    if not lines:
+        return ""
+    entity = lines[0][:30]
+    rows = [f"{entity}\t描述\t{line}\t{entity_tag}\t{value_tag}\t{level}" for line in lines[1:limit + 1]]
+    return "\n".join(rows)
+
+
+def synthesize(prompt: str) -> str:
+    """
+    根据提示词生成结构合法的模拟输出
+
+    Args:
+        prompt: 提示词
+
+    Returns:
+        str: 模拟的大模型输出
+    """
+    stage = detect_stage(prompt)
+    if stage == "layout":
+        return json.dumps(_split_layout(_payload(prompt, "待分割的文本：")), ensure_ascii=False)
+    if stage == "segmentation":
+        atoms = _split_atoms(_payload(prompt, "待分割的文本："))
+        return json.dumps({"total": len(atoms), "atom": atoms}, ensure_ascii=False)
+    if stage == "core":
+        return _rows(_payload(prompt, "==临床问题=="), "临床问题", "推荐意见", 3)
+    if stage == "edge":
+        return _rows(_payload(prompt, "待抽取的文本："), "临床实践指南", "Literal", 1)
+    if stage == "judge":
+        return "True"
+    if stage == "judge_batch":
+        # 按编号切分各段文本，含指南常用词汇的判为true
+        items = re.split(r"^\s*\[\d+\]\s*$", _payload(prompt, "待判断的文本："), flags=re.M)[1:]
+        return json.dumps([any(word in item for word in ("推荐", "指南", "证据")) for item in items])
+    return ""
+
+
+def _tokenize(content: str, chars_per_token: int = 2) -> List[str]:
+    return [content[i:i + chars_per_token] for i in range(0, len(content), chars_per_token)]
+
+
+class MockLLMServer:
+    """模拟大模型服务"""
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 ttft: float = 0.05,
+                 tokens_per_sec: float = 2000.0,
+                 error_rate: float = 0.0,
+                 error_status: int = 503,
+                 replay: Optional[Dict[str, object]] = None,
+                 seed: Optional[int] = None,
+                 replay_speed: float = 1.0):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示随机空闲端口
+            ttft: 首token时延(秒)
+            tokens_per_sec: 生成速度(token/秒)，不大于0时不限速
+            error_rate: 错误注入概率
+            error_status: 注入错误时返回的HTTP状态码
+            replay: 提示词摘要到响应内容或调用记录的映射，命中时优先回放
+            seed: 错误注入随机种子
+            replay_speed: 调用记录的回放速度倍率，1为原速，0为不等待
+        """
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.replay = replay or {}
+        self.replay_speed = replay_speed
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.request_count = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def should_fail(self) -> bool:
+        with self._random_lock:
+            self.request_count += 1
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def respond(self, prompt: str) -> object:
+        return self.replay.get(prompt_key(prompt)) or synthesize(prompt)
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: Dict) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": {"message": "invalid json"}})
+                    return
+                if server.should_fail():
+                    self._send_json(server.error_status, {"error": {"message": "injected error"}})
+                    return
+                messages = request.get("messages") or [{}]
+                prompt = messages[-1].get("content", "")
+                content = server.respond(prompt)
+                if isinstance(content, dict):
+                    self._replay_transcript(content)
+                    return
+                prompt_tokens = len(prompt)
+                tokens = _tokenize(content)
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                         "total_tokens": prompt_tokens + len(tokens)}
+                if not request.get("stream"):
+                    time.sleep(server.ttft)
+                    self._send_json(200, {"choices": [{"message": {"role": "assistant", "content": content}}],
+                                          "usage": usage})
+                    return
+                self._stream(tokens, usage, (request.get("stream_options") or {}).get("include_usage"))
+
+            def _stream(self, tokens: List[str], usage: Dict, include_usage: bool) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                interval = 1.0 / server.tokens_per_sec if server.tokens_per_sec > 0 else 0.0
+                try:
+                    time.sleep(server.ttft)
+                    for token in tokens:
+                        chunk = {"choices": [{"index": 0, "delta": {"content": token}}]}
+                        self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                        if interval:
+                            self.wfile.flush()
+                            time.sleep(interval)
+                    if include_usage:
+                        chunk = {"choices": [], "usage": usage}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _replay_transcript(self, entry: Dict) -> None:
+                """按记录的分片与到达间隔原样回放"""
+                if not entry.get("stream"):
+                    data = entry.get("body", "").encode("utf-8")
+                    if server.replay_speed > 0:
+                        time.sleep(entry.get("latency", 0) / server.replay_speed)
+                    self.send_response(entry.get("status", 200))
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    self.close_connection = True
+                    self.wfile.write(data)
+                    return
+                self.send_response(entry.get("status", 200))
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    for delay, line in entry["chunks"]:
+                        if server.replay_speed > 0 and delay > 0:
+                            time.sleep(delay / server.replay_speed)
+                        self.wfile.write(f"{line}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+
+def load_replay(path: str) -> Dict[str, object]:
+    """
+    加载回放文件，支持两种格式：
+    - JSON对象：提示词摘要到响应内容，按模拟的时延与速度输出
+    - 调用记录(JSONL，可gzip压缩，见backend.llm.transcript)：按记录的分片与到达间隔原样回放，
+      同一提示词有多条记录时取第一条
+
+    Args:
+        path: 回放文件路径
+
+    Returns:
+        Dict[str, object]: 回放映射
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        text = f.read()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        replay = {}
+        for line in text.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                replay.setdefault(entry["key"], entry)
+        return replay
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟大模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="监听端口，0表示随机空闲端口")
+    parser.add_argument("--ttft", type=float, default=0.05, help="首token时延(秒)")
+    parser.add_argument("--tps", type=float, default=2000.0, help="生成速度(token/秒)，0表示不限速")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="错误注入概率")
+    parser.add_argument("--error-status", type=int, default=503, help="注入错误时返回的HTTP状态码")
+    parser.add_argument("--replay", type=str, help="回放文件路径")
+    parser.add_argument("--seed", type=int, help="错误注入随机种子")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="调用记录的回放速度倍率，0表示不等待")
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.ttft, args.tps, args.error_rate, args.error_status,
+                           load_replay(args.replay) if args.replay else None, args.seed, args.replay_speed)
+    # 输出服务地址，供启动方读取
+    print(server.url, flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+离线性能基准测试
+启动本地模拟大模型服务，将Settings.api_url指向该服务，对样例指南文本端到端执行extract，
+统计总耗时、分阶段耗时、CPU时间与内存峰值
+
+用法：
+    python -m backend.benchmark.run_benchmark --jobs 4 --repeat 2 --quiet
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import backend.config as config
+from backend.extract_service import extract
+from backend.llm import UsageTracker
+from backend.tracing import setup_tracing
+
+SAMPLES_DIR = Path(__file__).parent / "samples"
+MOCK_SERVER_SCRIPT = Path(__file__).parent / "mock_llm_server.py"
+
+
+def start_mock_server(args) -> Tuple[subprocess.Popen, str]:
+    """
+    在子进程中启动模拟大模型服务，避免其CPU开销计入被测进程
+
+    Returns:
+        Tuple[subprocess.Popen, str]: 子进程与服务地址
+    """
+    cmd = [sys.executable, str(MOCK_SERVER_SCRIPT),
+           "--ttft", str(args.ttft),
+           "--tps", str(args.tps),
+           "--error-rate", str(args.error_rate),
+           "--error-status", str(args.error_status)]
+    if args.seed is not None:
+        cmd += ["--seed", str(args.seed)]
+    if args.replay:
+        cmd += ["--replay", args.replay, "--replay-speed", str(args.replay_speed)]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    url = process.stdout.readline().strip()
+    if not url:
+        process.kill()
+        raise RuntimeError("模拟大模型服务启动失败")
+    return process, url
+
+
+def load_samples(samples_dir: Path) -> List[Tuple[str, str]]:
+    samples = []
+    for path in sorted(samples_dir.glob("*.txt")):
+        samples.append((path.name, path.read_text(encoding="utf-8")))
+    if not samples:
+        raise FileNotFoundError(f"{samples_dir} 下没有样例文本(*.txt)")
+    return samples
+
+
+def _cpu_time() -> float:
+    if resource:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime
+    return time.process_time()
+
+
+def _max_rss_mb() -> float | None:
+    if not resource:
+        return None
+    # Linux单位为KB，macOS为字节
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024 / 1024 if sys.platform == "darwin" else max_rss / 1024
+
+
+def run_document(task_id: str, filename: str, text: str) -> Dict:
+    start_time = time.time()
+    error = None
+    rows = 0
+    try:
+        rows = len(extract(text, filename, task_id=task_id))
+    except Exception as e:
+        error = str(e)
+    return {
+        "task_id": task_id,
+        "filename": filename,
+        "wall_time": round(time.time() - start_time, 3),
+        "rows": rows,
+        "error": error,
+        "usage": UsageTracker.get_task_usage(task_id)
+    }
+
+
+def run_benchmark(args) -> Dict:
+    samples = load_samples(Path(args.samples))
+    jobs = [(f"bench-{r}-{i}", filename, text)
+            for r in range(args.repeat)
+            for i, (filename, text) in enumerate(samples)]
+
+    process, url = start_mock_server(args)
+    config.settings.api_url = url
+    # 每轮都需实际调用大模型，不使用阶段缓存
+    config.settings.stage_cache = False
+    if args.trace:
+        config.settings.trace_file = args.trace_file
+        setup_tracing(args.trace)
+    try:
+        tracemalloc.start()
+        cpu_start = _cpu_time()
+        wall_start = time.time()
+        # --quiet时屏蔽被测流程的标准输出（如STREAM_SINK=stdout时的流式内容）
+        sink = open(os.devnull, "w") if args.quiet else sys.stdout
+        with contextlib.redirect_stdout(sink):
+            with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+                documents = list(executor.map(lambda job: run_document(*job), jobs))
+        wall_time = time.time() - wall_start
+        cpu_time = _cpu_time() - cpu_start
+        _, peak_traced = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if args.quiet:
+            sink.close()
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {
+        "config": {
+            "documents": len(jobs),
+            "jobs": args.jobs,
+            "ttft": args.ttft,
+            "tokens_per_sec": args.tps,
+            "error_rate": args.error_rate
+        },
+        "wall_time": round(wall_time, 3),
+        "cpu_time": round(cpu_time, 3),
+        "cpu_utilization": round(cpu_time / wall_time, 3) if wall_time else None,
+        "peak_traced_memory_mb": round(peak_traced / 1024 / 1024, 2),
+        "max_rss_mb": round(_max_rss_mb(), 2) if resource else None,
+        "failed": sum(1 for doc in documents if doc["error"]),
+        "stages": UsageTracker.get_stage_summary(),
+        "documents": documents
+    }
+
+
+def print_report(report: Dict) -> None:
+    cfg = report["config"]
+    print(f"文档数: {cfg['documents']}  并发: {cfg['jobs']}  TTFT: {cfg['ttft']}s  "
+          f"生成速度: {cfg['tokens_per_sec']} token/s  错误注入: {cfg['error_rate']}")
+    print(f"总耗时: {report['wall_time']}s  CPU时间: {report['cpu_time']}s  "
+          f"CPU利用率: {report['cpu_utilization']}  失败: {report['failed']}")
+    print(f"内存峰值(tracemalloc): {report['peak_traced_memory_mb']}MB  最大RSS: {report['max_rss_mb']}MB")
+    print(f"{'stage':<14}{'calls':>8}{'latency(s)':>12}{'avg_ttft':>10}{'tokens':>10}{'tok/s':>10}")
+    for stage, summary in report["stages"].items():
+        print(f"{stage:<14}{summary['calls']:>8}{summary['total_latency']:>12}"
+              f"{str(summary['avg_ttft']):>10}{summary['completion_tokens']:>10}{str(summary['tokens_per_sec']):>10}")
+    for doc in report["documents"]:
+        status = f"失败: {doc['error']}" if doc["error"] else f"{doc['rows']} 条记录"
+        print(f"  {doc['task_id']:<12}{doc['filename']:<32}{doc['wall_time']:>8}s  {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线抽取性能基准测试")
+    parser.add_argument("--samples", default=str(SAMPLES_DIR), help="样例文本目录(*.txt)")
+    parser.add_argument("--jobs", type=int, default=1, help="并发处理的文档数")
+    parser.add_argument("--repeat", type=int, default=1, help="样例重复次数")
+    parser.add_argument("--ttft", type=float, default=0.05, help="模拟首token时延(秒)")
+    parser.add_argument("--tps", type=float, default=2000.0, help="模拟生成速度(token/秒)，0表示不限速")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="错误注入概率")
+    parser.add_argument("--error-status", type=int, default=503, help="注入错误时返回的HTTP状态码")
+    parser.add_argument("--replay", type=str, help="回放文件路径（提示词摘要到内容的JSON，或大模型调用记录文件）")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="调用记录的回放速度倍率，0表示不等待")
+    parser.add_argument("--seed", type=int, default=0, help="错误注入随机种子")
+    parser.add_argument("--quiet", "-q", action="store_true", help="屏蔽抽取过程中的标准输出")
+    parser.add_argument("--json", type=str, help="将报告以JSON格式写入指定文件")
+    parser.add_argument("--trace", type=str, help="链路追踪导出器，逗号分隔（log、memory、otlp_file）")
+    parser.add_argument("--trace-file", type=str, default="bench_traces.otlp.jsonl", help="otlp_file导出器的输出文件")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
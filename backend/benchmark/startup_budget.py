@@ -0,0 +1,87 @@
+"""
+命令行工具冷启动预算检查
+在全新的解释器中导入目标模块，用-X importtime统计导入耗时，
+超出预算或导入了不应在启动时加载的重量级模块（pandas、PyPDF2、FastAPI应用等）时以非零状态退出
+
+用法：
+    python -m backend.benchmark.startup_budget --budget-ms 400
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+MCP_SUPPORT_DIR = PROJECT_ROOT / "backend" / "mcp_support"
+
+# 命令行工具启动时导入的模块，与extract.py、judge.py的导入方式一致
+DEFAULT_TARGETS = ("daemon", "tool_service")
+
+# 启动阶段不应加载的模块
+FORBIDDEN_MODULES = ("pandas", "PyPDF2", "fastapi", "backend.main", "backend.database", "backend.unstruct")
+
+
+def measure_imports(module: str) -> Tuple[int, Dict[str, int]]:
+    """
+    在子进程中导入模块并解析-X importtime输出
+
+    Args:
+        module: 模块名，为空时只统计解释器启动本身导入的模块
+
+    Returns:
+        Tuple[int, Dict[str, int]]: 目标模块的累计导入耗时(微秒)，以及所有已导入模块的累计耗时
+    """
+    code = f"import sys; sys.path.insert(0, {str(MCP_SUPPORT_DIR)!r}); sys.path.append({str(PROJECT_ROOT)!r})"
+    if module:
+        code += f"; import {module}"
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                               capture_output=True, text=True, cwd=str(MCP_SUPPORT_DIR), env=env)
+    if completed.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{completed.stderr}")
+    modules: Dict[str, int] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1].strip())
+        except ValueError:
+            continue  # 表头
+        modules[parts[2].strip()] = cumulative
+    return modules.get(module, 0), modules
+
+
+def check(targets: List[str], budget_ms: float, top: int) -> bool:
+    passed = True
+    # 解释器启动时已导入的模块（site等）不计入目标模块
+    _, baseline = measure_imports("")
+    for module in targets:
+        total_us, modules = measure_imports(module)
+        modules = {name: cumulative for name, cumulative in modules.items() if name not in baseline}
+        forbidden = [f for f in FORBIDDEN_MODULES
+                     if any(name == f or name.startswith(f + ".") for name in modules)]
+        over_budget = total_us / 1000 > budget_ms
+        status = "超出预算" if over_budget else "通过"
+        print(f"{module:<16}{total_us / 1000:>10.1f}ms  预算 {budget_ms}ms  {status}")
+        for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[1:top + 1]:
+            print(f"    {name:<40}{cumulative / 1000:>10.1f}ms")
+        if forbidden:
+            print(f"    启动时不应导入: {', '.join(forbidden)}")
+        passed = passed and not over_budget and not forbidden
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="命令行工具冷启动预算检查")
+    parser.add_argument("--budget-ms", type=float, default=400.0, help="单个模块的导入耗时预算(毫秒)")
+    parser.add_argument("--top", type=int, default=8, help="列出耗时最多的依赖模块数")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_TARGETS), help="待检查的模块")
+    args = parser.parse_args()
+    sys.exit(0 if check(args.modules, args.budget_ms, args.top) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,8 @@
+from .guideline_classifier import GuidelineClassifier, split_excerpts
+from .model import get_classifier
+
+__all__ = [
+    "GuidelineClassifier",
+    "split_excerpts",
+    "get_classifier"
+]
@@ -0,0 +1,220 @@
+"""
+医疗指南文本的本地轻量分类器
+以指南常用词汇（推荐意见、证据等级、GRADE、临床问题等）及推荐等级、剂量、文献引用等模式的出现次数为特征，
+线性打分后经sigmoid得到概率；权重可在标注语料上用逻辑回归微调并保存为JSON
+"""
+import json
+import math
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 关键词及默认权重，负权重为常见的非医疗指南内容
+DEFAULT_KEYWORD_WEIGHTS: Dict[str, float] = {
+    "推荐意见": 2.0,
+    "证据等级": 2.0,
+    "证据质量": 1.8,
+    "推荐强度": 1.8,
+    "推荐等级": 1.8,
+    "GRADE": 1.6,
+    "临床问题": 1.6,
+    "强推荐": 1.4,
+    "弱推荐": 1.4,
+    "专家共识": 1.4,
+    "指南": 1.2,
+    "循证": 1.2,
+    "Meta分析": 1.0,
+    "系统评价": 1.0,
+    "随机对照": 1.0,
+    "适应证": 0.8,
+    "禁忌证": 0.8,
+    "利益冲突": 0.8,
+    "诊断": 0.6,
+    "不良反应": 0.6,
+    "剂量": 0.6,
+    "参考文献": 0.6,
+    "共识": 0.6,
+    "治疗": 0.5,
+    "患者": 0.5,
+    "临床": 0.5,
+    "随访": 0.5,
+    "小说": -1.5,
+    "菜谱": -1.5,
+    "股票": -1.5,
+    "促销": -1.5,
+    "偏方": -1.5,
+    "祖传": -1.5,
+    "包治": -2.0,
+    "电影": -1.2,
+    "游戏": -1.2,
+    "旅游": -1.2,
+    "明星": -1.2,
+    "优惠": -1.2,
+    "比赛": -1.0,
+}
+
+# 正则模式特征：名称 -> (模式, 默认权重)
+DEFAULT_PATTERNS: Dict[str, Tuple[str, float]] = {
+    "grade_label": (r"[（(]\s*[1-3]\s*[A-Da-d]\s*[)）]|[ⅠⅡⅢ]+\s*级推荐|[A-D]\s*级证据", 1.8),
+    "dosage": (r"\d+(?:\.\d+)?\s*(?:mg|μg|ug|ml|mL|mmHg|mmol/L|IU)", 0.8),
+    "citation": (r"\[\d+(?:[-,，]\d+)*\]", 0.6),
+}
+
+DEFAULT_BIAS = -3.0
+
+# 单个特征的取值上限，避免长文档中个别词汇重复出现主导打分
+FEATURE_CAP = 3.0
+
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+class GuidelineClassifier:
+    """医疗指南文本分类器"""
+
+    def __init__(self,
+                 keyword_weights: Optional[Dict[str, float]] = None,
+                 patterns: Optional[Dict[str, Tuple[str, float]]] = None,
+                 bias: float = DEFAULT_BIAS,
+                 max_chars: int = 20000):
+        """
+        Args:
+            keyword_weights: 关键词权重
+            patterns: 正则模式特征，名称到(模式, 权重)
+            bias: 偏置
+            max_chars: 参与打分的最大字符数，长文档只取开头部分
+        """
+        self.keyword_weights = dict(keyword_weights if keyword_weights is not None else DEFAULT_KEYWORD_WEIGHTS)
+        patterns = patterns if patterns is not None else DEFAULT_PATTERNS
+        self.patterns = {name: (pattern, weight) for name, (pattern, weight) in patterns.items()}
+        self._compiled = {name: re.compile(pattern) for name, (pattern, _) in self.patterns.items()}
+        self.bias = bias
+        self.max_chars = max_chars
+
+    def features(self, text: str) -> Dict[str, float]:
+        """
+        提取特征，取值为出现次数的对数
+
+        Args:
+            text: 文本
+
+        Returns:
+            Dict[str, float]: 非零特征
+        """
+        text = text[:self.max_chars]
+        result = {}
+        for keyword in self.keyword_weights:
+            count = text.count(keyword)
+            if count:
+                result[keyword] = min(math.log1p(count), FEATURE_CAP)
+        for name, regex in self._compiled.items():
+            count = len(regex.findall(text))
+            if count:
+                result[name] = min(math.log1p(count), FEATURE_CAP)
+        return result
+
+    def _weight(self, name: str) -> float:
+        if name in self.keyword_weights:
+            return self.keyword_weights[name]
+        return self.patterns[name][1]
+
+    def score(self, text: str) -> float:
+        return self.bias + sum(self._weight(name) * value for name, value in self.features(text).items())
+
+    def predict_proba(self, text: str) -> float:
+        """
+        Args:
+            text: 文本
+
+        Returns:
+            float: 为医疗指南内容的概率
+        """
+        return _sigmoid(self.score(text))
+
+    def fit(self, samples: Iterable[Tuple[str, bool]], epochs: int = 50, learning_rate: float = 0.1,
+            l2: float = 0.001) -> "GuidelineClassifier":
+        """
+        在标注样本上以逻辑回归（随机梯度下降）微调权重，特征集合保持不变
+
+        Args:
+            samples: (文本, 是否为医疗指南)样本
+            epochs: 训练轮数
+            learning_rate: 学习率
+            l2: L2正则系数
+
+        Returns:
+            GuidelineClassifier: 自身
+        """
+        data = [(self.features(text), 1.0 if label else 0.0) for text, label in samples]
+        for _ in range(epochs):
+            for features, label in data:
+                error = _sigmoid(self.bias + sum(self._weight(n) * v for n, v in features.items())) - label
+                self.bias -= learning_rate * error
+                for name, value in features.items():
+                    weight = self._weight(name)
+                    weight -= learning_rate * (error * value + l2 * weight)
+                    if name in self.keyword_weights:
+                        self.keyword_weights[name] = weight
+                    else:
+                        self.patterns[name] = (self.patterns[name][0], weight)
+        return self
+
+    def evaluate(self, samples: Iterable[Tuple[str, bool]], threshold: float = 0.5) -> float:
+        """
+        Returns:
+            float: 准确率
+        """
+        samples = list(samples)
+        if not samples:
+            return 0.0
+        correct = sum(1 for text, label in samples if (self.predict_proba(text) >= threshold) == bool(label))
+        return correct / len(samples)
+
+    def to_dict(self) -> Dict:
+        return {
+            "bias": self.bias,
+            "max_chars": self.max_chars,
+            "keywords": self.keyword_weights,
+            "patterns": {name: [pattern, weight] for name, (pattern, weight) in self.patterns.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "GuidelineClassifier":
+        return cls(keyword_weights=data.get("keywords"),
+                   patterns={name: (pattern, weight) for name, (pattern, weight) in data.get("patterns", {}).items()},
+                   bias=data.get("bias", DEFAULT_BIAS),
+                   max_chars=data.get("max_chars", 20000))
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "GuidelineClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def split_excerpts(text: str, size: int = 500) -> List[str]:
+    """
+    将长文档按段落切分为约size字符的片段，用于训练时模拟智能体提交的短文本
+
+    Args:
+        text: 文档文本
+        size: 片段目标长度
+
+    Returns:
+        List[str]: 片段列表
+    """
+    excerpts, current = [], ""
+    for paragraph in text.split("\n"):
+        if current and len(current) + len(paragraph) > size:
+            excerpts.append(current)
+            current = ""
+        current += paragraph + "\n"
+    if current.strip():
+        excerpts.append(current)
+    return excerpts
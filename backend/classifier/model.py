@@ -0,0 +1,36 @@
+"""
+分类器实例管理，按配置加载微调后的权重
+"""
+import threading
+from typing import Optional
+
+import backend.config as config
+from .guideline_classifier import GuidelineClassifier
+
+logger = config.setup_logging()
+
+_classifier: Optional[GuidelineClassifier] = None
+_classifier_path: Optional[str] = None
+_lock = threading.Lock()
+
+
+def get_classifier() -> GuidelineClassifier:
+    """
+    获取分类器，配置了JUDGE_MODEL_PATH时加载该文件中的权重，否则使用内置默认权重
+
+    Returns:
+        GuidelineClassifier: 分类器
+    """
+    global _classifier, _classifier_path
+    path = config.settings.judge_model_path
+    with _lock:
+        if _classifier is None or _classifier_path != path:
+            if path:
+                _classifier = GuidelineClassifier.load(path)
+                logger.info(f"已加载内容判断分类器权重: {path}")
+            else:
+                _classifier = GuidelineClassifier()
+                if config.settings.judge_mode != "llm":
+                    logger.warning("未配置JUDGE_MODEL_PATH，本地内容判断使用未经标注语料拟合的内置权重")
+            _classifier_path = path
+        return _classifier
@@ -0,0 +1,58 @@
+"""
+在标注语料上微调内容判断分类器
+
+用法：
+    python -m backend.classifier.train --positive guidelines/ --negative others/ --output judge_model.json
+    # 训练完成后设置 JUDGE_MODEL_PATH=judge_model.json
+"""
+import argparse
+import os
+import random
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from backend.classifier.guideline_classifier import GuidelineClassifier, split_excerpts
+
+
+def load_corpus(directory: str, label: bool, excerpt_size: int) -> List[Tuple[str, bool]]:
+    samples = []
+    for path in sorted(Path(directory).rglob("*.txt")):
+        text = path.read_text(encoding="utf-8")
+        samples.extend((excerpt, label) for excerpt in split_excerpts(text, excerpt_size))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="微调医疗指南内容判断分类器")
+    parser.add_argument("--positive", required=True, help="医疗指南文本目录(*.txt)")
+    parser.add_argument("--negative", required=True, help="非医疗指南文本目录(*.txt)")
+    parser.add_argument("--output", required=True, help="权重输出文件(JSON)")
+    parser.add_argument("--base", type=str, help="在已有权重文件的基础上微调，默认使用内置权重")
+    parser.add_argument("--excerpt-size", type=int, default=500, help="长文档切分的片段长度")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--learning-rate", type=float, default=0.1)
+    parser.add_argument("--test-ratio", type=float, default=0.2, help="留出评估的样本比例")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    samples = load_corpus(args.positive, True, args.excerpt_size) + load_corpus(args.negative, False, args.excerpt_size)
+    if not samples:
+        parser.error("语料为空")
+    random.Random(args.seed).shuffle(samples)
+    split = int(len(samples) * (1 - args.test_ratio))
+    train, test = samples[:split], samples[split:] or samples[:split]
+
+    classifier = GuidelineClassifier.load(args.base) if args.base else GuidelineClassifier()
+    print(f"样本数: 训练 {len(train)}  评估 {len(test)}")
+    print(f"微调前准确率: {classifier.evaluate(test):.3f}")
+    classifier.fit(train, epochs=args.epochs, learning_rate=args.learning_rate)
+    print(f"微调后准确率: {classifier.evaluate(test):.3f}")
+    classifier.save(args.output)
+    print(f"权重已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
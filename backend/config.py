@@ -1,5 +1,9 @@
+import atexit
 import logging
 import logging.config
+import logging.handlers
+import queue
+import threading
 from pathlib import Path
 
 from pydantic.v1 import BaseSettings
@@ -11,6 +15,93 @@ class Settings(BaseSettings):
     api_url: str = ""
     api_key: str = ""
     model_id: str = ""
+    # 流式调用时是否请求服务端返回usage（stream_options.include_usage）
+    llm_stream_usage: bool = True
+    # 大模型调用失败（连接错误、限流与网关错误）时的最大重试次数及退避基数(秒)
+    llm_max_retries: int = 2
+    llm_retry_backoff: float = 1.0
+    # 同时进行的大模型调用上限（流式调用占用名额直至接收完毕），超出时排队等待，0为不限制
+    llm_max_concurrency: int = 8
+    # 名额不足时各租户（API密钥的key_id）的调用按权重公平排队，逗号分隔的"key_id:权重"，未配置的租户权重为1
+    llm_tenant_weights: str = ""
+    # 单个任务内并行抽取的核心问题数，各问题的大模型调用参与公平排队，1为逐个抽取
+    core_parallelism: int = 4
+    # 大模型采样温度，参与提示词指纹计算
+    llm_temperature: float = 0.2
+    # 大模型调用记录与回放：record记录每次调用的响应流，replay从记录文件回放且不访问网络，为空则关闭
+    llm_transcript_mode: str = ""
+    llm_transcript_path: str = "llm_transcripts.jsonl.gz"
+    # 回放速度倍率，1为按记录的分片间隔原速回放，0为不等待
+    llm_replay_speed: float = 0.0
+    # 链路追踪导出器，逗号分隔：log（JSON日志）、memory（内存，可通过接口查询任务链路）、otlp_file（OTLP/JSON文件），为空则关闭
+    trace_exporters: str = ""
+    trace_file: str = "traces.otlp.jsonl"
+    trace_memory_max_spans: int = 20000
+    # 流式响应内容的输出端：none（不输出）、log（批量写日志）、file（按任务写文件）、sse（推送给订阅客户端）、stdout（调试用）
+    stream_sink: str = "none"
+    stream_sink_dir: str = "stream_logs"
+    # 输出端缓冲区大小(字符)，累积到该大小后一次性输出
+    stream_sink_buffer: int = 4096
+    # 抽取任务共享线程池的最大并发数，REST接口与MCP工具共用
+    task_max_workers: int = 4
+    # MCP全流程抽取工具允许引用的服务端文件目录，为空则只接受文本内容
+    mcp_file_root: str = ""
+    # 上传文件的暂存目录，为空则使用系统临时目录下的medical_guideline_uploads
+    upload_spool_dir: str = ""
+    # 上传文件大小上限(字节)，0为不限制；上传时每次读取写盘的块大小(字节)
+    upload_max_bytes: int = 200 * 1024 * 1024
+    upload_chunk_size: int = 1024 * 1024
+    # 相同内容、模型与提示词版本的抽取任务是否复用已完成或进行中的任务
+    task_dedup: bool = True
+    # 是否按(阶段输入, 提示词指纹)缓存各阶段的大模型输出，提示词修改后只重新计算受影响的阶段
+    stage_cache: bool = True
+    # 是否将任务的创建、进度与最终结果写入SQLite
+    task_persist: bool = True
+    # 内存中完成任务结果的存储方式：gzip（默认，字典编码后压缩）、zstd（需安装zstandard）、none（字典列表）
+    result_compression: str = "gzip"
+    # 内存中已结束任务的保留时长(秒)，按状态分别配置（已取消的任务同失败任务），0为不按时间清理
+    task_ttl_completed: int = 24 * 3600
+    task_ttl_failed: int = 3600
+    # 内存中最多保留的已结束任务数及其结果总字节数，超出时先清理最早结束的任务，0为不限制
+    task_max_count: int = 1000
+    task_max_result_bytes: int = 256 * 1024 * 1024
+    # 数据库中已结束任务（含三元组）与阶段缓存（按最后访问时间）的保留时长(秒)，0为永久保留
+    task_db_ttl: int = 0
+    stage_cache_ttl: int = 30 * 24 * 3600
+    # 清理线程的执行间隔(秒)，0为不启动；不再被任何工作进程使用的上传暂存文件超过宽限期(秒)后删除
+    retention_sweep_interval: int = 60
+    spool_orphan_grace: int = 3600
+    # 内容判断方式：llm（仅大模型）、hybrid（本地分类器判断，置信度不足时调用大模型）、local（仅本地分类器）
+    # 内置权重为手工设定，未在标注语料上拟合，不能区分医疗新闻等近似内容；以JUDGE_MODEL_PATH加载微调后的权重后再启用hybrid
+    judge_mode: str = "llm"
+    # 本地分类器概率不低于high判为是、不高于low判为否，介于两者之间时调用大模型；low为0时不在本地判否
+    judge_confidence_high: float = 0.9
+    judge_confidence_low: float = 0.0
+    # 微调后的分类器权重文件，为空则使用内置权重
+    judge_model_path: str = ""
+    # 判断结果缓存的条目数
+    judge_cache_size: int = 4096
+    # 批量判断时每个提示词最多打包的文本条数与字符数，以及单次请求的最大条数
+    judge_batch_size: int = 20
+    judge_batch_max_chars: int = 8000
+    judge_batch_max_items: int = 1000
+    # 日志文件路径及滚动策略：单个文件上限(字节)与保留的历史文件数
+    log_file: str = "../app.log"
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    # SQLite连接参数：写锁等待时长(毫秒)、同步级别（WAL模式下NORMAL即可保证不损坏）、页缓存大小(KB)
+    db_busy_timeout_ms: int = 5000
+    db_synchronous: str = "NORMAL"
+    db_cache_size_kb: int = 8192
+    # 多个工作进程时检查其他进程是否创建或删除了API密钥的间隔(秒)，未命中缓存的密钥同样按此间隔最多检查一次
+    api_key_refresh_interval: float = 1.0
+    # 每个API密钥的请求速率（令牌桶，每分钟补充的请求数与桶容量），0为不限制
+    key_rate_per_minute: float = 120
+    key_rate_burst: int = 30
+    # 每个API密钥同时处理的抽取任务数，超出的任务按提交顺序排队，0为不限制
+    key_max_concurrent_tasks: int = 2
+    # 每个API密钥每日的大模型token上限，用尽后拒绝新的请求并不再启动排队中的任务，0为不限制
+    key_daily_tokens: int = 0
 
     # 配置 .env 文件路径 (Pydantic v1)
     class Config:
@@ -38,18 +129,11 @@ LOGGING_CONFIG = {
             'class': 'logging.StreamHandler',
             'stream': 'ext://sys.stdout', # 默认是 stderr
         },
-        'file': { # 文件处理器
-            'level': 'DEBUG',
-            'formatter': 'detailed',
-            'class': 'logging.FileHandler',
-            'filename': '../app.log',
-            'mode': 'a', # 追加模式
-            'encoding': 'utf-8', # 指定编码
-        },
+        # 文件处理器不在此处定义，由setup_logging经队列异步写入，见_attach_file_handler
     },
     'loggers': { # 定义 Logger
         '': {  # root logger (空字符串是根 logger)
-            'handlers': ['console', 'file'], # 使用这两个处理器
+            'handlers': ['console'],
             'level': 'DEBUG', # 记录 DEBUG 级别及以上的日志
             'propagate': False # 不向父 logger 传播 (对于 root logger，通常设为 False)
         }
@@ -63,7 +147,46 @@ LOGGING_CONFIG = {
 }
 
 
+# 挂在根logger上的文件队列处理器名称，用于判断是否已完成配置
+# 本模块会以config与backend.config两个名称各加载一次，不能只依赖模块内的变量
+_QUEUE_HANDLER_NAME = "async_file"
+_setup_lock = threading.Lock()
+
+
+def _attach_file_handler(root: logging.Logger) -> None:
+    """文件输出经QueueHandler入队，由QueueListener后台线程写盘，请求线程不会阻塞在磁盘I/O上"""
+    file_handler = logging.handlers.RotatingFileHandler(
+        settings.log_file,
+        maxBytes=settings.log_max_bytes,
+        backupCount=settings.log_backup_count,
+        encoding='utf-8',
+        delay=True
+    )
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(logging.Formatter(LOGGING_CONFIG['formatters']['detailed']['format']))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.set_name(_QUEUE_HANDLER_NAME)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    # 进程退出前写完队列中剩余的日志
+    atexit.register(listener.stop)
+    root.addHandler(queue_handler)
+
+
 # 获取日志logger
 def setup_logging():
-    logging.config.dictConfig(LOGGING_CONFIG)
-    return logging.getLogger()
\ No newline at end of file
+    """
+    配置日志并返回根logger，多次调用只在第一次生效
+
+    Returns:
+        logging.Logger: 根logger
+    """
+    root = logging.getLogger()
+    with _setup_lock:
+        if any(handler.get_name() == _QUEUE_HANDLER_NAME for handler in root.handlers):
+            return root
+        logging.config.dictConfig(LOGGING_CONFIG)
+        _attach_file_handler(root)
+    return root
\ No newline at end of file
@@ -9,6 +9,7 @@ import requests
 from cot_prompt import build_text_prompt
 from typing import Callable, Optional
 import config
+from backend.llm.stream_sink import create_sink
 
 logger = config.setup_logging()
 
@@ -109,6 +110,8 @@ def extract_info_streaming(text, filename, progress_callback: Optional[Callable[
         # 累积完整结果的变量
         full_response = ""
         line_count = 0
+        # 内容片段交给配置的输出端，默认不逐token输出
+        sink = create_sink("cot", filename)
 
         # 迭代处理流式响应
         for line in response.iter_lines():
@@ -123,7 +126,7 @@ def extract_info_streaming(text, filename, progress_callback: Optional[Callable[
                     # 提取当前片段的内容
                     content = chunk["choices"][0]["delta"].get("content", "")
                     if content:
-                        print(content, end='', flush=True)  # 实时打印
+                        sink.write(content)
                         full_response += content  # 累积内容
                         line_count += 1
                         # 每处理10行更新一次进度（模拟）
@@ -134,6 +137,7 @@ def extract_info_streaming(text, filename, progress_callback: Optional[Callable[
                     continue
                 except KeyError:
                     continue
+        sink.close()
 
         logger.info("-" * 50)
         logger.info(f"完成 {filename} 的内容提取")
@@ -6,17 +6,31 @@
 from .init_db import (
     init_database,
     get_db_connection,
+    close_db_connection,
+    transaction,
     check_database_exists,
     get_database_path
 )
 
 # 导出数据库操作模块
+from . import migrations
 from . import api_key_db
+from . import stage_cache_db
+from . import task_db
+from . import triple_db
+from . import quota_db
 
 __all__ = [
     "init_database",
     "get_db_connection",
+    "close_db_connection",
+    "transaction",
     "check_database_exists",
     "get_database_path",
-    "api_key_db"
+    "migrations",
+    "api_key_db",
+    "stage_cache_db",
+    "task_db",
+    "triple_db",
+    "quota_db"
 ]
@@ -1,18 +1,54 @@
 """
 API密钥数据库操作模块
+数据库不保存明文密钥，密钥以key_id（HMAC摘要）标识，key_hash为加盐哈希，见key_hash模块；
+每次创建或删除密钥时递增meta表中的api_key_generation，其他进程据此判断是否需要重新加载缓存
 """
 import json
 import sqlite3
 from typing import Optional, List, Dict
-from .init_db import get_db_connection
+from .init_db import get_db_connection, transaction
 
 
-def insert_api_key(api_key: str, name: str, created_at: str) -> bool:
+def _bump_generation(conn) -> None:
+    conn.execute('''
+        UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'api_key_generation'
+    ''')
+
+
+def get_pepper() -> str:
+    """
+    获取计算key_id的服务端密钥，迁移时生成，所有进程共用
+
+    Returns:
+        str: 服务端密钥
+    """
+    conn = get_db_connection()
+    return conn.execute("SELECT value FROM meta WHERE key = 'api_key_pepper'").fetchone()["value"]
+
+
+def get_generation() -> int:
+    """
+    获取API密钥的变更代数
+
+    Returns:
+        int: 代数，查询失败返回-1
+    """
+    try:
+        conn = get_db_connection()
+        row = conn.execute("SELECT value FROM meta WHERE key = 'api_key_generation'").fetchone()
+        return int(row["value"])
+    except Exception as e:
+        print(f"查询API密钥变更代数时出错: {e}")
+        return -1
+
+
+def insert_api_key(key_id: str, key_hash: str, name: str, created_at: str) -> bool:
     """
     创建新的API密钥记录
 
     Args:
-        api_key (str): API密钥
+        key_id (str): 密钥的HMAC摘要
+        key_hash (str): 密钥的加盐哈希
         name (str): 密钥名称/用途
         created_at (str): 创建时间
 
@@ -20,35 +56,30 @@ def insert_api_key(api_key: str, name: str, created_at: str) -> bool:
         bool: 创建成功返回True，否则返回False
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with transaction() as conn:
+            conn.execute('''
+                INSERT INTO api_keys (key_id, key_hash, name, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', (key_id, key_hash, name, created_at))
+            _bump_generation(conn)
 
-        cursor.execute('''
-            INSERT INTO api_keys (api_key, name, created_at)
-            VALUES (?, ?, ?)
-        ''', (api_key, name, created_at))
-
-        conn.commit()
-        conn.close()
         return True
 
     except sqlite3.IntegrityError:
         # API密钥已存在
-        conn.close()
         return False
     except Exception as e:
         # 其他数据库错误
-        conn.close()
         print(f"创建API密钥时出错: {e}")
         return False
 
 
-def query_api_key(api_key: str) -> Optional[Dict]:
+def query_api_key(key_id: str) -> Optional[Dict]:
     """
-    根据API密钥获取密钥信息
+    根据key_id获取密钥信息
 
     Args:
-        api_key (str): API密钥
+        key_id (str): 密钥的HMAC摘要
 
     Returns:
         Optional[Dict]: 密钥信息字典，如果未找到返回None
@@ -58,17 +89,17 @@ def query_api_key(api_key: str) -> Optional[Dict]:
         cursor = conn.cursor()
 
         cursor.execute('''
-            SELECT api_key, name, created_at
+            SELECT key_id, key_hash, name, created_at
             FROM api_keys
-            WHERE api_key = ?
-        ''', (api_key,))
+            WHERE key_id = ?
+        ''', (key_id,))
 
         row = cursor.fetchone()
-        conn.close()
 
         if row:
             return {
-                "api_key": row["api_key"],
+                "key_id": row["key_id"],
+                "key_hash": row["key_hash"],
                 "name": row["name"],
                 "created_at": row["created_at"]
             }
@@ -91,17 +122,17 @@ def query_all_api_keys() -> List[Dict]:
         cursor = conn.cursor()
 
         cursor.execute('''
-            SELECT api_key, name, created_at
+            SELECT key_id, key_hash, name, created_at
             FROM api_keys
             ORDER BY created_at DESC
         ''')
 
         rows = cursor.fetchall()
-        conn.close()
 
         return [
             {
-                "api_key": row["api_key"],
+                "key_id": row["key_id"],
+                "key_hash": row["key_hash"],
                 "name": row["name"],
                 "created_at": row["created_at"]
             }
@@ -113,28 +144,24 @@ def query_all_api_keys() -> List[Dict]:
         return []
 
 
-def delete_api_key(api_key: str) -> bool:
+def delete_api_key(key_id: str) -> bool:
     """
     删除指定的API密钥
 
     Args:
-        api_key (str): 要删除的API密钥
+        key_id (str): 要删除的密钥的HMAC摘要
 
     Returns:
         bool: 删除成功返回True，否则返回False
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            DELETE FROM api_keys
-            WHERE api_key = ?
-        ''', (api_key,))
-
-        changed = cursor.rowcount > 0
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            changed = conn.execute('''
+                DELETE FROM api_keys
+                WHERE key_id = ?
+            ''', (key_id,)).rowcount > 0
+            if changed:
+                _bump_generation(conn)
 
         return changed
 
@@ -143,12 +170,12 @@ def delete_api_key(api_key: str) -> bool:
         return False
 
 
-def api_key_exists(api_key: str) -> bool:
+def api_key_exists(key_id: str) -> bool:
     """
     检查API密钥是否存在
 
     Args:
-        api_key (str): API密钥
+        key_id (str): 密钥的HMAC摘要
 
     Returns:
         bool: 存在返回True，否则返回False
@@ -160,12 +187,11 @@ def api_key_exists(api_key: str) -> bool:
         cursor.execute('''
             SELECT 1
             FROM api_keys
-            WHERE api_key = ?
+            WHERE key_id = ?
             LIMIT 1
-        ''', (api_key,))
+        ''', (key_id,))
 
         result = cursor.fetchone()
-        conn.close()
 
         return result is not None
 
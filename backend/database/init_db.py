@@ -1,10 +1,23 @@
+import contextlib
 import sqlite3
 import os
+import threading
 from typing import Optional
 
+import backend.config as config
+from .migrations import migrate
+
 # 数据库文件路径
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "knowledge_extract.db")
 
+# 每个线程复用一个连接，sqlite3连接不能跨线程使用
+_local = threading.local()
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+# 本进程已完成迁移的数据库文件
+_ready_paths = set()
+
 def init_database() -> bool:
     """
     初始化数据库，创建必要的表
@@ -18,39 +31,8 @@ def init_database() -> bool:
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir)
 
-        # 连接数据库
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # 创建任务表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                task_id TEXT PRIMARY KEY,
-                status TEXT NOT NULL,
-                progress INTEGER DEFAULT 0,
-                message TEXT,
-                result TEXT,  -- JSON格式存储
-                start_time REAL,
-                end_time REAL,
-                start_time_str TEXT,
-                end_time_str TEXT,
-                duration REAL,
-                filename TEXT
-            )
-        ''')
-
-        # 创建API密钥表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS api_keys (
-                api_key TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                created_at TEXT NOT NULL
-            )
-        ''')
-
-        # 提交更改并关闭连接
-        conn.commit()
-        conn.close()
+        # 每个进程的第一个连接会执行结构迁移
+        get_db_connection()
 
         print(f"数据库初始化成功: {DB_PATH}")
         return True
@@ -59,18 +41,88 @@ def init_database() -> bool:
         print(f"数据库初始化失败: {e}")
         return False
 
+def _run_migrations(conn: sqlite3.Connection) -> None:
+    """执行尚未执行的结构迁移，每个进程的第一个连接也会执行，MCP服务等不经过init_database的进程同样可用"""
+    applied = migrate(conn)
+    if applied:
+        print(f"数据库迁移完成: {applied}")
+    _ready_paths.add(DB_PATH)
+
+def _connect(path: str) -> sqlite3.Connection:
+    """
+    创建连接并设置PRAGMA：WAL模式下读写互不阻塞，写锁冲突时按busy_timeout等待而不是立即报错
+    """
+    settings = config.settings
+    synchronous = settings.db_synchronous.upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"未知的DB_SYNCHRONOUS: {settings.db_synchronous}，可选 {', '.join(SYNCHRONOUS_MODES)}")
+    # isolation_level=None为自动提交，多条语句的批量写入通过transaction显式开启事务
+    conn = sqlite3.connect(path, timeout=settings.db_busy_timeout_ms / 1000, isolation_level=None)
+    # 设置行工厂，使查询结果可以通过列名访问
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {int(settings.db_busy_timeout_ms)}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    # 负数表示以KB为单位
+    conn.execute(f"PRAGMA cache_size = -{int(settings.db_cache_size_kb)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
 def get_db_connection():
     """
-    获取数据库连接
+    获取当前线程的数据库连接，连接在线程内复用，调用方不要关闭
 
     Returns:
         sqlite3.Connection: 数据库连接对象
     """
-    conn = sqlite3.connect(DB_PATH)
-    # 设置行工厂，使查询结果可以通过列名访问
-    conn.row_factory = sqlite3.Row
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _connect(DB_PATH)
+        _local.conn = conn
+        _local.path = DB_PATH
+        _local.depth = 0
+        if DB_PATH not in _ready_paths:
+            _run_migrations(conn)
     return conn
 
+def close_db_connection() -> None:
+    """关闭当前线程的数据库连接，线程结束前或切换数据库文件时调用"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextlib.contextmanager
+def transaction():
+    """
+    在当前线程的连接上开启写事务，正常退出时提交，异常时回滚；嵌套调用合并到最外层事务
+
+    Yields:
+        sqlite3.Connection: 数据库连接对象
+    """
+    conn = get_db_connection()
+    if _local.depth:
+        _local.depth += 1
+        try:
+            yield conn
+        finally:
+            _local.depth -= 1
+        return
+    # IMMEDIATE在事务开始时即获取写锁，避免读锁升级为写锁时的死锁
+    conn.execute("BEGIN IMMEDIATE")
+    _local.depth = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+    finally:
+        _local.depth = 0
+
 def check_database_exists() -> bool:
     """
     检查数据库文件是否存在
@@ -0,0 +1,61 @@
+"""
+API密钥哈希
+数据库只保存密钥的两种摘要：
+- key_id：以服务端随机密钥（pepper，保存在meta表）计算的HMAC-SHA256，用作主键与内存缓存的键，校验请求时只需一次HMAC与一次字典查找
+- key_hash：加盐的PBKDF2-SHA256，每个进程在密钥首次使用时校验一次，数据库泄露后无法据此还原密钥
+"""
+import hashlib
+import hmac
+import secrets
+
+PBKDF2_ITERATIONS = 200000
+
+
+def new_pepper() -> str:
+    return secrets.token_hex(32)
+
+
+def lookup_digest(pepper: str, api_key: str) -> str:
+    """
+    Args:
+        pepper: 服务端密钥
+        api_key: API密钥
+
+    Returns:
+        str: 十六进制的HMAC-SHA256摘要
+    """
+    return hmac.new(pepper.encode("utf-8"), api_key.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def hash_secret(api_key: str, iterations: int = PBKDF2_ITERATIONS) -> str:
+    """
+    Args:
+        api_key: API密钥
+
+    Returns:
+        str: pbkdf2_sha256$迭代次数$盐$摘要
+    """
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", api_key.encode("utf-8"), salt.encode("utf-8"), iterations).hex()
+    return f"pbkdf2_sha256${iterations}${salt}${digest}"
+
+
+def verify_secret(api_key: str, encoded: str) -> bool:
+    """
+    以恒定时间比较校验密钥与加盐哈希是否匹配
+
+    Args:
+        api_key: API密钥
+        encoded: hash_secret的返回值
+
+    Returns:
+        bool: 是否匹配
+    """
+    try:
+        algorithm, iterations, salt, digest = encoded.split("$")
+    except ValueError:
+        return False
+    if algorithm != "pbkdf2_sha256":
+        return False
+    candidate = hashlib.pbkdf2_hmac("sha256", api_key.encode("utf-8"), salt.encode("utf-8"), int(iterations)).hex()
+    return hmac.compare_digest(candidate, digest)
@@ -0,0 +1,177 @@
+"""
+数据库结构迁移
+每个迁移有递增的版本号，已执行的版本记录在schema_version表中；
+进程的第一个连接按顺序执行尚未执行的迁移，每个迁移在独立的写事务中完成，多个进程同时启动时只会执行一次
+"""
+import sqlite3
+import time
+from typing import Callable, List, Tuple, Union
+
+from .key_hash import new_pepper, lookup_digest, hash_secret
+
+def _hash_api_keys(conn: sqlite3.Connection) -> None:
+    """API密钥改为只保存HMAC摘要与加盐哈希，已有的明文密钥在迁移中转换；meta表保存pepper与密钥变更的代数"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    pepper = new_pepper()
+    conn.execute("INSERT INTO meta (key, value) VALUES ('api_key_pepper', ?)", (pepper,))
+    conn.execute("INSERT INTO meta (key, value) VALUES ('api_key_generation', '0')")
+    conn.execute('''
+        CREATE TABLE api_keys_hashed (
+            key_id TEXT PRIMARY KEY,  -- HMAC-SHA256(pepper, api_key)
+            key_hash TEXT NOT NULL,  -- 加盐的PBKDF2-SHA256
+            name TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    for row in conn.execute("SELECT api_key, name, created_at FROM api_keys").fetchall():
+        conn.execute("INSERT INTO api_keys_hashed (key_id, key_hash, name, created_at) VALUES (?, ?, ?, ?)",
+                     (lookup_digest(pepper, row["api_key"]), hash_secret(row["api_key"]), row["name"], row["created_at"]))
+    conn.execute("DROP TABLE api_keys")
+    conn.execute("ALTER TABLE api_keys_hashed RENAME TO api_keys")
+
+
+# (版本号, 说明, SQL语句列表或接收连接的函数)
+Migration = Tuple[int, str, Union[List[str], Callable[[sqlite3.Connection], None]]]
+
+MIGRATIONS: List[Migration] = [
+    (1, "初始表结构：任务、API密钥、阶段缓存", [
+        '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            progress INTEGER DEFAULT 0,
+            message TEXT,
+            result TEXT,  -- JSON格式存储
+            start_time REAL,
+            end_time REAL,
+            start_time_str TEXT,
+            end_time_str TEXT,
+            duration REAL,
+            filename TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS api_keys (
+            api_key TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stage_cache (
+            stage TEXT NOT NULL,
+            input_hash TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            output TEXT NOT NULL,  -- JSON格式存储
+            created_at REAL NOT NULL,
+            PRIMARY KEY (stage, input_hash, fingerprint)
+        )
+        ''',
+    ]),
+    (2, "任务按状态与开始时间查询的索引，阶段缓存记录最近访问时间", [
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status_start ON tasks (status, start_time)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_start ON tasks (start_time)",
+        "ALTER TABLE stage_cache ADD COLUMN last_access REAL",
+        "UPDATE stage_cache SET last_access = created_at",
+        "CREATE INDEX IF NOT EXISTS idx_stage_cache_last_access ON stage_cache (last_access)",
+    ]),
+    (3, "抽取结果按行存储为三元组，tasks.result只保留元数据", [
+        '''
+        CREATE TABLE IF NOT EXISTS triples (
+            task_id TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            entity TEXT,
+            property TEXT,
+            value TEXT,
+            entity_tag TEXT,
+            value_tag TEXT,
+            level TEXT,
+            value_type TEXT,
+            PRIMARY KEY (task_id, row_index)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_triples_entity ON triples (entity)",
+    ]),
+    (4, "三元组记录来源文档，按实体类型、值类型、值与来源查询的索引", [
+        "ALTER TABLE triples ADD COLUMN source TEXT",
+        "UPDATE triples SET source = (SELECT filename FROM tasks WHERE tasks.task_id = triples.task_id)",
+        "CREATE INDEX IF NOT EXISTS idx_triples_entity_tag ON triples (entity_tag, entity)",
+        "CREATE INDEX IF NOT EXISTS idx_triples_value_tag ON triples (value_tag, value)",
+        "CREATE INDEX IF NOT EXISTS idx_triples_value ON triples (value)",
+        "CREATE INDEX IF NOT EXISTS idx_triples_source ON triples (source)",
+    ]),
+    (5, "API密钥只保存HMAC摘要与加盐哈希，记录密钥变更代数供多进程同步缓存", _hash_api_keys),
+    (6, "按API密钥与日期统计大模型token用量", [
+        '''
+        CREATE TABLE IF NOT EXISTS key_usage (
+            key_id TEXT NOT NULL,
+            day TEXT NOT NULL,  -- YYYY-MM-DD
+            tokens INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (key_id, day)
+        )
+        ''',
+    ]),
+    (7, "按属性与推荐等级查询三元组的索引", [
+        "CREATE INDEX IF NOT EXISTS idx_triples_property ON triples (property)",
+        "CREATE INDEX IF NOT EXISTS idx_triples_level ON triples (level)",
+    ]),
+    (8, "任务记录提交任务的API密钥，任务从内存中清理后仍可校验删除权限", [
+        "ALTER TABLE tasks ADD COLUMN owner TEXT",
+    ]),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """
+    Returns:
+        int: 已执行的最高迁移版本，未执行过任何迁移时为0
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at REAL NOT NULL
+        )
+    ''')
+    row = conn.execute("SELECT MAX(version) AS version FROM schema_version").fetchone()
+    return row["version"] or 0
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """
+    执行尚未执行的迁移
+
+    Args:
+        conn: 自动提交模式的数据库连接
+
+    Returns:
+        List[int]: 本次执行的迁移版本
+    """
+    applied = []
+    if get_schema_version(conn) >= MIGRATIONS[-1][0]:
+        return applied
+    for version, description, steps in MIGRATIONS:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 取得写锁后再次检查，其他进程可能已执行
+            if get_schema_version(conn) >= version:
+                conn.execute("ROLLBACK")
+                continue
+            if callable(steps):
+                steps(conn)
+            else:
+                for statement in steps:
+                    conn.execute(statement)
+            conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                         (version, description, time.time()))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        applied.append(version)
+    return applied
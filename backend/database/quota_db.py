@@ -0,0 +1,67 @@
+"""
+API密钥用量数据库操作模块
+按(key_id, 日期)累计大模型token用量，多个工作进程共用，用于每日token配额
+"""
+from typing import Dict
+
+from .init_db import get_db_connection
+
+
+def add_tokens(key_id: str, day: str, tokens: int) -> bool:
+    """
+    累加token用量
+
+    Args:
+        key_id: 密钥的HMAC摘要
+        day: 日期，YYYY-MM-DD
+        tokens: token数
+
+    Returns:
+        bool: 写入成功返回True，否则返回False
+    """
+    try:
+        conn = get_db_connection()
+        conn.execute('''
+            INSERT INTO key_usage (key_id, day, tokens) VALUES (?, ?, ?)
+            ON CONFLICT(key_id, day) DO UPDATE SET tokens = tokens + excluded.tokens
+        ''', (key_id, day, tokens))
+        return True
+    except Exception as e:
+        print(f"记录密钥用量时出错: {e}")
+        return False
+
+
+def query_tokens(key_id: str, day: str) -> int:
+    """
+    查询密钥当日的token用量
+
+    Returns:
+        int: token数，查询失败返回0
+    """
+    try:
+        conn = get_db_connection()
+        row = conn.execute('''
+            SELECT tokens FROM key_usage WHERE key_id = ? AND day = ?
+        ''', (key_id, day)).fetchone()
+        return row["tokens"] if row else 0
+    except Exception as e:
+        print(f"查询密钥用量时出错: {e}")
+        return 0
+
+
+def query_day(day: str) -> Dict[str, int]:
+    """
+    查询所有密钥当日的token用量
+
+    Returns:
+        Dict[str, int]: key_id -> token数
+    """
+    try:
+        conn = get_db_connection()
+        rows = conn.execute('''
+            SELECT key_id, tokens FROM key_usage WHERE day = ?
+        ''', (day,)).fetchall()
+        return {row["key_id"]: row["tokens"] for row in rows}
+    except Exception as e:
+        print(f"查询密钥用量时出错: {e}")
+        return {}
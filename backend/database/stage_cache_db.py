@@ -0,0 +1,115 @@
+"""
+阶段缓存数据库操作模块
+按(阶段, 输入摘要, 阶段指纹)保存各阶段的大模型输出，指纹不一致的记录不会命中
+"""
+import time
+from typing import Dict, Optional
+
+from .init_db import get_db_connection, transaction
+
+
+def query_stage_result(stage: str, input_hash: str, fingerprint: str) -> Optional[str]:
+    """
+    查询阶段缓存
+
+    Args:
+        stage: 阶段名
+        input_hash: 阶段输入的摘要
+        fingerprint: 当前的阶段指纹
+
+    Returns:
+        Optional[str]: 缓存的输出（JSON），未命中返回None
+    """
+    try:
+        conn = get_db_connection()
+        row = conn.execute('''
+            SELECT output FROM stage_cache
+            WHERE stage = ? AND input_hash = ? AND fingerprint = ?
+        ''', (stage, input_hash, fingerprint)).fetchone()
+        if row is None:
+            return None
+        # 记录最近访问时间，供按访问时间淘汰
+        conn.execute('''
+            UPDATE stage_cache SET last_access = ?
+            WHERE stage = ? AND input_hash = ? AND fingerprint = ?
+        ''', (time.time(), stage, input_hash, fingerprint))
+        return row["output"]
+    except Exception as e:
+        print(f"查询阶段缓存时出错: {e}")
+        return None
+
+
+def insert_stage_result(stage: str, input_hash: str, fingerprint: str, output: str) -> bool:
+    """
+    保存阶段输出
+
+    Returns:
+        bool: 保存成功返回True，否则返回False
+    """
+    try:
+        now = time.time()
+        conn = get_db_connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO stage_cache (stage, input_hash, fingerprint, output, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (stage, input_hash, fingerprint, output, now, now))
+        return True
+    except Exception as e:
+        print(f"保存阶段缓存时出错: {e}")
+        return False
+
+
+def summarize(current: Dict[str, str]) -> Dict[str, Dict[str, int]]:
+    """
+    统计各阶段的缓存条数
+
+    Args:
+        current: 各阶段当前的指纹
+
+    Returns:
+        Dict[str, Dict[str, int]]: 阶段 -> {"current": 当前指纹的条数, "stale": 过期的条数}
+    """
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT stage, fingerprint, COUNT(*) AS count FROM stage_cache GROUP BY stage, fingerprint
+    ''').fetchall()
+    summary: Dict[str, Dict[str, int]] = {}
+    for row in rows:
+        counts = summary.setdefault(row["stage"], {"current": 0, "stale": 0})
+        counts["current" if current.get(row["stage"]) == row["fingerprint"] else "stale"] += row["count"]
+    return summary
+
+
+def purge_stale(current: Dict[str, str]) -> int:
+    """
+    删除指纹过期的缓存，只影响提示词或模型配置发生变化的阶段
+
+    Args:
+        current: 各阶段当前的指纹
+
+    Returns:
+        int: 删除的条数
+    """
+    removed = 0
+    with transaction() as conn:
+        for stage, fingerprint in current.items():
+            removed += conn.execute('''
+                DELETE FROM stage_cache WHERE stage = ? AND fingerprint != ?
+            ''', (stage, fingerprint)).rowcount
+    return removed
+
+
+def purge_unused(before: float) -> int:
+    """
+    删除最后访问时间早于指定时间的缓存
+
+    Args:
+        before: 最后访问时间(时间戳)的上限
+
+    Returns:
+        int: 删除的条数
+    """
+    with transaction() as conn:
+        return conn.execute('''
+            DELETE FROM stage_cache WHERE last_access < ?
+        ''', (before,)).rowcount
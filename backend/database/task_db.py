@@ -0,0 +1,219 @@
+"""
+任务数据库操作模块
+任务状态以内存字典为准，这里持久化创建、进度与最终结果，服务重启后可追溯；
+抽取结果的每一行存入triples表，tasks.result只保存文件名、条数、提示词指纹等元数据
+"""
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .init_db import get_db_connection, transaction
+
+# 结果行字段与triples表列的对应关系
+ROW_COLUMNS = (
+    ("entity", "entity"),
+    ("property", "property"),
+    ("value", "value"),
+    ("entityTag", "entity_tag"),
+    ("valueTag", "value_tag"),
+    ("level", "level"),
+    ("valueType", "value_type"),
+)
+
+
+def _save_rows(conn, task_id: str, source: Optional[str], rows: List[Dict]) -> None:
+    conn.execute("DELETE FROM triples WHERE task_id = ?", (task_id,))
+    conn.executemany(f'''
+        INSERT INTO triples (task_id, row_index, source, {", ".join(column for _, column in ROW_COLUMNS)})
+        VALUES (?, ?, ?, {", ".join("?" for _ in ROW_COLUMNS)})
+    ''', [(task_id, i, source, *(row.get(key) for key, _ in ROW_COLUMNS)) for i, row in enumerate(rows)])
+
+
+def query_rows(task_id: str, offset: int = 0, limit: int = -1) -> List[Dict]:
+    """
+    按行号顺序查询任务的抽取结果
+
+    Args:
+        task_id: 任务ID
+        offset: 起始行
+        limit: 最大行数，-1为不限制
+
+    Returns:
+        List[Dict]: 结果行，字段与result.data一致
+    """
+    # 行号从0连续编号，按主键定位起始行，不必像OFFSET那样逐行跳过
+    rows = get_db_connection().execute(f'''
+        SELECT {", ".join(column for _, column in ROW_COLUMNS)} FROM triples
+        WHERE task_id = ? AND row_index >= ? ORDER BY row_index LIMIT ?
+    ''', (task_id, max(offset, 0), limit)).fetchall()
+    return [{key: row[column] for key, column in ROW_COLUMNS} for row in rows]
+
+
+def iter_rows(task_id: str, offset: int = 0, limit: Optional[int] = None, batch_size: int = 500) -> Iterator[List[Dict]]:
+    """
+    分批查询任务的抽取结果，每批单独查询，流式输出时内存中只保留一批
+
+    Args:
+        task_id: 任务ID
+        offset: 起始行
+        limit: 最大行数，None为不限制
+        batch_size: 每批的行数
+
+    Returns:
+        Iterator[List[Dict]]: 每批结果行
+    """
+    start = max(offset, 0)
+    end = None if limit is None else start + limit
+    while end is None or start < end:
+        size = batch_size if end is None else min(batch_size, end - start)
+        rows = query_rows(task_id, start, size)
+        if rows:
+            yield rows
+        if len(rows) < size:
+            return
+        start += len(rows)
+
+
+def upsert_task(task_id: str, task: Dict) -> bool:
+    """
+    写入或更新任务记录
+
+    Args:
+        task_id: 任务ID
+        task: 任务字典（TaskStore中的格式）
+
+    Returns:
+        bool: 写入成功返回True，否则返回False
+    """
+    try:
+        result = task.get("result")
+        rows = None
+        if result is not None and "data" in result:
+            rows = result["data"]
+            result = {key: value for key, value in result.items() if key != "data"}
+        with transaction() as conn:
+            if rows is not None:
+                _save_rows(conn, task_id, task.get("filename"), rows)
+            conn.execute('''
+                INSERT INTO tasks (task_id, status, progress, message, result, start_time, end_time,
+                                   start_time_str, end_time_str, duration, filename, owner)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(task_id) DO UPDATE SET
+                    status = excluded.status,
+                    progress = excluded.progress,
+                    message = excluded.message,
+                    result = excluded.result,
+                    end_time = excluded.end_time,
+                    end_time_str = excluded.end_time_str,
+                    duration = excluded.duration
+            ''', (task_id, task.get("status"), int(task.get("progress") or 0), task.get("message"),
+                  json.dumps(result, ensure_ascii=False) if result is not None else None,
+                  task.get("start_time"), task.get("end_time"),
+                  task.get("start_time_str"), task.get("end_time_str"),
+                  task.get("duration"), task.get("filename"), task.get("owner")))
+        return True
+    except Exception as e:
+        print(f"保存任务时出错: {e}")
+        return False
+
+
+def update_progress(task_id: str, progress: int, message: str, status: Optional[str] = None) -> bool:
+    """
+    更新任务进度
+
+    Returns:
+        bool: 更新成功返回True，否则返回False
+    """
+    return update_progress_batch([(task_id, progress, message, status)])
+
+
+def update_progress_batch(updates: Iterable[Tuple[str, int, str, Optional[str]]]) -> bool:
+    """
+    在一个事务中批量更新任务进度
+
+    Args:
+        updates: (任务ID, 进度, 消息, 状态)列表，状态为None时不修改
+
+    Returns:
+        bool: 更新成功返回True，否则返回False
+    """
+    try:
+        with transaction() as conn:
+            conn.executemany('''
+                UPDATE tasks SET progress = ?, message = ?, status = COALESCE(?, status)
+                WHERE task_id = ?
+            ''', [(int(progress), message, status, task_id) for task_id, progress, message, status in updates])
+        return True
+    except Exception as e:
+        print(f"更新任务进度时出错: {e}")
+        return False
+
+
+def query_task(task_id: str, include_rows: bool = True) -> Optional[Dict]:
+    """
+    查询任务记录
+
+    Args:
+        task_id: 任务ID
+        include_rows: 是否读取全部结果行到result.data，分页读取时应为False并使用query_rows
+
+    Returns:
+        Optional[Dict]: 任务字典，result已解析为对象，未找到返回None
+    """
+    try:
+        row = get_db_connection().execute('''
+            SELECT * FROM tasks WHERE task_id = ?
+        ''', (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = dict(row)
+        if task["result"]:
+            task["result"] = json.loads(task["result"])
+            if include_rows:
+                task["result"]["data"] = query_rows(task_id)
+        return task
+    except Exception as e:
+        print(f"查询任务时出错: {e}")
+        return None
+
+
+def delete_task(task_id: str) -> bool:
+    """
+    删除任务记录
+
+    Returns:
+        bool: 记录存在并删除返回True，否则返回False
+    """
+    try:
+        with transaction() as conn:
+            conn.execute("DELETE FROM triples WHERE task_id = ?", (task_id,))
+            return conn.execute('''
+                DELETE FROM tasks WHERE task_id = ?
+            ''', (task_id,)).rowcount > 0
+    except Exception as e:
+        print(f"删除任务时出错: {e}")
+        return False
+
+
+def purge_finished(before: float) -> int:
+    """
+    删除在指定时间之前结束的任务及其三元组
+
+    Args:
+        before: 结束时间(时间戳)的上限
+
+    Returns:
+        int: 删除的任务数
+    """
+    try:
+        with transaction() as conn:
+            conn.execute('''
+                DELETE FROM triples WHERE task_id IN (
+                    SELECT task_id FROM tasks WHERE status IN ('completed', 'failed') AND end_time < ?
+                )
+            ''', (before,))
+            return conn.execute('''
+                DELETE FROM tasks WHERE status IN ('completed', 'failed') AND end_time < ?
+            ''', (before,)).rowcount
+    except Exception as e:
+        print(f"清理任务记录时出错: {e}")
+        return 0
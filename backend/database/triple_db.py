@@ -0,0 +1,117 @@
+"""
+三元组查询模块
+跨任务查询已抽取的结构化知识，如某疾病相关的全部证据、某实体的全部属性与被引用关系
+"""
+from typing import Dict, List, Optional, Tuple
+
+from .init_db import get_db_connection
+from .task_db import ROW_COLUMNS
+
+# 查询参数名到triples表列的对应关系，均有索引（task_id为主键前缀，property与level的索引见第7号迁移）
+FILTER_COLUMNS = {
+    "entity": "entity",
+    "entity_tag": "entity_tag",
+    "property": "property",
+    "value": "value",
+    "value_tag": "value_tag",
+    "level": "level",
+    "task_id": "task_id",
+    "source": "source",
+}
+
+# 前缀匹配的上界，与前缀组成范围条件以使用索引（LIKE默认不区分大小写，无法使用普通索引）
+PREFIX_UPPER = "\U0010ffff"
+
+
+def _row_to_dict(row) -> Dict:
+    triple = {key: row[column] for key, column in ROW_COLUMNS}
+    triple.update({"task_id": row["task_id"], "source": row["source"]})
+    return triple
+
+
+def query_triples(filters: Dict[str, Optional[str]], prefix: bool = False,
+                  offset: int = 0, limit: int = 100) -> Tuple[List[Dict], int]:
+    """
+    按条件查询三元组，多个条件取交集
+
+    Args:
+        filters: 查询条件，键为FILTER_COLUMNS中的参数名，值为None时忽略
+        prefix: entity与value是否按前缀匹配
+        offset: 起始位置
+        limit: 最大条数
+
+    Returns:
+        Tuple[List[Dict], int]: 三元组列表（含task_id与source），以及满足条件的总数
+    """
+    conditions, params = [], []
+    for name, value in filters.items():
+        if value is None:
+            continue
+        column = FILTER_COLUMNS[name]
+        if prefix and name in ("entity", "value"):
+            conditions.append(f"{column} >= ? AND {column} < ?")
+            params.extend([value, value + PREFIX_UPPER])
+        else:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    conn = get_db_connection()
+    total = conn.execute(f"SELECT COUNT(*) AS total FROM triples {where}", params).fetchone()["total"]
+    rows = conn.execute(f'''
+        SELECT * FROM triples {where}
+        ORDER BY task_id, row_index LIMIT ? OFFSET ?
+    ''', (*params, limit, offset)).fetchall()
+    return [_row_to_dict(row) for row in rows], total
+
+
+def query_entity(entity: str, limit: int = 500) -> Dict[str, List[Dict]]:
+    """
+    查询实体的出边（以该实体为entity）与入边（以该实体为value）
+
+    Args:
+        entity: 实体名称
+        limit: 每个方向的最大条数
+
+    Returns:
+        Dict[str, List[Dict]]: outgoing与incoming三元组
+    """
+    conn = get_db_connection()
+    outgoing = conn.execute('''
+        SELECT * FROM triples WHERE entity = ? ORDER BY task_id, row_index LIMIT ?
+    ''', (entity, limit)).fetchall()
+    incoming = conn.execute('''
+        SELECT * FROM triples WHERE value = ? ORDER BY task_id, row_index LIMIT ?
+    ''', (entity, limit)).fetchall()
+    return {
+        "outgoing": [_row_to_dict(row) for row in outgoing],
+        "incoming": [_row_to_dict(row) for row in incoming]
+    }
+
+
+def count_entities(entity_tag: Optional[str] = None, prefix: Optional[str] = None,
+                   limit: int = 100) -> List[Dict]:
+    """
+    按出现次数列出实体，用于检索提示与浏览
+
+    Args:
+        entity_tag: 实体类型，如疾病、推荐意见
+        prefix: 实体名称前缀
+        limit: 最大条数
+
+    Returns:
+        List[Dict]: entity、entity_tag、count（三元组数）、sources（来源文档数）
+    """
+    conditions, params = [], []
+    if entity_tag is not None:
+        conditions.append("entity_tag = ?")
+        params.append(entity_tag)
+    if prefix:
+        conditions.append("entity >= ? AND entity < ?")
+        params.extend([prefix, prefix + PREFIX_UPPER])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = get_db_connection().execute(f'''
+        SELECT entity, entity_tag, COUNT(*) AS count, COUNT(DISTINCT source) AS sources
+        FROM triples {where}
+        GROUP BY entity, entity_tag ORDER BY count DESC LIMIT ?
+    ''', (*params, limit)).fetchall()
+    return [dict(row) for row in rows]
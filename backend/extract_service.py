@@ -1,15 +1,23 @@
 """
 抽取服务
 """
+import contextvars
 import os
 import json
+import hashlib
+import threading
 import time
 
-import PyPDF2
-import pandas as pd
-from typing import Callable, Optional
-import config
-import unstruct
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+# 与unstruct、llm等模块共用同一份配置与模块实例
+import backend.config as config
+import backend.unstruct as unstruct
+from backend.database import stage_cache_db
+from backend.metrics import CACHE_REQUESTS, PDF_PARSE_DURATION
+from backend.prompt import PromptRegistry
+from backend.tracing import start_span
+from backend.utils import CancelFlag, check_cancelled
 
 logger = config.setup_logging()
 
@@ -21,18 +29,26 @@ MODEL_ID = config.settings.model_id
 
 # 提取PDF文本内容
 def extract_text_from_pdf(pdf_path):
+    # PyPDF2与pandas较重，在首次使用时导入以缩短服务与命令行工具的启动时间
+    import PyPDF2
     text = ""
-    try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        return text
-    except Exception as e:
-        print(f"读取PDF出错 {pdf_path}: {e}")
-        return ""
+    start_time = time.time()
+    with start_span("pdf.parse") as span:
+        try:
+            with open(pdf_path, 'rb') as file:
+                reader = PyPDF2.PdfReader(file)
+                for page in reader.pages:
+                    page_text = page.extract_text()
+                    if page_text:
+                        text += page_text + "\n"
+                span.set_attributes({"pages": len(reader.pages), "chars": len(text)})
+            return text
+        except Exception as e:
+            span.set_error(e)
+            print(f"读取PDF出错 {pdf_path}: {e}")
+            return ""
+        finally:
+            PDF_PARSE_DURATION.observe(time.time() - start_time)
 
 # 判断文本是否包含中文字符
 def is_chinese_text(text):
@@ -46,6 +62,7 @@ def is_chinese_text(text):
 
 # 解析纯文本结果为七列数据结构
 def parse_text_result(text):
+    import pandas as pd
     columns = ["entity", "property", "value", "entityTag", "valueTag", "level", "valueType"]
     data = []
 
@@ -71,7 +88,37 @@ def parse_text_result(text):
     return pd.DataFrame(data, columns=columns)
 
 
-def extract(text, filename, progress_callback: Optional[Callable[[int, str], None]] = None):
+def _run_stage(stage: str, fingerprints: Optional[Dict[str, str]], inputs: tuple, fn: Callable, *args):
+    """
+    执行一个阶段，输入与阶段指纹都相同时直接返回缓存的输出
+
+    Args:
+        stage: 阶段名
+        fingerprints: 本次抽取使用的阶段指纹，为None时不使用缓存
+        inputs: 决定阶段输出的输入文本
+        fn: 阶段函数
+        *args: 阶段函数的参数
+
+    Returns:
+        阶段输出
+    """
+    if fingerprints is None:
+        return fn(*args)
+    input_hash = hashlib.sha256(json.dumps(inputs, ensure_ascii=False).encode("utf-8")).hexdigest()
+    cached = stage_cache_db.query_stage_result(stage, input_hash, fingerprints[stage])
+    if cached is not None:
+        CACHE_REQUESTS.inc(cache=f"stage.{stage}", result="hit")
+        return json.loads(cached)
+    CACHE_REQUESTS.inc(cache=f"stage.{stage}", result="miss")
+    output = fn(*args)
+    # 解析失败等空结果不缓存
+    if output:
+        stage_cache_db.insert_stage_result(stage, input_hash, fingerprints[stage], json.dumps(output, ensure_ascii=False))
+    return output
+
+
+def extract(text, filename, progress_callback: Optional[Callable[[int, str], None]] = None, task_id: Optional[str] = None,
+            fingerprints: Optional[Dict[str, str]] = None, cancel_flag: Optional[CancelFlag] = None):
     """
     执行知识抽取
 
@@ -79,6 +126,70 @@ def extract(text, filename, progress_callback: Optional[Callable[[int, str], Non
         text: 原文文本
         filename: 文件名
         progress_callback: 进度回调函数，接收进度百分比和消息
+        task_id: 任务ID，用于大模型用量统计
+        fingerprints: 各阶段的提示词指纹，默认取当前值；STAGE_CACHE关闭时不使用阶段缓存
+        cancel_flag: 取消标记，在阶段之间、原子之间与流式分片之间检查，取消后抛出TaskCancelledError
+    """
+    if config.settings.stage_cache:
+        fingerprints = fingerprints or PromptRegistry.fingerprints()
+    else:
+        fingerprints = None
+    with start_span("extract", filename=filename, task_id=task_id or "", text_chars=len(text or "")) as span:
+        result_df = _extract_pipeline(text, filename, progress_callback, task_id, fingerprints, cancel_flag)
+        span.set_attribute("rows", len(result_df))
+        return result_df
+
+
+def _extract_core_atoms(core_dict, layout_dict, filename, progress_callback: Optional[Callable[[int, str], None]],
+                        task_id: Optional[str], fingerprints: Optional[Dict[str, str]],
+                        cancel_flag: Optional[CancelFlag] = None) -> List[str]:
+    """
+    抽取各临床问题原子，CORE_PARALLELISM大于1时并行；每个原子在调用方上下文的副本中执行，
+    链路追踪的父span与大模型公平排队的租户不变，多个任务的大模型调用按调用粒度交替进行
+
+    Returns:
+        List[str]: 与原子顺序一致的抽取结果
+    """
+    atoms = core_dict['atom']
+    # 记录步长和初始进度
+    step = 70 / core_dict['total'] if core_dict['total'] else 0
+    state = {"progress": 31, "done": 0}
+    lock = threading.Lock()
+
+    def run_atom(i, atom_item):
+        # 已取消的任务不再启动后续原子
+        check_cancelled(cancel_flag)
+        with start_span("core.atom", index=i, chars=len(atom_item)):
+            temp_info = _run_stage("core", fingerprints, (atom_item, layout_dict['reference'], layout_dict['evidence']),
+                                   unstruct.core_extract, atom_item, layout_dict['reference'], layout_dict['evidence'],
+                                   filename, progress_callback, task_id, cancel_flag)
+        if progress_callback:
+            with lock:
+                state["progress"] += step
+                state["done"] += 1
+                progress_callback(state["progress"], f"已完成第{state['done']}个问题抽取")
+        return temp_info
+
+    workers = max(1, min(config.settings.core_parallelism, len(atoms)))
+    if workers == 1:
+        return [run_atom(i, atom_item) for i, atom_item in enumerate(atoms)]
+    contexts = [contextvars.copy_context() for _ in atoms]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="core-atom") as executor:
+        futures = [executor.submit(context.run, run_atom, i, atom_item)
+                   for context, (i, atom_item) in zip(contexts, enumerate(atoms))]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            # 任一原子失败（含取消）时不再启动其余原子
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def _extract_pipeline(text, filename, progress_callback: Optional[Callable[[int, str], None]] = None, task_id: Optional[str] = None,
+                      fingerprints: Optional[Dict[str, str]] = None, cancel_flag: Optional[CancelFlag] = None):
+    """
+    知识抽取流程，各阶段分别记录span，各阶段的输出按阶段指纹缓存，每个阶段开始前检查取消标记
     """
     if progress_callback:
         progress_callback(1, "抽取开始")
@@ -89,39 +200,45 @@ def extract(text, filename, progress_callback: Optional[Callable[[int, str], Non
         columns = ["entity", "property", "value", "entityTag", "valueTag", "level", "valueType"]
         if progress_callback:
             progress_callback(100, f"没有提取到文本，抽取结束")
+        import pandas as pd
         return pd.DataFrame(columns=columns)
     start_time = time.time()
     # 1.文档布局分析
-    layout_dict = unstruct.layout_analyze(text, filename, progress_callback)
+    check_cancelled(cancel_flag)
+    with start_span("stage.layout"):
+        layout_dict = _run_stage("layout", fingerprints, (text,),
+                                 unstruct.layout_analyze, text, filename, progress_callback, task_id, cancel_flag)
     logger.info(f"=={filename}文档布局分析完成==")
     # 2.核心内容分析
-    core_dict = unstruct.core_analyze(layout_dict['core'] , filename, progress_callback)
+    check_cancelled(cancel_flag)
+    with start_span("stage.segmentation") as span:
+        core_dict = _run_stage("segmentation", fingerprints, (layout_dict['core'],),
+                               unstruct.core_analyze, layout_dict['core'], filename, progress_callback, task_id, cancel_flag)
+        span.set_attribute("atoms", core_dict['total'])
     logger.info(f"=={filename}核心内容分析完成==")
     # 3.边缘信息处理
     edge_text = layout_dict['base'] + "\n" + layout_dict['evidence'] + '\n' + layout_dict['other'] + '\n' + layout_dict['reference']
-    edge_extract_info = unstruct.edge_extract(edge_text, filename, progress_callback)
+    check_cancelled(cancel_flag)
+    with start_span("stage.edge"):
+        edge_extract_info = _run_stage("edge", fingerprints, (edge_text,),
+                                       unstruct.edge_extract, edge_text, filename, progress_callback, task_id, cancel_flag)
     logger.info(f"=={filename}边缘信息抽取完成==")
     # 4.核心内容处理
-    core_extract_info = ""
     logger.info(f"{filename}核心内容抽取准备，共{core_dict['total']}个问题，准备抽取")
-    # 记录步长和初始进度
-    step = 70/core_dict['total']
-    progress = 31
+    check_cancelled(cancel_flag)
     if progress_callback:
         progress_callback(31, f"开始核心内容抽取，共{core_dict['total']}个问题")
-    for i, atom_item in enumerate(core_dict['atom']):
-        # 循环处理每个临床问题原子
-        temp_info = unstruct.core_extract(atom_item, layout_dict['reference'], layout_dict['evidence'], filename, progress_callback)
-        core_extract_info += temp_info
-        if progress_callback:
-            progress += step
-            progress_callback(progress, f"已完成第{i+1}个问题抽取")
+    with start_span("stage.core", atoms=core_dict['total']):
+        core_extract_info = "".join(_extract_core_atoms(core_dict, layout_dict, filename, progress_callback,
+                                                        task_id, fingerprints, cancel_flag))
     logger.info(f"=={filename}核心内容抽取完成==")
     #5.汇总结果
     full_response = edge_extract_info + '\n' + core_extract_info
 
     # 解析完整结果并返回DataFrame
-    result_df = parse_text_result(full_response)
+    with start_span("parse.result") as span:
+        result_df = parse_text_result(full_response)
+        span.set_attribute("rows", len(result_df))
     extract_time = time.time() - start_time
     if progress_callback:
         progress_callback(100, f"已完成抽取，耗时：{extract_time}")
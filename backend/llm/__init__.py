@@ -1,5 +1,15 @@
-from .llm_service import chat
+from .llm_service import chat, stream_chat
+from .usage import UsageTracker
+from .scheduler import FairScheduler, current_tenant
+from .stream_sink import StreamSink, create_sink, stream_hub
 
 __all__ = [
-    'chat'
-]
\ No newline at end of file
+    'chat',
+    'stream_chat',
+    'UsageTracker',
+    'FairScheduler',
+    'current_tenant',
+    'StreamSink',
+    'create_sink',
+    'stream_hub'
+]
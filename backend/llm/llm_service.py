@@ -1,33 +1,321 @@
 """
 LLM调用服务模块
 """
+import contextlib
+import json
+import socket
+import threading
+import time
+from typing import Callable, Dict, Optional
+
 import backend.config as config
 import requests
 
-# 大模型API配置
-API_KEY = config.settings.api_key
-API_URL = config.settings.api_url
-MODEL_ID = config.settings.model_id
+from backend.metrics import LLM_CANCELLED, LLM_ERRORS, LLM_INFLIGHT, LLM_LATENCY, LLM_RETRIES, LLM_SLOT_WAIT, LLM_TOKENS, LLM_TTFT
+from backend.tracing import start_span
+from backend.utils.cancel_util import CancelFlag, TaskCancelledError, check_cancelled
+from . import transcript
+from .stream_sink import create_sink
+from .scheduler import FairScheduler, parse_weights
+from .usage import UsageTracker
+
+logger = config.setup_logging()
+
+# 可重试的HTTP状态码（限流与网关错误）
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+# 大模型并发名额，按llm_max_concurrency与租户权重创建，配置变化时重建
+_scheduler: Optional[FairScheduler] = None
+_scheduler_config = None
+_scheduler_lock = threading.Lock()
+
+
+def _get_scheduler() -> Optional[FairScheduler]:
+    global _scheduler, _scheduler_config
+    settings = config.settings
+    size = settings.llm_max_concurrency
+    if size <= 0:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler_config != (size, settings.llm_tenant_weights):
+            _scheduler = FairScheduler(size, parse_weights(settings.llm_tenant_weights))
+            _scheduler_config = (size, settings.llm_tenant_weights)
+        return _scheduler
+
+
+@contextlib.contextmanager
+def llm_slot(stage: str | None = None, cancel_flag: Optional[CancelFlag] = None):
+    """
+    占用一个大模型并发名额，同时进行的调用超过llm_max_concurrency时按租户加权公平排队
+
+    Args:
+        stage: 调用所属阶段，用于统计等待时长
+        cancel_flag: 所属任务的取消标记，排队期间取消时不再等待名额
+    """
+    scheduler = _get_scheduler()
+    if scheduler is None:
+        yield
+        return
+    wait_start = time.time()
+    scheduler.acquire(cancel_flag=cancel_flag)
+    LLM_SLOT_WAIT.observe(time.time() - wait_start, stage=stage or "unknown")
+    LLM_INFLIGHT.inc()
+    try:
+        yield
+    finally:
+        LLM_INFLIGHT.dec()
+        scheduler.release()
+
+
+def _record_usage(stage, filename, task_id, prompt_tokens, completion_tokens, ttft, latency):
+    """记录用量并更新指标"""
+    stage_label = stage or "unknown"
+    LLM_LATENCY.observe(latency, stage=stage_label)
+    if ttft is not None:
+        LLM_TTFT.observe(ttft, stage=stage_label)
+    LLM_TOKENS.inc(prompt_tokens, stage=stage_label, type="prompt")
+    LLM_TOKENS.inc(completion_tokens, stage=stage_label, type="completion")
+    return UsageTracker.record(stage, filename, task_id, prompt_tokens, completion_tokens, ttft, latency)
+
+
+def chat(prompt:str, stream:bool|None = True, stage:str|None = None, filename:str|None = None, task_id:str|None = None,
+         cancel_flag: Optional[CancelFlag] = None):
+    """
+    调用大模型
+
+    Args:
+        prompt: 提示词
+        stream: 是否流式返回
+        stage: 调用所属阶段，用于用量统计
+        filename: 文件名，用于用量统计
+        task_id: 任务ID，用于用量统计
+        cancel_flag: 所属任务的取消标记，取消后不再排队等待名额与重试
 
-def chat(prompt:str, stream:bool|None = True):
+    Returns: 大模型返回Response，流式调用需由调用方消费，推荐使用stream_chat
+    """
+    # 大模型API配置在调用时读取，便于基准测试等场景运行时切换
+    settings = config.settings
     headers = {
         "Content-Type": "application/json",
-        "Authorization": f"Bearer {API_KEY}"
+        "Authorization": f"Bearer {settings.api_key}"
     }
     data = {
-        "model": MODEL_ID,
+        "model": settings.model_id,
         "messages": [
             {"role": "system", "content": "你是专业的医学信息提取工具，严格按照用户要求输出结果"},
             {"role": "user", "content": prompt}
         ],
-        "temperature": 0.2,
+        "temperature": settings.llm_temperature,
         "stream": stream  # 启用流式响应
     }
-    # 发送流式请求
-    response = requests.post(
-        API_URL,
-        headers=headers,
-        json=data,
-        stream=stream  # 保持连接打开，接收流式数据
-    )
-    return response
\ No newline at end of file
+    if stream and settings.llm_stream_usage:
+        # 要求在流式响应的最后一个分片中返回usage
+        data["stream_options"] = {"include_usage": True}
+    stage_label = stage or "unknown"
+    with start_span("llm.request", stage=stage_label, stream=bool(stream), prompt_chars=len(prompt)) as span:
+        # 流式调用的并发名额由stream_chat在接收完毕前一直占用
+        with (contextlib.nullcontext() if stream else llm_slot(stage_label, cancel_flag)):
+            # 从取得并发名额后开始计时，排队时长单独统计
+            start_time = time.time()
+            if settings.llm_transcript_mode == "replay":
+                # 回放模式不访问网络
+                response = transcript.replay(prompt, bool(stream))
+            else:
+                response = _post_with_retry(settings, headers, data, stream, stage_label, cancel_flag)
+                if settings.llm_transcript_mode == "record":
+                    response = transcript.record(response, prompt, bool(stream), stage, start_time)
+        span.set_attribute("status_code", response.status_code)
+
+    if not response.ok:
+        LLM_ERRORS.inc(stage=stage_label)
+    elif not stream:
+        # 非流式调用在此记录用量，首token时延即为总耗时
+        latency = time.time() - start_time
+        try:
+            usage = response.json().get("usage") or {}
+        except ValueError:
+            usage = {}
+        _record_usage(stage, filename, task_id,
+                      usage.get("prompt_tokens", 0),
+                      usage.get("completion_tokens", 0),
+                      latency, latency)
+    return response
+
+
+def _post_with_retry(settings, headers, data, stream, stage_label, cancel_flag=None):
+    """发送请求，连接错误、限流与网关错误时按指数退避重试，任务取消后不再重试"""
+    max_retries = settings.llm_max_retries
+    for attempt in range(max_retries + 1):
+        check_cancelled(cancel_flag)
+        try:
+            # 发送流式请求
+            response = requests.post(
+                settings.api_url,
+                headers=headers,
+                json=data,
+                stream=stream  # 保持连接打开，接收流式数据
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= max_retries:
+                LLM_ERRORS.inc(stage=stage_label)
+                raise
+            logger.warning(f"[{stage_label}] 大模型连接失败，准备第{attempt + 1}次重试: {e}")
+        else:
+            if response.status_code not in RETRYABLE_STATUS or attempt >= max_retries:
+                break
+            logger.warning(f"[{stage_label}] 大模型返回{response.status_code}，准备第{attempt + 1}次重试")
+            response.close()
+        LLM_RETRIES.inc(stage=stage_label)
+        backoff = settings.llm_retry_backoff * (2 ** attempt)
+        if cancel_flag is not None:
+            cancel_flag.wait(backoff)
+        else:
+            time.sleep(backoff)
+    return response
+
+
+def stream_chat(prompt:str, stage:str, filename:str|None = None, task_id:str|None = None,
+                on_content: Optional[Callable[[int], None]] = None, cancel_flag: Optional[CancelFlag] = None) -> str:
+    """
+    流式调用大模型并累积完整结果，同时记录token用量、首token时延与生成速度
+
+    Args:
+        prompt: 提示词
+        stage: 调用所属阶段
+        filename: 文件名
+        task_id: 任务ID
+        on_content: 每收到一个内容片段时的回调，接收已收到的片段数
+        cancel_flag: 所属任务的取消标记，取消时立即关闭连接并释放并发名额
+
+    Returns:
+        str: 完整的大模型输出
+
+    Raises:
+        TaskCancelledError: 调用期间任务被取消
+    """
+    check_cancelled(cancel_flag)
+    with start_span("llm.stream", stage=stage or "unknown") as span, llm_slot(stage, cancel_flag):
+        start_time = time.time()
+        response = chat(prompt, True, stage, filename, task_id, cancel_flag)
+        response.raise_for_status()
+        # 取消时由取消方的线程关闭套接字，阻塞在读取分片上的工作线程随即退出
+        remove_callback = (cancel_flag.add_callback(lambda: _abort_stream(response))
+                           if cancel_flag is not None else None)
+        try:
+            record = _consume_stream(response, stage, filename, task_id, on_content, start_time, cancel_flag)
+            # 连接被关闭后迭代可能正常结束，不能把截断的输出当作完整结果
+            check_cancelled(cancel_flag)
+        except Exception as e:
+            if cancel_flag is not None and cancel_flag.cancelled:
+                LLM_CANCELLED.inc(stage=stage or "unknown")
+                logger.info(f"[{stage}] {filename} 任务已取消，大模型流式连接已关闭")
+                if isinstance(e, TaskCancelledError):
+                    raise
+                raise TaskCancelledError("任务已取消") from e
+            LLM_ERRORS.inc(stage=stage or "unknown")
+            raise
+        finally:
+            if remove_callback is not None:
+                remove_callback()
+        span.set_attributes({
+            "prompt_tokens": record["prompt_tokens"],
+            "completion_tokens": record["completion_tokens"],
+            "ttft": record["ttft"] if record["ttft"] is not None else -1.0
+        })
+        return record["content"]
+
+
+def _abort_stream(response) -> None:
+    """
+    中断流式响应：先关闭底层套接字的读写，唤醒阻塞在recv上的线程（仅关闭Response不会唤醒），再关闭Response
+    """
+    raw = getattr(response, "raw", None)
+    connection = getattr(raw, "connection", None) or getattr(raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        # 取不到连接时从http.client的响应对象中取套接字
+        fp = getattr(getattr(raw, "_fp", None), "fp", None)
+        sock = getattr(getattr(fp, "raw", fp), "_sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+def _consume_stream(response, stage, filename, task_id, on_content, start_time, cancel_flag=None) -> Dict:
+    """迭代SSE响应，累积内容并记录用量，返回用量记录及完整内容；每个分片之间检查取消标记"""
+    # 累积完整结果的片段
+    parts = []
+    ttft = None
+    usage = None
+    # 内容片段交给配置的输出端，默认不做任何逐token的I/O
+    sink = create_sink(stage, filename, task_id)
+    cancelled = False
+    try:
+        # 迭代处理流式响应
+        for line in response.iter_lines():
+            if cancel_flag is not None and cancel_flag.cancelled:
+                cancelled = True
+                break
+            if not line:
+                continue
+            # 解析SSE格式（去除"data:"前缀）
+            line = line.decode('utf-8')
+            if line.startswith('data:'):
+                line = line[5:].strip()
+            if line == '[DONE]':  # 流式结束标记
+                logger.info("流式响应处理完成")
+                break
+            try:
+                chunk = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(chunk, dict):
+                continue
+            # usage通常在最后一个分片中返回，且该分片的choices可能为空
+            if chunk.get("usage"):
+                usage = chunk["usage"]
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+            # 提取当前片段的内容
+            content = (choices[0].get("delta") or {}).get("content") or ""
+            if content:
+                if ttft is None:
+                    ttft = time.time() - start_time
+                sink.write(content)
+                parts.append(content)
+                if on_content:
+                    on_content(len(parts))
+    except Exception:
+        # 取消方关闭连接后，阻塞中的读取会抛出连接异常
+        if cancel_flag is None or not cancel_flag.cancelled:
+            raise
+        cancelled = True
+    finally:
+        sink.close()
+    # 套接字被关闭后迭代可能以EOF正常结束
+    if cancel_flag is not None and cancel_flag.cancelled:
+        cancelled = True
+
+    latency = time.time() - start_time
+    if usage:
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+    elif cancelled:
+        # 中断的调用没有usage，已生成的片段同样计入用量
+        prompt_tokens = 0
+        completion_tokens = len(parts)
+    else:
+        # 服务端未返回usage时，以内容片段数近似输出token数
+        logger.warning(f"[{stage}] {filename} 大模型未返回usage，按片段数估算输出token")
+        prompt_tokens = 0
+        completion_tokens = len(parts)
+    record = _record_usage(stage, filename, task_id, prompt_tokens, completion_tokens, ttft, latency)
+    if cancelled:
+        response.close()
+        raise TaskCancelledError("任务已取消")
+    record["content"] = "".join(parts)
+    return record
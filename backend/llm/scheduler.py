@@ -0,0 +1,141 @@
+"""
+大模型调用的加权公平排队
+同时进行的调用数受llm_max_concurrency限制，名额不足时按租户（提交请求的API密钥）做加权公平排队：
+每次调用按所属租户的权重计算虚拟完成时间（起始时间取全局虚拟时间与该租户上一次调用完成时间的较大者），
+空出的名额总是分配给虚拟完成时间最小的等待者。调用多的租户排在后面，
+新到达的小任务不会被大任务已排队的大量调用阻塞
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+from typing import Dict, List, Optional
+
+from backend.utils.cancel_util import CancelFlag
+
+# 当前调用所属的租户（API密钥的key_id），未设置的调用归入默认租户
+current_tenant: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_tenant", default=None)
+
+DEFAULT_TENANT = "default"
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """
+    解析租户权重配置
+
+    Args:
+        spec: 逗号分隔的"租户:权重"，如"abc123:2,def456:0.5"
+
+    Returns:
+        Dict[str, float]: 租户到权重的映射
+    """
+    weights = {}
+    for item in spec.split(","):
+        tenant, _, weight = item.strip().rpartition(":")
+        if tenant:
+            weights[tenant] = float(weight)
+    return weights
+
+
+class FairScheduler:
+    """按租户加权公平分配并发名额"""
+
+    def __init__(self, capacity: int, weights: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            capacity: 并发名额数
+            weights: 租户权重，未配置的租户权重为1
+        """
+        self.capacity = capacity
+        self.weights = weights or {}
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        # [虚拟完成时间, 序号, 租户, 本次调用占用的虚拟时长]，取消时需要修改同租户后续等待者的完成时间
+        self._waiting: List[list] = []
+        self._seq = itertools.count()
+
+    def _span(self, tenant: str, cost: float) -> float:
+        return cost / max(self.weights.get(tenant, 1.0), 1e-6)
+
+    def _tag(self, tenant: str, cost: float) -> float:
+        start = max(self._virtual_time, self._last_finish.get(tenant, 0.0))
+        finish = start + self._span(tenant, cost)
+        self._last_finish[tenant] = finish
+        return finish
+
+    def _withdraw(self, entry: list) -> None:
+        """
+        等待者因取消退出队列：归还其占用的虚拟时长，同租户排在其后的等待者与该租户的完成时间相应提前，
+        未执行的调用不计入租户的用量
+        """
+        _, seq, tenant, span = entry
+        self._waiting.remove(entry)
+        for other in self._waiting:
+            if other[2] == tenant and other[1] > seq:
+                other[0] -= span
+        heapq.heapify(self._waiting)
+        if tenant in self._last_finish:
+            self._last_finish[tenant] = max(self._last_finish[tenant] - span, 0.0)
+
+    def acquire(self, tenant: Optional[str] = None, cost: float = 1.0, cancel_flag: Optional[CancelFlag] = None) -> None:
+        """
+        取得一个名额，名额不足时按虚拟完成时间排队
+
+        Args:
+            tenant: 租户，默认取current_tenant
+            cost: 本次调用的相对开销
+            cancel_flag: 所属任务的取消标记，排队期间取消时立即退出队列
+
+        Raises:
+            TaskCancelledError: 排队期间任务被取消
+        """
+        tenant = tenant or current_tenant.get() or DEFAULT_TENANT
+        remove_callback = cancel_flag.add_callback(self._wake) if cancel_flag is not None else None
+        try:
+            self._acquire(tenant, cost, cancel_flag)
+        finally:
+            if remove_callback is not None:
+                remove_callback()
+
+    def _wake(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def _acquire(self, tenant: str, cost: float, cancel_flag: Optional[CancelFlag]) -> None:
+        with self._cond:
+            span = self._span(tenant, cost)
+            entry = [self._tag(tenant, cost), next(self._seq), tenant, span]
+            heapq.heappush(self._waiting, entry)
+            while self._in_use >= self.capacity or self._waiting[0] is not entry:
+                if cancel_flag is not None and cancel_flag.cancelled:
+                    # 退出队列，后面的等待者可能因此排到队首
+                    self._withdraw(entry)
+                    self._cond.notify_all()
+                    cancel_flag.check()
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._in_use += 1
+            # 虚拟时间推进到已开始调用的开始时间（完成时间可能因同租户的取消而提前，以出队时为准）
+            self._virtual_time = max(self._virtual_time, entry[0] - span)
+            if len(self._last_finish) > 10000:
+                # 长时间运行后清理已落后于虚拟时间的租户记录
+                self._last_finish = {t: f for t, f in self._last_finish.items() if f > self._virtual_time}
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: 各租户正在等待的调用数
+        """
+        with self._cond:
+            waiting: Dict[str, int] = {}
+            for _, _, tenant, _ in self._waiting:
+                waiting[tenant] = waiting.get(tenant, 0) + 1
+            return waiting
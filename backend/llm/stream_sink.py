@@ -0,0 +1,213 @@
+"""
+流式输出去向
+大模型流式响应的内容片段不再逐token打印，而是交给按配置选择的输出端：
+- none：不输出（服务默认），热循环中没有任何额外I/O
+- log：在内存中缓冲，按行或缓冲区大小批量写入日志
+- file：按任务写入独立文件，带缓冲
+- sse：推送给订阅该任务的客户端（GET /task/{task_id}/stream）
+- stdout：缓冲后写标准输出，便于本地调试
+"""
+import os
+import queue
+import re
+import sys
+import threading
+from typing import Dict, List, Optional
+
+import backend.config as config
+
+logger = config.setup_logging()
+
+SINK_TYPES = ("none", "log", "file", "sse", "stdout")
+
+
+class StreamSink:
+    """输出端基类，默认丢弃所有内容"""
+
+    def write(self, content: str) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+NULL_SINK = StreamSink()
+
+
+class _BufferedSink(StreamSink):
+    """缓冲内容片段，累积到指定大小后一次性输出"""
+
+    def __init__(self, buffer_size: int):
+        self._parts: List[str] = []
+        self._size = 0
+        self._buffer_size = buffer_size
+
+    def write(self, content: str) -> None:
+        self._parts.append(content)
+        self._size += len(content)
+        if self._size >= self._buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._parts:
+            text = "".join(self._parts)
+            self._parts.clear()
+            self._size = 0
+            self._emit(text)
+
+    def close(self) -> None:
+        self.flush()
+
+    def _emit(self, text: str) -> None:
+        raise NotImplementedError
+
+
+class LogSink(_BufferedSink):
+    """批量写入日志，按行输出完整内容"""
+
+    def __init__(self, stage: str, filename: Optional[str], buffer_size: int):
+        super().__init__(buffer_size)
+        self._prefix = f"[{stage}] {filename or ''}".rstrip()
+        self._pending = ""
+
+    def _emit(self, text: str) -> None:
+        # 未结束的行留到下一次输出，避免一行内容被拆成多条日志
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                logger.debug(f"{self._prefix} {line}")
+
+    def close(self) -> None:
+        super().close()
+        if self._pending.strip():
+            logger.debug(f"{self._prefix} {self._pending}")
+        self._pending = ""
+
+
+class FileSink(_BufferedSink):
+    """每个任务写入独立文件，同一任务的多个阶段按顺序追加"""
+
+    def __init__(self, path: str, stage: str, buffer_size: int):
+        super().__init__(buffer_size)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=buffer_size)
+        self._file.write(f"\n===== {stage} =====\n")
+
+    def _emit(self, text: str) -> None:
+        self._file.write(text)
+
+    def close(self) -> None:
+        super().close()
+        self._file.close()
+
+
+class StdoutSink(_BufferedSink):
+    """缓冲后写标准输出"""
+
+    def _emit(self, text: str) -> None:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+
+class StreamHub:
+    """任务级的流式内容分发，生产者为抽取线程，消费者为SSE连接"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[queue.Queue]] = {}
+
+    def has_subscribers(self, task_id: str) -> bool:
+        return bool(self._subscribers.get(task_id))
+
+    def subscribe(self, task_id: str) -> queue.Queue:
+        """
+        订阅任务的流式内容
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            queue.Queue: 接收(stage, content)的队列，任务结束时收到None
+        """
+        subscriber = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(task_id, []).append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, task_id: str, subscriber: queue.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(task_id, [])
+            if subscriber in subscribers:
+                subscribers.remove(subscriber)
+            if not subscribers:
+                self._subscribers.pop(task_id, None)
+
+    def publish(self, task_id: str, stage: str, content: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(task_id, ()))
+        for subscriber in subscribers:
+            subscriber.put((stage, content))
+
+    def close(self, task_id: str) -> None:
+        """任务结束，通知所有订阅者"""
+        with self._lock:
+            subscribers = self._subscribers.pop(task_id, [])
+        for subscriber in subscribers:
+            subscriber.put(None)
+
+
+stream_hub = StreamHub()
+
+
+class SSESink(_BufferedSink):
+    """推送给订阅该任务的客户端，无订阅者时直接丢弃"""
+
+    def __init__(self, task_id: str, stage: str, buffer_size: int):
+        super().__init__(buffer_size)
+        self._task_id = task_id
+        self._stage = stage
+
+    def write(self, content: str) -> None:
+        if stream_hub.has_subscribers(self._task_id):
+            super().write(content)
+
+    def _emit(self, text: str) -> None:
+        stream_hub.publish(self._task_id, self._stage, text)
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.\-]", "_", name)
+
+
+def create_sink(stage: Optional[str], filename: Optional[str] = None, task_id: Optional[str] = None) -> StreamSink:
+    """
+    按配置创建一次流式调用的输出端，配置在调用时读取
+
+    Args:
+        stage: 调用所属阶段
+        filename: 文件名
+        task_id: 任务ID，file与sse输出端按任务区分
+
+    Returns:
+        StreamSink: 输出端，调用方结束时需调用close
+    """
+    settings = config.settings
+    sink_type = (settings.stream_sink or "none").strip().lower()
+    stage = stage or "unknown"
+    buffer_size = max(settings.stream_sink_buffer, 1)
+    if sink_type == "none":
+        return NULL_SINK
+    if sink_type == "log":
+        return LogSink(stage, filename, buffer_size)
+    if sink_type == "file":
+        name = _safe_name(task_id or filename or "stream")
+        return FileSink(os.path.join(settings.stream_sink_dir, f"{name}.log"), stage, buffer_size)
+    if sink_type == "sse":
+        # SSE需要及时送达，缓冲区取较小值
+        return SSESink(task_id, stage, min(buffer_size, 256)) if task_id else NULL_SINK
+    if sink_type == "stdout":
+        return StdoutSink(buffer_size)
+    raise ValueError(f"未知的流式输出端: {sink_type}，可选 {', '.join(SINK_TYPES)}")
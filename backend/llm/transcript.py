@@ -0,0 +1,252 @@
+"""
+大模型调用记录与回放
+record模式将每次请求的响应流（含分片到达间隔）写入gzip压缩的JSONL文件，
+replay模式按提示词摘要从文件中取出记录，以原速或加速回放，不访问网络
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+import backend.config as config
+
+logger = config.setup_logging()
+
+
+class TranscriptNotFoundError(Exception):
+    """回放文件中没有对应提示词的记录"""
+
+
+def prompt_hash(prompt: str) -> str:
+    """
+    提示词摘要，作为记录的匹配键
+
+    Args:
+        prompt: 提示词
+
+    Returns:
+        str: sha256十六进制摘要
+    """
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def load_transcripts(path: str) -> Dict[str, List[Dict]]:
+    """
+    读取记录文件
+
+    Args:
+        path: 记录文件路径，.gz结尾按gzip读取
+
+    Returns:
+        Dict[str, List[Dict]]: 提示词摘要到记录列表的映射，同一提示词的多次记录按写入顺序排列
+    """
+    transcripts: Dict[str, List[Dict]] = {}
+    with _open(path, "r") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    transcripts.setdefault(entry["key"], []).append(entry)
+        except EOFError:
+            # 进程异常退出时gzip尾部可能不完整，保留已读出的记录
+            logger.warning(f"记录文件 {path} 末尾不完整，已忽略")
+    return transcripts
+
+
+class TranscriptWriter:
+    """记录文件写入器，多线程共享"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, entry: Dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # gzip允许多个member顺序拼接，逐条追加即可
+            with _open(self.path, "a") as f:
+                f.write(line)
+
+
+class RecordingResponse:
+    """包装真实Response，在消费流的同时记录分片及到达间隔"""
+
+    def __init__(self, response, writer: TranscriptWriter, key: str, stage: Optional[str], start_time: float):
+        self._response = response
+        self._writer = writer
+        self._key = key
+        self._stage = stage
+        # 从请求发出时开始计时，首个分片的间隔即为首token时延
+        self._start_time = start_time
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def iter_lines(self, *args, **kwargs) -> Iterator[bytes]:
+        chunks = []
+        last_time = self._start_time
+        complete = False
+        try:
+            for line in self._response.iter_lines(*args, **kwargs):
+                now = time.time()
+                chunks.append([round(now - last_time, 4), line.decode("utf-8") if isinstance(line, bytes) else line])
+                last_time = now
+                yield line
+            complete = True
+        finally:
+            # 未完整消费的流不写入，避免回放出截断的结果
+            if complete or (chunks and chunks[-1][1].endswith("[DONE]")):
+                self._writer.append({
+                    "key": self._key,
+                    "stage": self._stage,
+                    "status": self._response.status_code,
+                    "stream": True,
+                    "recorded_at": self._start_time,
+                    "chunks": chunks
+                })
+
+
+class ReplayResponse:
+    """回放的响应，提供chat调用方用到的Response接口"""
+
+    def __init__(self, entry: Dict, speed: float):
+        self._entry = entry
+        self._speed = speed
+        self.status_code = entry.get("status", 200)
+        self.ok = self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        if self._entry.get("stream"):
+            return "\n".join(line for _, line in self._entry["chunks"])
+        return self._entry.get("body", "")
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise requests.HTTPError(f"{self.status_code} 回放的错误响应", response=self)
+
+    def iter_lines(self, *args, **kwargs) -> Iterator[bytes]:
+        if not self._entry.get("stream"):
+            yield from (line.encode("utf-8") for line in self.text.split("\n"))
+            return
+        # 每个分片按记录的到达间隔等待，首个分片的间隔即首token时延
+        for delay, line in self._entry["chunks"]:
+            if self._speed > 0 and delay > 0:
+                time.sleep(delay / self._speed)
+            yield line.encode("utf-8")
+
+    def close(self) -> None:
+        pass
+
+
+class TranscriptPlayer:
+    """按提示词摘要回放记录，同一提示词的多条记录依次轮换"""
+
+    def __init__(self, path: str, speed: float = 0.0):
+        """
+        Args:
+            path: 记录文件路径
+            speed: 回放速度倍率，1为原速，2为两倍速，0为不等待
+        """
+        self.path = path
+        self.speed = speed
+        self._transcripts = load_transcripts(path)
+        self._cursor: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        logger.info(f"已加载 {sum(len(v) for v in self._transcripts.values())} 条大模型调用记录: {path}")
+
+    def replay(self, prompt: str, stream: bool) -> ReplayResponse:
+        key = prompt_hash(prompt)
+        entries = [entry for entry in self._transcripts.get(key, []) if bool(entry.get("stream")) == bool(stream)]
+        if not entries:
+            raise TranscriptNotFoundError(f"回放文件中没有该提示词的记录: {key}")
+        with self._lock:
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+        entry = entries[index % len(entries)]
+        if not stream and self.speed > 0:
+            time.sleep(entry.get("latency", 0) / self.speed)
+        return ReplayResponse(entry, self.speed)
+
+
+_writer: Optional[TranscriptWriter] = None
+_player: Optional[TranscriptPlayer] = None
+_init_lock = threading.Lock()
+
+
+def get_writer() -> TranscriptWriter:
+    global _writer
+    with _init_lock:
+        if _writer is None or _writer.path != config.settings.llm_transcript_path:
+            _writer = TranscriptWriter(config.settings.llm_transcript_path)
+        return _writer
+
+
+def get_player() -> TranscriptPlayer:
+    global _player
+    settings = config.settings
+    with _init_lock:
+        if _player is None or _player.path != settings.llm_transcript_path:
+            _player = TranscriptPlayer(settings.llm_transcript_path, settings.llm_replay_speed)
+        _player.speed = settings.llm_replay_speed
+        return _player
+
+
+def record(response, prompt: str, stream: bool, stage: Optional[str], start_time: float):
+    """
+    记录一次真实调用
+
+    Args:
+        response: 真实Response
+        prompt: 提示词
+        stream: 是否流式调用
+        stage: 调用所属阶段
+        start_time: 请求发出时间
+
+    Returns:
+        流式调用返回包装后的响应（消费完毕后写入），非流式调用写入后原样返回
+    """
+    key = prompt_hash(prompt)
+    if stream:
+        return RecordingResponse(response, get_writer(), key, stage, start_time)
+    get_writer().append({
+        "key": key,
+        "stage": stage,
+        "status": response.status_code,
+        "stream": False,
+        "recorded_at": start_time,
+        "latency": round(time.time() - start_time, 4),
+        "body": response.text
+    })
+    return response
+
+
+def replay(prompt: str, stream: bool) -> ReplayResponse:
+    """
+    回放一次调用
+
+    Args:
+        prompt: 提示词
+        stream: 是否流式调用
+
+    Returns:
+        ReplayResponse: 回放的响应
+    """
+    return get_player().replay(prompt, stream)
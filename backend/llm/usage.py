@@ -0,0 +1,175 @@
+"""
+大模型调用用量统计模块
+记录每次chat调用的token消耗、首token时延(TTFT)、生成速度与总耗时，并按阶段、任务汇总
+"""
+import threading
+from typing import Callable, Dict, List, Optional
+
+import backend.config as config
+
+logger = config.setup_logging()
+
+# 抽取流程中的阶段标识
+STAGES = ("layout", "segmentation", "edge", "core", "judge")
+
+_lock = threading.Lock()
+# 按阶段汇总的全局用量
+stage_usage: Dict[str, Dict] = {}
+# 按任务汇总的用量，key为task_id
+task_usage: Dict[str, Dict] = {}
+# 每次调用记录后通知的回调，如按API密钥统计配额
+_listeners: List[Callable[[Dict], None]] = []
+
+
+def _empty_summary() -> Dict:
+    return {
+        "calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_latency": 0.0,
+        "total_ttft": 0.0,
+        "ttft_calls": 0,
+        "generation_time": 0.0
+    }
+
+
+def _accumulate(summary: Dict, record: Dict) -> None:
+    summary["calls"] += 1
+    summary["prompt_tokens"] += record["prompt_tokens"]
+    summary["completion_tokens"] += record["completion_tokens"]
+    summary["total_latency"] += record["latency"]
+    if record["ttft"] is not None:
+        summary["total_ttft"] += record["ttft"]
+        summary["ttft_calls"] += 1
+        summary["generation_time"] += max(record["latency"] - record["ttft"], 0.0)
+
+
+def _format_summary(summary: Dict) -> Dict:
+    calls = summary["calls"]
+    ttft_calls = summary["ttft_calls"]
+    generation_time = summary["generation_time"]
+    return {
+        "calls": calls,
+        "prompt_tokens": summary["prompt_tokens"],
+        "completion_tokens": summary["completion_tokens"],
+        "total_tokens": summary["prompt_tokens"] + summary["completion_tokens"],
+        "total_latency": round(summary["total_latency"], 3),
+        "avg_latency": round(summary["total_latency"] / calls, 3) if calls else None,
+        "avg_ttft": round(summary["total_ttft"] / ttft_calls, 3) if ttft_calls else None,
+        "tokens_per_sec": round(summary["completion_tokens"] / generation_time, 2) if generation_time > 0 else None
+    }
+
+
+class UsageTracker:
+    """大模型用量统计管理器"""
+
+    @staticmethod
+    def record(stage: Optional[str],
+               filename: Optional[str],
+               task_id: Optional[str],
+               prompt_tokens: int,
+               completion_tokens: int,
+               ttft: Optional[float],
+               latency: float) -> Dict:
+        """
+        记录一次大模型调用
+
+        Args:
+            stage: 阶段标识，取值见STAGES
+            filename: 文件名
+            task_id: 任务ID，非任务调用（如命令行工具）为None
+            prompt_tokens: 输入token数
+            completion_tokens: 输出token数
+            ttft: 首token时延(秒)，非流式调用等于总耗时
+            latency: 调用总耗时(秒)
+
+        Returns:
+            Dict: 本次调用记录
+        """
+        stage = stage or "unknown"
+        generation_time = latency - ttft if ttft is not None else 0.0
+        record = {
+            "stage": stage,
+            "filename": filename,
+            "task_id": task_id,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "ttft": ttft,
+            "latency": latency,
+            "tokens_per_sec": completion_tokens / generation_time if generation_time > 0 else None
+        }
+        with _lock:
+            _accumulate(stage_usage.setdefault(stage, _empty_summary()), record)
+            if task_id:
+                stages = task_usage.setdefault(task_id, {})
+                _accumulate(stages.setdefault(stage, _empty_summary()), record)
+
+        for listener in _listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                logger.error(f"用量回调执行失败: {e}")
+
+        ttft_text = f"{ttft:.2f}s" if ttft is not None else "-"
+        speed_text = f"{record['tokens_per_sec']:.1f}" if record["tokens_per_sec"] else "-"
+        logger.info(f"[{stage}] {filename} 大模型调用完成: prompt_tokens={prompt_tokens}, "
+                    f"completion_tokens={completion_tokens}, ttft={ttft_text}, "
+                    f"tokens/s={speed_text}, latency={latency:.2f}s")
+        return record
+
+    @staticmethod
+    def add_listener(listener: Callable[[Dict], None]) -> None:
+        """
+        注册用量回调，每次调用记录后在调用线程中执行
+
+        Args:
+            listener: 接收本次调用记录的函数
+        """
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+    @staticmethod
+    def get_task_usage(task_id: str) -> Optional[Dict]:
+        """
+        获取指定任务的用量汇总
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            Optional[Dict]: 包含total与各阶段明细的汇总，无记录返回None
+        """
+        with _lock:
+            stages = task_usage.get(task_id)
+            if not stages:
+                return None
+            total = _empty_summary()
+            for summary in stages.values():
+                for key in total:
+                    total[key] += summary[key]
+            return {
+                "total": _format_summary(total),
+                "stages": {stage: _format_summary(summary) for stage, summary in stages.items()}
+            }
+
+    @staticmethod
+    def remove_task_usage(task_id: str) -> None:
+        """
+        删除指定任务的用量记录
+
+        Args:
+            task_id: 任务ID
+        """
+        with _lock:
+            task_usage.pop(task_id, None)
+
+    @staticmethod
+    def get_stage_summary() -> Dict:
+        """
+        获取全局按阶段汇总的用量
+
+        Returns:
+            Dict: 阶段标识到汇总数据的映射
+        """
+        with _lock:
+            return {stage: _format_summary(summary) for stage, summary in stage_usage.items()}
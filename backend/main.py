@@ -1,25 +1,44 @@
+import asyncio
+import json
 import os
+import queue
 import sys
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-import tempfile
-import threading
 import time
-import uuid
-from datetime import datetime
-from typing import Dict
 from typing import List, Optional
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Depends, Request, APIRouter
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
-from extract_service import extract_text_from_pdf, extract
-from database import init_db
-from config import setup_logging
+import backend.config as config
+from backend.llm import UsageTracker, stream_hub
+from backend.metrics import REGISTRY, CACHE_REQUESTS
+from backend.tracing import setup_tracing, get_memory_exporter
+from backend.task import (
+    tasks,
+    TaskStore,
+    submit_extraction_task,
+    extraction_key,
+    UploadTooLarge,
+    InvalidUpload,
+    spool_multipart,
+    remove_spooled,
+    cleanup_spool_dir,
+    expand_rows,
+    encode_body,
+    start_sweeper,
+    KeyQuota,
+    current_key
+)
+from backend.mcp_support.tool_service import judge_contents
+from backend.database import init_db, task_db, triple_db
+from backend.config import setup_logging
 from sercurity import (
-    api_key_cache as api_keys,
     APIKeyManager,
+    KeyStoreUnavailable,
     APIKeyResponse,
     APIKeyRequest,
     APIKeyListResponse,
@@ -37,34 +56,59 @@ logger.info("-----数据库初始化完毕-----")
 # 加载API密钥
 APIKeyManager.load_api_keys_to_cache()
 logger.info("-----令牌缓存加载完毕-----")
+# 注册链路追踪导出器
+setup_tracing()
+# 清理异常退出遗留的上传暂存文件，多个工作进程共用暂存目录时只清理一天前的文件
+cleanup_spool_dir(24 * 3600)
+# 按保留策略定期清理已结束的任务、遗留的暂存文件与过期的持久化记录
+start_sweeper()
 
 
 app = FastAPI(title="知识抽取API",
               description="将医学指南文档中的知识通过大模型抽取为结构化数据",
               version="1.0.0")
 
-router = APIRouter(prefix="/medicalGuideLine/knowledgeExtract")
+# 超过1KB的响应按客户端的Accept-Encoding压缩，SSE不压缩
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
-# 存储任务状态的字典
-tasks: Dict[str, dict] = {}
+router = APIRouter(prefix="/medicalGuideLine/knowledgeExtract")
 
 # 多线程任务状态响应体
 class TaskStatus(BaseModel):
     task_id: str
     tag: str # 通常为文件名称，用于标记当前任务
-    status: str  # pending, processing, completed, failed
+    status: str  # pending, processing, completed, failed, cancelled
     progress: int  # 0-100
     message: str
     result: Optional[dict] = None
     start_time: Optional[str] = None  # 任务开始时间
     end_time: Optional[str] = None  # 任务结束时间
     duration: Optional[float] = None  # 任务处理时长(秒)
+    usage: Optional[dict] = None  # 大模型用量统计
+    deduplicated: bool = False  # 是否复用了相同内容的已有任务
+    result_count: Optional[int] = None  # 结果行数，精简状态接口中代替result返回
 
 # 任务列表响应
 class TaskListResponse(BaseModel):
     tasks: List[TaskStatus]
     total: int
 
+# 三元组查询响应
+class TripleQueryResponse(BaseModel):
+    triples: List[dict]
+    total: int
+    offset: int
+    next_offset: Optional[int] = None  # 没有更多结果时为None
+
+# 批量内容判断请求
+class JudgeBatchRequest(BaseModel):
+    contents: List[str]
+
+# 批量内容判断响应，results与contents顺序一致
+class JudgeBatchResponse(BaseModel):
+    results: List[bool]
+    count: int
+
 @app.middleware("http")
 async def api_key_check(request: Request, call_next):
     """
@@ -76,12 +120,41 @@ async def api_key_check(request: Request, call_next):
     # 从请求头获取API密钥
     api_key = request.headers.get("X-API-Key")
 
-    # 验证API密钥
-    if not api_key or api_key not in api_keys:
+    # 验证API密钥；服务端密钥无法读取时返回503，而不是把有效密钥当作无效
+    try:
+        valid = bool(api_key) and APIKeyManager.is_api_key_valid(api_key)
+    except KeyStoreUnavailable as e:
+        logger.error(f"API密钥校验失败: {e}")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "API密钥校验暂不可用，请稍后重试"},
+            headers={"Retry-After": "1"}
+        )
+    if not valid:
+        CACHE_REQUESTS.inc(cache="api_key", result="miss")
         return JSONResponse(
             status_code=401,
             content={"detail": "无效的API密钥"}
         )
+    CACHE_REQUESTS.inc(cache="api_key", result="hit")
+
+    # 按密钥限制请求速率；提交类请求（POST）在当日token用尽后拒绝
+    key_id = APIKeyManager.key_id(api_key)
+    retry_after = KeyQuota.check_rate(key_id)
+    if retry_after:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "请求过于频繁，请稍后重试"},
+            headers={"Retry-After": str(max(int(retry_after + 0.999), 1))}
+        )
+    if request.method == "POST" and KeyQuota.daily_tokens_exhausted(key_id):
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "API密钥当日的大模型token已用尽"}
+        )
+    # 记录请求所属的密钥，任务与大模型用量据此归属
+    request.state.key_id = key_id
+    current_key.set(key_id)
     return await call_next(request)
 @router.get("/public/check")
 async def root():
@@ -89,6 +162,13 @@ async def root():
             "version": "1.0.0",
             "description": "上传PDF文件以抽取其中的医学知识"}
 
+@router.get("/public/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus格式的服务运行指标
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @router.post("/public/create-api-key", response_model=APIKeyResponse)
 async def create_api_key(key_request: APIKeyRequest):
     """
@@ -100,7 +180,16 @@ async def create_api_key(key_request: APIKeyRequest):
     返回:
     - 新生成的API密钥信息
     """
-    key = create_new_api_key(key_request.name)
+    # /public路径不经过校验中间件，服务端密钥无法读取时在这里同样返回503
+    try:
+        key = create_new_api_key(key_request.name)
+    except KeyStoreUnavailable as e:
+        logger.error(f"API密钥创建失败: {e}")
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "API密钥服务暂不可用，请稍后重试"},
+            headers={"Retry-After": "1"}
+        )
 
     return APIKeyResponse(
         api_key=key["api_key"],
@@ -110,7 +199,7 @@ async def create_api_key(key_request: APIKeyRequest):
 
 
 @router.get("/api-keys", response_model=APIKeyListResponse)
-async def list_api_keys():
+async def list_api_keys(request: Request):
     """
     获取所有API密钥列表（需要管理员权限）
 
@@ -118,10 +207,13 @@ async def list_api_keys():
     - api_key: API密钥（通过依赖注入验证）
 
     返回:
-    - API密钥列表
+    - API密钥列表，只有请求者自己的密钥返回key_id
     """
-    key_list = []
-    key_list = list_all_api_keys()
+    tokens_today = KeyQuota.usage_all()
+    key_list = list_all_api_keys(
+        request.state.key_id,
+        lambda key_id: KeyQuota.usage(key_id, tokens_today.get(key_id, 0))
+    )
     return APIKeyListResponse(
         keys=key_list,
         total=len(key_list)
@@ -151,52 +243,71 @@ async def delete_api_key(api_key_to_delete: str):
         )
 
 
-@router.post("/extract", response_model=TaskStatus)
-async def extract_knowledge_from_pdf(file: UploadFile = File(...)):
+# 请求体由接口自行流式解析，这里只声明文档中的表单结构
+EXTRACT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary", "description": "PDF文件"}},
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/extract", response_model=TaskStatus, openapi_extra=EXTRACT_REQUEST_BODY)
+async def extract_knowledge_from_pdf(request: Request):
     """
     从上传的PDF文件中抽取知识（异步处理）
 
     参数:
-    - file: PDF文件
+    - file: PDF文件（multipart/form-data）
 
     返回:
     - 任务ID，用于轮询结果
     """
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="只支持PDF文件")
-
-    # 创建任务ID
-    task_id = str(uuid.uuid4())
-    # 获取当前时间作为开始时间
-    start_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    # 初始化任务状态，用于存储当前线程任务的相关字段，并给TaskStatus赋值，TaskStatus响应体仅在接口返回时使用，不要混淆
-    tasks[task_id] = {
-        "status": "pending",
-        "filename":f"{file.filename}",
-        "progress": 0,
-        "message": "任务已创建",
-        "result": None,
-        "start_time": time.time(),
-        "start_time_str": start_time_str
-    }
+    # Content-Length明显超过上限时直接拒绝，不读取请求体；
+    # 否则边接收边解析，文件内容直接写入暂存文件，超过上限时立即停止接收
+    max_bytes = config.settings.upload_max_bytes
+    content_length = request.headers.get("content-length")
+    if max_bytes and content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"文件超过大小上限 {max_bytes} 字节")
+
+    # 分块写入暂存目录，同时计算sha256；失败时不创建任务
+    try:
+        spooled = await spool_multipart(request.stream(), request.headers.get("content-type", ""),
+                                        max_bytes=max_bytes)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = spooled["filename"]
+
+    # 相同内容（且模型与提示词版本相同）已有完成或进行中的任务时直接复用，不再重复抽取
+    dedup_key = extraction_key(spooled["sha256"]) if config.settings.task_dedup else None
+    # 创建任务，任务字典存储当前线程任务的相关字段，并给TaskStatus赋值，TaskStatus响应体仅在接口返回时使用，不要混淆
+    task_id, reused = TaskStore.create_or_reuse(filename, "api", dedup_key, owner=request.state.key_id)
+    if reused:
+        remove_spooled(spooled["path"])
+        logger.info(f"上传文件 {filename} 与任务 {task_id} 内容相同，复用该任务")
+        task_status = await get_task_status(task_id)
+        task_status.deduplicated = True
+        return task_status
+    start_time_str = tasks[task_id]["start_time_str"]
+    tasks[task_id].update({"file_size": spooled["size"], "file_sha256": spooled["sha256"]})
 
     try:
-        # 创建临时文件保存上传的PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
-            tmp_file_path = tmp_file.name
-
-        # 在后台线程中处理任务
-        thread = threading.Thread(
-            target=process_extraction_task,
-            args=(task_id, tmp_file_path, file.filename)
-        )
-        thread.start()
+        # 提交到共享线程池处理，超出并发上限的任务排队等待；暂存文件在任务结束时删除
+        submit_extraction_task(task_id, spooled["path"], filename, owner=request.state.key_id)
 
         return TaskStatus(
             task_id=task_id,
-            tag=file.filename,
+            tag=filename,
             status="pending",
             progress=0,
             message="任务已提交，正在处理中",
@@ -206,76 +317,54 @@ async def extract_knowledge_from_pdf(file: UploadFile = File(...)):
         )
 
     except Exception as e:
+        remove_spooled(spooled["path"])
         tasks[task_id]["status"] = "failed"
         tasks[task_id]["message"] = f"任务提交失败: {str(e)}"
         raise HTTPException(status_code=500, detail=f"任务提交失败: {str(e)}")
 
 
-def process_extraction_task(task_id: str, file_path: str, filename: str):
+def build_task_status(task_id: str, include_result: bool = True) -> TaskStatus:
     """
-    在后台线程中处理知识抽取任务
-    """
-    task = tasks[task_id]
-    start_time_str = task["start_time_str"]
-    start_time = task["start_time"]
-    def progress_callback(progress: int, message: str):
-        """进度回调函数"""
-        if task_id in tasks:
-            tasks[task_id].update({
-                "progress": progress,
-                "message": message
-            })
+    构造任务状态响应，已从内存中清理的任务从数据库读取
 
-    try:
-        # 更新任务状态
-        progress_callback(5, "开始处理PDF文件")
-        # 提取PDF文本内容
-        text = extract_text_from_pdf(file_path)
-        progress_callback(10, "PDF文本提取完成，开始调用大模型API")
-        task["status"] = "processing"
-        # 调用API抽取信息（支持进度更新）
-        df = extract(text, filename, progress_callback)
-        progress_callback(90, "大模型处理完成，正在整理结果")
-        # 转换DataFrame为字典列表
-        data = df.to_dict('records')
-
-        # 清理临时文件
-        os.unlink(file_path)
-        # 计算处理时长
-        duration = time.time() - start_time
-        # 获取结束时间
-        end_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        # 完成任务
-        task.update({
-            "status": "completed",
-            "progress": 100,
-            "start_time_str":start_time_str,
-            "end_time_str": end_time_str,
-            "message": f"任务完成，成功从 {filename} 抽取了 {len(data)} 条记录",
-            "result": {
-                "filename": filename,
-                "data": data,
-                "count": len(data)
-            },
-            "duration": duration
-        })
+    Args:
+        task_id: 任务ID
+        include_result: 是否返回完整结果，为False时只返回结果行数
 
-    except Exception as e:
-        # 清理临时文件
-        if os.path.exists(file_path):
-            os.unlink(file_path)
-        # 计算处理时长
-        duration = time.time() - start_time
-        end_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        task.update({
-            "status": "failed",
-            "progress": 100,
-            "start_time_str": start_time_str,
-            "end_time_str": end_time_str,
-            "message": f"处理文件时出错: {str(e)}",
-            "duration": duration
-        })
+    Returns:
+        TaskStatus: 任务状态
+    """
+    task = tasks.get(task_id)
+    if task is None:
+        task = task_db.query_task(task_id, include_rows=include_result)
+        if task is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+    result = task.get("result")
+    result_count = None
+    if result is not None:
+        result_count = result.get("count", len(result.get("data") or []))
+        # 内存中的结果行为压缩存储，完整返回时才解码
+        result = {**result, "data": expand_rows(result.get("data") or [])} if include_result else None
+    # 计算当前已用时长
+    duration = task.get("duration")
+    if duration is None and "start_time" in task:
+        duration = time.time() - task["start_time"]
+    # 处理中的任务实时汇总用量
+    usage = task.get("usage") or UsageTracker.get_task_usage(task_id)
+
+    return TaskStatus(
+        task_id=task_id,
+        tag=task["filename"],
+        status=task["status"],
+        progress=task["progress"],
+        message=task["message"],
+        result=result,
+        start_time=task.get("start_time_str"),
+        end_time=task.get("end_time_str"),
+        duration=duration,
+        usage=usage,
+        result_count=result_count
+    )
 
 
 @router.get("/task/{task_id}", response_model=TaskStatus)
@@ -289,26 +378,178 @@ async def get_task_status(task_id: str):
     返回:
     - 任务当前状态
     """
-    if task_id not in tasks:
+    return build_task_status(task_id)
+
+
+@router.get("/task/{task_id}/status", response_model=TaskStatus)
+async def get_task_status_compact(task_id: str):
+    """
+    获取任务状态（不含抽取结果），适合轮询进度，结果通过/task/{task_id}/result获取
+
+    参数:
+    - task_id: 任务ID
+
+    返回:
+    - 任务当前状态及结果行数
+    """
+    return build_task_status(task_id, include_result=False)
+
+
+# 结果行的全部字段
+RESULT_COLUMNS = ("entity", "property", "value", "entityTag", "valueTag", "level", "valueType")
+# 流式输出时每次写出的行数
+RESULT_STREAM_BATCH = 500
+
+
+@router.get("/task/{task_id}/result")
+def get_task_result(task_id: str, request: Request, offset: int = 0, limit: Optional[int] = None,
+                    columns: Optional[str] = None, format: Optional[str] = None):
+    """
+    分页或流式获取任务的抽取结果，内存中没有的已完成任务从数据库读取
+
+    参数:
+    - offset/limit: 分页，json格式limit默认1000
+    - columns: 逗号分隔的返回字段，默认全部（entity、property、value、entityTag、valueTag、level、valueType）
+    - format: json（默认）或ndjson（每行一个JSON对象，流式输出）；也可通过Accept: application/x-ndjson指定
+
+    返回:
+    - json：rows、total、offset、next_offset；ndjson：逐行输出结果
+    """
+    fmt = format or ("ndjson" if "application/x-ndjson" in request.headers.get("accept", "") else "json")
+    if fmt not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format需为json或ndjson")
+    selected = RESULT_COLUMNS
+    if columns:
+        selected = tuple(column.strip() for column in columns.split(",") if column.strip())
+        unknown = [column for column in selected if column not in RESULT_COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"未知的字段: {', '.join(unknown)}")
+    if offset < 0 or (limit is not None and limit < 0):
+        raise HTTPException(status_code=400, detail="offset与limit需为非负数")
+    if fmt == "json" and limit is None:
+        limit = 1000
+
+    if TaskStore.is_running(task_id):
+        raise HTTPException(status_code=409, detail="任务尚未完成")
+    # 内存中没有的任务由TaskStore从数据库读取
+    if fmt == "ndjson":
+        stream = TaskStore.iter_result(task_id, offset, limit, RESULT_STREAM_BATCH)
+        if stream is None:
+            raise HTTPException(status_code=404, detail="任务不存在或没有抽取结果")
+        batches, total = stream
+    else:
+        page = TaskStore.result_page(task_id, offset, limit)
+        if page is None:
+            raise HTTPException(status_code=404, detail="任务不存在或没有抽取结果")
+        rows, total = page
+
+    def project(rows):
+        if selected == RESULT_COLUMNS:
+            return rows
+        return [{column: row.get(column) for column in selected} for row in rows]
+
+    if fmt == "ndjson":
+        # 结果行在生成器中逐批读取（内存中按块解码、数据库中按批查询），输出第一批前不读取全部结果
+        def row_lines():
+            for batch in batches:
+                yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in project(batch))
+        return StreamingResponse(row_lines(), media_type="application/x-ndjson",
+                                 headers={"X-Total-Count": str(total)})
+
+    rows = project(rows)
+
+    next_offset = offset + len(rows)
+    body = json.dumps({
+        "task_id": task_id,
+        "total": total,
+        "offset": offset,
+        "columns": list(selected),
+        "rows": rows,
+        "next_offset": next_offset if next_offset < total else None
+    }, ensure_ascii=False).encode("utf-8")
+    # 按Accept-Encoding选择br或gzip，已设置Content-Encoding的响应不会被GZip中间件再次压缩
+    body, encoding = encode_body(body, request.headers.get("accept-encoding", ""))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("/task/{task_id}/trace")
+async def get_task_trace(task_id: str):
+    """
+    获取任务的链路追踪span（需启用memory导出器）
+
+    参数:
+    - task_id: 任务ID
+
+    返回:
+    - 按开始时间排序的span列表，含名称、父子关系、耗时与属性
+    """
+    if TaskStore.get(task_id) is None:
         raise HTTPException(status_code=404, detail="任务不存在")
+    if task_id not in tasks:
+        raise HTTPException(status_code=404, detail="任务已从内存中清理，链路追踪不再保留")
+    exporter = get_memory_exporter()
+    trace_id = tasks[task_id].get("trace_id")
+    if exporter is None or not trace_id:
+        raise HTTPException(status_code=404, detail="未启用内存链路追踪（TRACE_EXPORTERS需包含memory）")
+    return {"task_id": task_id, "trace_id": trace_id, "spans": exporter.get_trace(trace_id)}
 
-    task = tasks[task_id]
-    # 计算当前已用时长
-    duration = task.get("duration")
-    if duration is None and "start_time" in task:
-        duration = time.time() - task["start_time"]
 
-    return TaskStatus(
-        task_id=task_id,
-        tag=task["filename"],
-        status=task["status"],
-        progress=task["progress"],
-        message=task["message"],
-        result=task.get("result"),
-        start_time=task.get("start_time_str"),
-        end_time=task.get("end_time_str"),
-        duration=duration
-    )
+@router.get("/task/{task_id}/stream")
+async def stream_task_output(task_id: str):
+    """
+    以SSE实时推送任务的大模型输出（需配置STREAM_SINK=sse）
+
+    参数:
+    - task_id: 任务ID
+
+    返回:
+    - text/event-stream，每个事件为{"stage": 阶段, "content": 内容片段}，任务结束时发送end事件
+    """
+    task = TaskStore.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if config.settings.stream_sink != "sse":
+        raise HTTPException(status_code=404, detail="未启用SSE流式输出（STREAM_SINK需为sse）")
+    if task_id not in tasks:
+        # 已从内存中清理的任务早已结束，只发送end事件
+        async def ended_stream():
+            yield f"event: end\ndata: {json.dumps({'status': task.get('status')})}\n\n"
+        return StreamingResponse(ended_stream(), media_type="text/event-stream")
+
+    subscriber = stream_hub.subscribe(task_id)
+
+    async def event_stream():
+        try:
+            while True:
+                # 一次取出队列中已有的全部片段，减少逐token的发送
+                batch = []
+                while True:
+                    try:
+                        batch.append(subscriber.get_nowait())
+                    except queue.Empty:
+                        break
+                finished = False
+                for item in batch:
+                    if item is None:
+                        finished = True
+                        break
+                    stage, content = item
+                    yield f"data: {json.dumps({'stage': stage, 'content': content}, ensure_ascii=False)}\n\n"
+                if finished:
+                    break
+                if not batch:
+                    # 订阅前任务可能已结束
+                    if tasks.get(task_id, {}).get("status") not in ("pending", "processing"):
+                        break
+                    await asyncio.sleep(0.2)
+            yield f"event: end\ndata: {json.dumps({'status': tasks.get(task_id, {}).get('status')})}\n\n"
+        finally:
+            stream_hub.unsubscribe(task_id, subscriber)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @router.get("/tasks", response_model=TaskListResponse)
@@ -321,7 +562,8 @@ async def list_all_tasks():
     """
     task_list = []
 
-    for task_id, task_data in tasks.items():
+    # 后台清理线程可能同时删除任务，遍历快照
+    for task_id, task_data in list(tasks.items()):
         # 计算当前已用时长
         duration = task_data.get("duration")
         if duration is None and "start_time" in task_data:
@@ -346,9 +588,11 @@ async def list_all_tasks():
 
 
 @router.delete("/task/{task_id}")
-async def delete_task(task_id: str):
+async def delete_task(request: Request, task_id: str):
     """
-    删除任务（清理任务记录）
+    删除任务（清理任务记录），排队中或处理中的任务同时取消：
+    不再调用大模型，进行中的流式连接立即关闭并释放并发名额。
+    相同内容的任务被多个API密钥复用时，只有最后一个订阅者的删除会取消并删除任务，其余只退订
 
     参数:
     - task_id: 任务ID
@@ -356,12 +600,127 @@ async def delete_task(task_id: str):
     返回:
     - 删除结果
     """
-    if task_id in tasks:
-        del tasks[task_id]
-        return {"message": "任务记录已删除"}
+    key_id = getattr(request.state, "key_id", None)
+    if task_id not in tasks:
+        # 已从内存中清理的任务只删除数据库记录，只有提交任务的API密钥可删除（MCP提交的任务不限）
+        stored = task_db.query_task(task_id, include_rows=False)
+        if stored is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        if stored.get("owner") and stored["owner"] != key_id:
+            raise HTTPException(status_code=403, detail="无权删除其他API密钥提交的任务")
+        if not task_db.delete_task(task_id):
+            raise HTTPException(status_code=404, detail="任务不存在")
+        UsageTracker.remove_task_usage(task_id)
+        return {"message": "任务记录已删除", "cancelled": False, "detached": False}
+    remaining = TaskStore.unsubscribe(task_id, "api", key_id)
+    if remaining is None:
+        raise HTTPException(status_code=403, detail="无权删除其他API密钥提交的任务")
+    if remaining:
+        return {"message": "已退订该任务，任务仍被其他调用方使用", "cancelled": False, "detached": True}
+    cancelled = TaskStore.cancel(task_id)
+    if TaskStore.remove(task_id):
+        task_db.delete_task(task_id)
+        UsageTracker.remove_task_usage(task_id)
+        if cancelled:
+            return {"message": "任务已取消，任务记录已删除", "cancelled": True, "detached": False}
+        return {"message": "任务记录已删除", "cancelled": False, "detached": False}
     else:
         raise HTTPException(status_code=404, detail="任务不存在")
 
+@router.get("/usage")
+async def get_llm_usage():
+    """
+    获取大模型用量统计
+
+    返回:
+    - 按阶段汇总的调用次数、token消耗、首token时延、生成速度与耗时
+    """
+    return {"stages": UsageTracker.get_stage_summary()}
+
+
+@router.post("/judge/batch", response_model=JudgeBatchResponse)
+def judge_batch(judge_request: JudgeBatchRequest):
+    """
+    批量判断文本是否为医疗指南内容（同步接口，由线程池执行）
+
+    参数:
+    - contents: 文本列表
+
+    返回:
+    - 与输入顺序一致的布尔值列表
+    """
+    if len(judge_request.contents) > config.settings.judge_batch_max_items:
+        raise HTTPException(status_code=400, detail=f"单次最多判断 {config.settings.judge_batch_max_items} 条文本")
+    try:
+        results = judge_contents(judge_request.contents)
+    except Exception as e:
+        logger.error(f"批量判断失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"批量判断失败: {str(e)}")
+    return JudgeBatchResponse(results=results, count=len(results))
+
+
+@router.get("/triples", response_model=TripleQueryResponse)
+def query_triples(entity: Optional[str] = None, entity_tag: Optional[str] = None, property: Optional[str] = None,
+                  value: Optional[str] = None, value_tag: Optional[str] = None, level: Optional[str] = None,
+                  task_id: Optional[str] = None, source: Optional[str] = None, prefix: bool = False,
+                  offset: int = 0, limit: int = 100):
+    """
+    跨任务查询已抽取的三元组，多个条件取交集
+
+    参数:
+    - entity/entity_tag/property/value/value_tag/level: 按对应列精确匹配
+    - task_id/source: 限定任务或来源文档
+    - prefix: entity与value是否按前缀匹配
+    - offset/limit: 分页，limit最大1000
+
+    返回:
+    - 三元组列表及满足条件的总数
+    """
+    if offset < 0 or not 0 < limit <= 1000:
+        raise HTTPException(status_code=400, detail="offset需为非负数，limit需在1到1000之间")
+    filters = {"entity": entity, "entity_tag": entity_tag, "property": property, "value": value,
+               "value_tag": value_tag, "level": level, "task_id": task_id, "source": source}
+    triples, total = triple_db.query_triples(filters, prefix, offset, limit)
+    next_offset = offset + len(triples)
+    return TripleQueryResponse(triples=triples, total=total, offset=offset,
+                               next_offset=next_offset if next_offset < total else None)
+
+
+@router.get("/triples/entities")
+def list_entities(entity_tag: Optional[str] = None, prefix: Optional[str] = None, limit: int = 100):
+    """
+    按三元组数量列出实体
+
+    参数:
+    - entity_tag: 实体类型，如临床问题、推荐意见、证据
+    - prefix: 实体名称前缀
+    - limit: 最大条数，最大1000
+
+    返回:
+    - 实体、实体类型、三元组数与来源文档数
+    """
+    if not 0 < limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit需在1到1000之间")
+    return {"entities": triple_db.count_entities(entity_tag, prefix, limit)}
+
+
+@router.get("/triples/entity/{entity}")
+def get_entity_triples(entity: str, limit: int = 500):
+    """
+    查询实体的全部关系：以该实体为主语的三元组（outgoing）与以该实体为取值的三元组（incoming），
+    例如疾病的incoming中为以其为目标疾病的证据，再查询证据的incoming即得到相应的推荐意见
+
+    参数:
+    - entity: 实体名称
+    - limit: 每个方向的最大条数，最大5000
+
+    返回:
+    - outgoing与incoming三元组
+    """
+    if not 0 < limit <= 5000:
+        raise HTTPException(status_code=400, detail="limit需在1到5000之间")
+    return {"entity": entity, **triple_db.query_entity(entity, limit)}
+
 app.include_router(router)
 
 # if __name__ == "__main__":
@@ -0,0 +1,146 @@
+"""
+OpenKG-ToolAgent命令行工具的常驻进程
+extract.py与judge.py每次调用都会启动新的解释器并导入依赖，常驻进程预先导入tool_service并监听本地socket，
+命令行工具连接成功时直接转发请求，省去依赖导入；常驻进程未启动时命令行工具回退为进程内调用
+
+用法：
+    python backend/mcp_support/daemon.py
+
+环境变量：
+    MCP_DAEMON_ADDRESS: 监听地址，默认为临时目录下的medical_guideline_mcp.sock（Windows为命名管道）
+    MCP_DAEMON_AUTHKEY: 连接认证密钥，为空则不认证（仅依赖socket文件权限）
+
+本模块在命令行工具中导入，顶层只允许使用标准库，配置通过环境变量读取而非backend.config
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import Callable, Dict, Optional
+
+DEFAULT_PIPE_NAME = "medical_guideline_mcp"
+
+
+class DaemonUnavailable(Exception):
+    """常驻进程未启动或无法连接"""
+
+
+def get_address() -> str:
+    """
+    常驻进程的监听地址
+
+    Returns:
+        str: Unix socket路径或Windows命名管道名
+    """
+    address = os.environ.get("MCP_DAEMON_ADDRESS")
+    if address:
+        return address
+    if sys.platform == "win32":
+        return rf"\\.\pipe\{DEFAULT_PIPE_NAME}"
+    return os.path.join(tempfile.gettempdir(), f"{DEFAULT_PIPE_NAME}.sock")
+
+
+def _get_authkey() -> Optional[bytes]:
+    authkey = os.environ.get("MCP_DAEMON_AUTHKEY")
+    return authkey.encode("utf-8") if authkey else None
+
+
+def call_daemon(tool: str, content):
+    """
+    通过常驻进程调用工具
+
+    Args:
+        tool: 工具名，judge、judge_batch或extract
+        content: 文本内容，judge_batch为文本列表
+
+    Returns:
+        工具的返回值
+
+    Raises:
+        DaemonUnavailable: 常驻进程未启动或连接失败
+        RuntimeError: 工具执行出错
+    """
+    address = get_address()
+    if sys.platform != "win32" and not os.path.exists(address):
+        raise DaemonUnavailable(address)
+    try:
+        connection = Client(address, authkey=_get_authkey())
+    except (OSError, EOFError) as e:
+        raise DaemonUnavailable(f"{address}: {e}") from e
+    with connection:
+        # 只传输JSON，不使用pickle，避免本地其他进程借socket执行任意代码
+        connection.send_bytes(json.dumps({"tool": tool, "content": content}, ensure_ascii=False).encode("utf-8"))
+        response = json.loads(connection.recv_bytes().decode("utf-8"))
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error", "常驻进程调用失败"))
+    return response.get("result")
+
+
+class ToolDaemon:
+    """常驻进程，每个连接在独立线程中处理"""
+
+    def __init__(self, tools: Dict[str, Callable[[str], object]], address: Optional[str] = None):
+        """
+        Args:
+            tools: 工具名到处理函数的映射
+            address: 监听地址，默认见get_address
+        """
+        self.tools = tools
+        self.address = address or get_address()
+        self._listener: Optional[Listener] = None
+
+    def serve_forever(self) -> None:
+        if sys.platform != "win32" and os.path.exists(self.address):
+            # 上次异常退出遗留的socket文件
+            os.unlink(self.address)
+        self._listener = Listener(self.address, authkey=_get_authkey())
+        if sys.platform != "win32":
+            os.chmod(self.address, 0o600)
+        print(f"常驻进程已启动: {self.address}", flush=True)
+        try:
+            while True:
+                try:
+                    connection = self._listener.accept()
+                except Exception as e:
+                    # 认证失败等单个连接的错误不影响服务
+                    print(f"接受连接失败: {e}", file=sys.stderr, flush=True)
+                    continue
+                threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+        finally:
+            self._listener.close()
+
+    def _handle(self, connection) -> None:
+        with connection:
+            try:
+                request = json.loads(connection.recv_bytes().decode("utf-8"))
+                handler = self.tools.get(request.get("tool"))
+                if handler is None:
+                    response = {"ok": False, "error": f"未知的工具: {request.get('tool')}"}
+                else:
+                    response = {"ok": True, "result": handler(request.get("content", ""))}
+            except EOFError:
+                return
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            try:
+                connection.send_bytes(json.dumps(response, ensure_ascii=False).encode("utf-8"))
+            except OSError:
+                pass
+
+
+def main():
+    # 添加项目根目录到Python路径
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from tool_service import judge_content, judge_contents, knowledge_extract
+
+    daemon = ToolDaemon({"judge": judge_content, "judge_batch": judge_contents, "extract": knowledge_extract})
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -28,7 +28,19 @@ sys.stderr = open(os.devnull, 'w')
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from tool_service import knowledge_extract
+from daemon import DaemonUnavailable, call_daemon
+
+
+def run_extract(content: str, use_daemon: bool = True):
+    """优先通过常驻进程调用，常驻进程未启动时在进程内调用"""
+    if use_daemon:
+        try:
+            return call_daemon("extract", content)
+        except DaemonUnavailable:
+            pass
+    # 进程内调用时才导入tool_service及其依赖
+    from tool_service import knowledge_extract
+    return knowledge_extract(content)
 
 
 def main():
@@ -42,6 +54,7 @@ def main():
     parser.add_argument('--file', '-f', type=str, help='从文件读取医疗指南文本内容')
     parser.add_argument('--stdin', action='store_true', help='从标准输入读取医疗指南文本内容')
     parser.add_argument('--output', '-o', type=str, help='将结果输出到指定文件')
+    parser.add_argument('--no-daemon', action='store_true', help='不连接常驻进程，直接在进程内调用')
 
     args = parser.parse_args()
 
@@ -78,7 +91,7 @@ def main():
             # 临时禁用日志输出
             logging.getLogger().setLevel(logging.CRITICAL + 1)
 
-            result = knowledge_extract(content.strip())
+            result = run_extract(content.strip(), not args.no_daemon)
 
             # 恢复输出
             sys.stdout = old_stdout
@@ -3,6 +3,7 @@ OpenKG-ToolAgent集成mcp适配
 文本内容类型判断，判断文本是否为医疗指南内容
 """
 import argparse
+import json
 import sys
 import os
 import logging
@@ -28,7 +29,51 @@ sys.stderr = open(os.devnull, 'w')
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from tool_service import judge_content
+from daemon import DaemonUnavailable, call_daemon
+
+
+def run_judge(content: str, use_daemon: bool = True):
+    """优先通过常驻进程调用，常驻进程未启动时在进程内调用"""
+    if use_daemon:
+        try:
+            return call_daemon("judge", content)
+        except DaemonUnavailable:
+            pass
+    # 进程内调用时才导入tool_service及其依赖
+    from tool_service import judge_content
+    return judge_content(content)
+
+
+def run_judge_batch(contents, use_daemon: bool = True):
+    """批量判断，调用方式同run_judge"""
+    if use_daemon:
+        try:
+            return call_daemon("judge_batch", contents)
+        except DaemonUnavailable:
+            pass
+    from tool_service import judge_contents
+    return judge_contents(contents)
+
+
+def parse_batch_input(text: str):
+    """
+    解析批量判断的输入：JSON字符串数组，或每行一段文本（忽略空行）
+
+    Args:
+        text: 原始输入
+
+    Returns:
+        List[str]: 文本列表
+    """
+    stripped = text.strip()
+    if stripped.startswith("["):
+        try:
+            contents = json.loads(stripped)
+            if isinstance(contents, list):
+                return [str(item) for item in contents]
+        except json.JSONDecodeError:
+            pass
+    return [line.strip() for line in text.splitlines() if line.strip()]
 
 
 def main():
@@ -41,6 +86,8 @@ def main():
     parser.add_argument('content', nargs='*', help='输入文本内容')
     parser.add_argument('--file', '-f', type=str, help='从文件读取文本内容')
     parser.add_argument('--stdin', action='store_true', help='从标准输入读取文本内容')
+    parser.add_argument('--no-daemon', action='store_true', help='不连接常驻进程，直接在进程内调用')
+    parser.add_argument('--batch', action='store_true', help='批量判断：输入为JSON字符串数组或每行一段文本，逐行输出结果')
 
     args = parser.parse_args()
 
@@ -77,14 +124,21 @@ def main():
             # 临时禁用日志输出
             logging.getLogger().setLevel(logging.CRITICAL + 1)
 
-            result = judge_content(content.strip())
+            if args.batch:
+                result = run_judge_batch(parse_batch_input(content), not args.no_daemon)
+            else:
+                result = run_judge(content.strip(), not args.no_daemon)
 
             # 恢复输出
             sys.stdout = old_stdout
             sys.stderr = old_stderr
 
         # 只输出结果，不加任何前缀
-        print(result)
+        if args.batch:
+            for item in result:
+                print(item)
+        else:
+            print(result)
     except Exception as e:
         # 恢复输出
         sys.stdout = old_stdout
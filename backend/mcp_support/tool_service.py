@@ -1,21 +1,177 @@
-from backend.extract_service import parse_text_result
+import contextvars
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import backend.config as config
+from backend.classifier import get_classifier
 from backend.llm import chat
-from backend.config import setup_logging
-from backend.utils import parse_llm_response
-from backend.unstruct import edge_extract
+from backend.metrics import CACHE_REQUESTS, JUDGE_DECISIONS
+from backend.utils import parse_llm_response, parse_bool, remove_think_tag, LRUCache, CancelFlag
+
+logger = config.setup_logging()
+
+# 判断结果缓存，键为文本摘要
+judge_cache = LRUCache(config.settings.judge_cache_size)
+
+JUDGE_MODES = ("hybrid", "local", "llm")
 
-logger = setup_logging()
 
 def judge_content(content:str) -> bool:
+    """
+    判断文本是否为医疗指南内容：先查缓存，再由本地分类器判断，置信度不足时调用大模型
+
+    Args:
+        content: 文本内容
+
+    Returns:
+        bool: 是否为医疗指南内容
+    """
+    key = _content_key(content)
+    cached = judge_cache.get(key)
+    if cached is not None:
+        CACHE_REQUESTS.inc(cache="judge", result="hit")
+        JUDGE_DECISIONS.inc(source="cache", result=str(cached))
+        return cached
+    CACHE_REQUESTS.inc(cache="judge", result="miss")
+    result, source = _judge_uncached(content)
+    JUDGE_DECISIONS.inc(source=source, result=str(result))
+    judge_cache.put(key, result)
+    return result
+
+
+def _content_key(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def judge_contents(contents: List[str]) -> List[bool]:
+    """
+    批量判断文本是否为医疗指南内容：缓存与本地分类器能确定的直接返回，
+    其余文本按judge_batch_size打包为批量提示词，多个批次在大模型并发名额内同时调用
+
+    Args:
+        contents: 文本列表
+
+    Returns:
+        List[bool]: 与输入顺序一致的判断结果
+    """
+    results: List[Optional[bool]] = [None] * len(contents)
+    pending: List[int] = []
+    for index, content in enumerate(contents):
+        cached = judge_cache.get(_content_key(content))
+        if cached is not None:
+            CACHE_REQUESTS.inc(cache="judge", result="hit")
+            JUDGE_DECISIONS.inc(source="cache", result=str(cached))
+            results[index] = cached
+            continue
+        CACHE_REQUESTS.inc(cache="judge", result="miss")
+        local = _judge_local(content)
+        if local is not None:
+            JUDGE_DECISIONS.inc(source="local", result=str(local))
+            judge_cache.put(_content_key(content), local)
+            results[index] = local
+        else:
+            pending.append(index)
+
+    batches = _pack_batches([contents[i] for i in pending], pending)
+    if batches:
+        logger.info(f"批量判断: {len(contents)} 条文本，{len(pending)} 条需调用大模型，共 {len(batches)} 个批次")
+        workers = max(1, min(len(batches), config.settings.llm_max_concurrency or len(batches)))
+        # 每个批次在调用方上下文的副本中执行，用量仍归属发起请求的API密钥
+        contexts = [contextvars.copy_context() for _ in batches]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="judge-batch") as executor:
+            for indexes, answers in zip(batches, executor.map(
+                    lambda b, ctx: ctx.run(_judge_batch, [contents[i] for i in b]), batches, contexts)):
+                for index, answer in zip(indexes, answers):
+                    JUDGE_DECISIONS.inc(source="llm", result=str(answer))
+                    judge_cache.put(_content_key(contents[index]), answer)
+                    results[index] = answer
+    return results
+
+
+def _pack_batches(texts: List[str], indexes: List[int]) -> List[List[int]]:
+    """按条数与字符数上限将待判断文本分组"""
+    settings = config.settings
+    batches, current, size = [], [], 0
+    for text, index in zip(texts, indexes):
+        if current and (len(current) >= settings.judge_batch_size or size + len(text) > settings.judge_batch_max_chars):
+            batches.append(current)
+            current, size = [], 0
+        current.append(index)
+        size += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _judge_batch(texts: List[str]) -> List[bool]:
+    """一次大模型调用判断多条文本，结果条数不符或无法解析时逐条判断"""
+    if len(texts) == 1:
+        return [_judge_llm(texts[0])]
+    response = chat(build_batch_judge_prompt(texts), False, "judge")
+    answer = parse_llm_response(response)
+    try:
+        answers = _parse_bool_list(answer)
+        if len(answers) == len(texts):
+            return answers
+        logger.warning(f"批量判断返回 {len(answers)} 条结果，期望 {len(texts)} 条，改为逐条判断")
+    except ValueError as e:
+        logger.warning(f"批量判断结果解析失败，改为逐条判断: {e}")
+    return [_judge_llm(text) for text in texts]
+
+
+def _parse_bool_list(text: str) -> List[bool]:
+    text = remove_think_tag(text)
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        raise ValueError(f"未找到JSON数组: {text[:100]}")
+    try:
+        items = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(str(e)) from e
+    return [item if isinstance(item, bool) else parse_bool(str(item)) for item in items]
+
+
+def _judge_local(content: str) -> Optional[bool]:
+    """本地分类器能确定时返回结果，否则返回None"""
+    settings = config.settings
+    if settings.judge_mode not in JUDGE_MODES:
+        raise ValueError(f"未知的内容判断方式: {settings.judge_mode}，可选 {', '.join(JUDGE_MODES)}")
+    if settings.judge_mode == "llm":
+        return None
+    probability = get_classifier().predict_proba(content)
+    logger.info(f"本地分类器判断概率: {probability:.3f}")
+    if probability >= settings.judge_confidence_high:
+        return True
+    if settings.judge_confidence_low > 0 and probability <= settings.judge_confidence_low:
+        return False
+    if settings.judge_mode == "local":
+        return probability >= 0.5
+    return None
+
+
+def _judge_llm(content: str) -> bool:
     logger.info("调用开始")
     prompt = build_judge_prompt(content)
-    response = chat(prompt, False)
+    response = chat(prompt, False, "judge")
     result = parse_llm_response(response)
     logger.info("大模型返回：" + result)
-    return result
+    return parse_bool(result)
+
 
-def knowledge_extract(content:str) -> str:
-    edge_extract_info = edge_extract(content)
+def _judge_uncached(content: str) -> Tuple[bool, str]:
+    """返回判断结果及其来源（local或llm）"""
+    local = _judge_local(content)
+    if local is not None:
+        return local, "local"
+    return _judge_llm(content), "llm"
+
+def knowledge_extract(content:str, progress_callback: Optional[Callable[[int, str], None]] = None,
+                      cancel_flag: Optional[CancelFlag] = None) -> str:
+    # 抽取模块在首次调用时导入，仅做判断的命令行调用无需加载
+    from backend.unstruct.edge_extract import extract_info_streaming as edge_extract
+    edge_extract_info = edge_extract(content, None, progress_callback, cancel_flag=cancel_flag)
     return edge_extract_info
 
 
@@ -28,4 +184,14 @@ def build_judge_prompt(text:str) -> str:
             判断以下文本：
             {text}
             """
-    return result
\ No newline at end of file
+    return result
+
+
+def build_batch_judge_prompt(texts: List[str]) -> str:
+    numbered = "\n".join(f"[{i}]\n{text}\n" for i, text in enumerate(texts, 1))
+    return f"""
+            你是一个医疗指南分析助手，请批量判断下列每段文本是否为专业医疗指南的内容。
+            按文本编号顺序输出一个JSON数组，元素为true或false，数组长度必须为{len(texts)}，不要输出其他内容
+            待判断的文本：
+            {numbered}
+            """
@@ -1,7 +1,18 @@
-from mcp.server.fastmcp import FastMCP
+import asyncio
+import os
+import time
+from typing import List
+
+from mcp.server.fastmcp import Context, FastMCP
+
+import backend.config as config
+from backend.task import worker_pool, TaskStore, submit_extraction_task, extraction_key, text_sha256, file_sha256
 from .tool_service import judge_content
+from .tool_service import judge_contents
 from .tool_service import knowledge_extract
 
+logger = config.setup_logging()
+
 mcp = FastMCP(
     name="medical_guideline_extract",
     host="0.0.0.0",
@@ -10,8 +21,49 @@ mcp = FastMCP(
     streamable_http_path="/medicalGuideLine/knowledgeExtract/mcp"
 )
 
+
+class ProgressReporter:
+    """在工作线程中接收抽取流程的进度回调，转发为MCP进度通知，并在检查点响应取消"""
+
+    def __init__(self, ctx: Context, loop: asyncio.AbstractEventLoop, cancel_flag: worker_pool.CancelFlag):
+        self._ctx = ctx
+        self._loop = loop
+        self._cancel_flag = cancel_flag
+        self._last = 0
+
+    def __call__(self, progress: int, message: str) -> None:
+        self._cancel_flag.check()
+        # 各阶段上报的进度并非单调递增，通知中只增不减
+        self._last = max(self._last, progress)
+        asyncio.run_coroutine_threadsafe(self._ctx.report_progress(self._last, 100, message), self._loop)
+
+
+async def run_cancellable(ctx: Context, fn, *args):
+    """
+    在共享线程池中执行抽取函数，fn的最后一个位置参数为进度回调，并接收关键字参数cancel_flag；
+    客户端断开或取消请求时通知工作线程在下一个检查点退出，进行中的大模型流式连接随即关闭
+
+    Args:
+        ctx: MCP请求上下文
+        fn: 抽取函数
+        *args: 进度回调之前的参数
+
+    Returns:
+        抽取函数的返回值
+    """
+    cancel_flag = worker_pool.CancelFlag()
+    reporter = ProgressReporter(ctx, asyncio.get_running_loop(), cancel_flag)
+    future = worker_pool.submit(fn, *args, reporter, cancel_flag=cancel_flag)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        cancel_flag.cancel()
+        logger.info(f"MCP请求 {ctx.request_id} 已取消，通知工作线程停止")
+        raise
+
+
 @mcp.tool()
-def get_content_type(content: str) -> bool:
+async def get_content_type(content: str) -> bool:
     """
     文本内容类型判断，判断文本是否为医疗指南内容
     Args:
@@ -21,14 +73,31 @@ def get_content_type(content: str) -> bool:
         bool: 是否为医疗指南内容
 
     """
-    print(f"接收参数：{content}")
-    return judge_content(content)
+    logger.info(f"接收参数：{content}")
+    # 判断耗时短，在默认线程池中执行，不占用抽取任务的工作线程
+    return await asyncio.to_thread(judge_content, content)
 
 @mcp.tool()
-def get_knowledge_extract(content: str, content_type: bool) -> str:
+async def get_content_types(contents: List[str]) -> List[bool]:
+    """
+    批量判断多段文本是否为医疗指南内容，适合在抽取前对大量候选文本分流
+    Args:
+        contents: 文本列表
+
+    Returns:
+        List[bool]: 与输入顺序一致的判断结果
+
+    """
+    if len(contents) > config.settings.judge_batch_max_items:
+        raise ValueError(f"单次最多判断 {config.settings.judge_batch_max_items} 条文本")
+    logger.info(f"批量判断接收 {len(contents)} 条文本")
+    return await asyncio.to_thread(judge_contents, contents)
+
+@mcp.tool()
+async def get_knowledge_extract(content: str, content_type: bool, ctx: Context) -> str:
     """
     实现文本的知识抽取，抽取为结构化知识，分为六列，entity、property、value、entityTag、valueTag、level
-    本方法耗时较长，应使用户知晓，抽取消耗时长在10分钟左右
+    本方法耗时较长，应使用户知晓，抽取消耗时长在10分钟左右，期间会持续发送进度通知
     Args:
         content: 医疗指南文本
         content_type: 文本类型
@@ -38,6 +107,109 @@ def get_knowledge_extract(content: str, content_type: bool) -> str:
     """
     if not content_type:
         return "文本不是医疗指南内容"
-    result = knowledge_extract(content)
-    print(f"抽取结果：\n{result}\n==================")
-    return result
\ No newline at end of file
+    result = await run_cancellable(ctx, knowledge_extract, content)
+    await ctx.report_progress(100, 100, "知识抽取完成")
+    logger.info(f"抽取结果：\n{result}\n==================")
+    return result
+
+
+def resolve_file_reference(file_path: str) -> str:
+    """
+    校验MCP客户端引用的服务端文件，只允许访问MCP_FILE_ROOT目录下的文件
+
+    Args:
+        file_path: 文件路径，相对路径按MCP_FILE_ROOT解析
+
+    Returns:
+        str: 文件的绝对路径
+    """
+    root = config.settings.mcp_file_root
+    if not root:
+        raise ValueError("未配置MCP_FILE_ROOT，不支持文件引用，请直接提供文本内容")
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, file_path))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"文件不在允许的目录内: {file_path}")
+    if not os.path.isfile(path):
+        raise ValueError(f"文件不存在: {file_path}")
+    return path
+
+
+@mcp.tool()
+async def submit_guideline_extract(content: str = "", file_path: str = "", filename: str = "") -> dict:
+    """
+    提交医疗指南全流程知识抽取任务（布局分析、细粒度分割、核心内容与边缘内容抽取），立即返回任务ID，
+    之后通过get_guideline_extract_result查询进度并分页获取结果；任务与REST接口共用任务存储
+    Args:
+        content: 医疗指南文本，与file_path二选一
+        file_path: 服务端文件路径（PDF或UTF-8文本），需位于MCP_FILE_ROOT目录下
+        filename: 任务标记名称，默认取文件名
+
+    Returns:
+        dict: task_id、status，以及deduplicated（相同内容已有完成或进行中的任务时复用该任务）
+
+    """
+    if bool(content.strip()) == bool(file_path):
+        raise ValueError("content与file_path需且只需提供一个")
+    dedup = config.settings.task_dedup
+    if file_path:
+        path = resolve_file_reference(file_path)
+        name = filename or os.path.basename(path)
+        dedup_key = extraction_key(await asyncio.to_thread(file_sha256, path)) if dedup else None
+        task_id, reused = TaskStore.create_or_reuse(name, "mcp", dedup_key)
+        if not reused:
+            submit_extraction_task(task_id, path, name, remove_file=False)
+    else:
+        name = filename or "mcp_text"
+        dedup_key = extraction_key(text_sha256(content)) if dedup else None
+        task_id, reused = TaskStore.create_or_reuse(name, "mcp", dedup_key)
+        if not reused:
+            submit_extraction_task(task_id, None, name, text=content)
+    if reused:
+        logger.info(f"MCP全流程抽取复用相同内容的任务: {task_id}")
+        return {"task_id": task_id, "status": TaskStore.get(task_id)["status"], "deduplicated": True}
+    logger.info(f"MCP全流程抽取任务已提交: {task_id}")
+    return {"task_id": task_id, "status": "pending", "deduplicated": False}
+
+
+@mcp.tool()
+async def get_guideline_extract_result(task_id: str, ctx: Context, offset: int = 0, limit: int = 200,
+                                       wait_seconds: float = 0) -> dict:
+    """
+    查询全流程抽取任务的状态与结果，结果按offset/limit分页返回，可按next_offset连续调用分批获取
+    Args:
+        task_id: 任务ID
+        offset: 结果起始行
+        limit: 本次返回的最大行数
+        wait_seconds: 大于0时等待任务结束，最长等待该秒数，期间发送进度通知
+
+    Returns:
+        dict: status、progress、message、total、rows（每行含entity、property、value、entityTag、valueTag、level、valueType），
+        以及next_offset（没有更多结果时为None）
+
+    """
+    # 已从内存中清理的任务从数据库读取状态与结果
+    task = TaskStore.get(task_id)
+    if task is None:
+        raise ValueError(f"任务不存在: {task_id}")
+    deadline = time.time() + max(wait_seconds, 0)
+    last_progress = None
+    while TaskStore.is_running(task_id) and time.time() < deadline:
+        if task.get("progress") != last_progress:
+            last_progress = task.get("progress")
+            await ctx.report_progress(last_progress or 0, 100, task.get("message"))
+        await asyncio.sleep(1)
+
+    offset = max(offset, 0)
+    page, total = TaskStore.result_page(task_id, offset, max(limit, 0)) or ([], 0)
+    next_offset = offset + len(page)
+    return {
+        "task_id": task_id,
+        "status": task.get("status"),
+        "progress": task.get("progress"),
+        "message": task.get("message"),
+        "total": total,
+        "offset": offset,
+        "rows": page,
+        "next_offset": next_offset if next_offset < total else None
+    }
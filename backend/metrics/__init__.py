@@ -0,0 +1,54 @@
+from .registry import Counter, Gauge, Histogram, MetricsRegistry
+from .service_metrics import (
+    REGISTRY,
+    TASK_QUEUE_DEPTH,
+    ACTIVE_TASKS,
+    TASKS_TOTAL,
+    TASK_DURATION,
+    TASKS_EVICTED,
+    TASKS_RETAINED,
+    TASK_RESULT_BYTES,
+    STORAGE_PURGED,
+    QUOTA_REJECTIONS,
+    KEY_QUEUED_TASKS,
+    LLM_LATENCY,
+    LLM_TTFT,
+    LLM_TOKENS,
+    LLM_ERRORS,
+    LLM_RETRIES,
+    LLM_CANCELLED,
+    LLM_INFLIGHT,
+    LLM_SLOT_WAIT,
+    CACHE_REQUESTS,
+    PDF_PARSE_DURATION,
+    JUDGE_DECISIONS
+)
+
+__all__ = [
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "MetricsRegistry",
+    "REGISTRY",
+    "TASK_QUEUE_DEPTH",
+    "ACTIVE_TASKS",
+    "TASKS_TOTAL",
+    "TASK_DURATION",
+    "TASKS_EVICTED",
+    "TASKS_RETAINED",
+    "TASK_RESULT_BYTES",
+    "STORAGE_PURGED",
+    "QUOTA_REJECTIONS",
+    "KEY_QUEUED_TASKS",
+    "LLM_LATENCY",
+    "LLM_TTFT",
+    "LLM_TOKENS",
+    "LLM_ERRORS",
+    "LLM_RETRIES",
+    "LLM_CANCELLED",
+    "LLM_INFLIGHT",
+    "LLM_SLOT_WAIT",
+    "CACHE_REQUESTS",
+    "PDF_PARSE_DURATION",
+    "JUDGE_DECISIONS"
+]
@@ -0,0 +1,51 @@
+"""
+服务运行指标定义
+"""
+from .registry import MetricsRegistry
+
+# 全局指标注册表
+REGISTRY = MetricsRegistry()
+
+# 任务调度
+TASK_QUEUE_DEPTH = REGISTRY.gauge("extract_queue_depth", "等待处理的抽取任务数")
+ACTIVE_TASKS = REGISTRY.gauge("extract_active_tasks", "正在处理的抽取任务数")
+TASKS_TOTAL = REGISTRY.counter("extract_tasks_total", "已结束的抽取任务数", ["status"])
+TASK_DURATION = REGISTRY.histogram("extract_task_duration_seconds", "抽取任务处理时长(秒)", ["status"])
+
+# 任务保留与清理
+TASKS_EVICTED = REGISTRY.counter("tasks_evicted_total", "从内存中清理的已结束任务数，reason取值ttl/count/bytes", ["status", "reason"])
+TASKS_RETAINED = REGISTRY.gauge("tasks_retained", "内存中保留的任务数")
+TASK_RESULT_BYTES = REGISTRY.gauge("task_result_bytes", "内存中已完成任务结果的总字节数")
+STORAGE_PURGED = REGISTRY.counter("storage_purged_total", "清理的持久化记录与文件数，target取值tasks/stage_cache/spool", ["target"])
+
+# API密钥配额
+QUOTA_REJECTIONS = REGISTRY.counter("quota_rejections_total", "超出密钥配额被拒绝的次数，reason取值rate/daily_tokens", ["reason"])
+KEY_QUEUED_TASKS = REGISTRY.gauge("key_queued_tasks", "因密钥并发上限排队的抽取任务数")
+
+# 大模型调用
+LLM_LATENCY = REGISTRY.histogram("llm_request_duration_seconds", "大模型调用总耗时(秒)", ["stage"])
+LLM_TTFT = REGISTRY.histogram("llm_time_to_first_token_seconds", "大模型首token时延(秒)", ["stage"],
+                              buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60))
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "大模型token消耗", ["stage", "type"])
+LLM_ERRORS = REGISTRY.counter("llm_errors_total", "大模型调用失败次数", ["stage"])
+LLM_RETRIES = REGISTRY.counter("llm_retries_total", "大模型调用重试次数", ["stage"])
+LLM_CANCELLED = REGISTRY.counter("llm_cancelled_total", "因任务取消而中断的大模型调用数", ["stage"])
+LLM_INFLIGHT = REGISTRY.gauge("llm_inflight_requests", "正在进行的大模型调用数")
+LLM_SLOT_WAIT = REGISTRY.histogram("llm_slot_wait_seconds", "等待大模型并发名额的时长(秒)", ["stage"],
+                                   buckets=(0.001, 0.01, 0.1, 0.5, 1, 5, 15, 60, 300))
+
+# 缓存与文档解析
+CACHE_REQUESTS = REGISTRY.counter("cache_requests_total", "缓存查询次数，result取值hit/miss", ["cache", "result"])
+PDF_PARSE_DURATION = REGISTRY.histogram("pdf_parse_duration_seconds", "PDF文本提取耗时(秒)",
+                                        buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+# 医疗指南内容判断
+JUDGE_DECISIONS = REGISTRY.counter("judge_decisions_total", "内容判断次数，source取值cache/local/llm", ["source", "result"])
+
+# 无标签的瞬时值在首次抓取前即输出0
+TASK_QUEUE_DEPTH.set(0)
+ACTIVE_TASKS.set(0)
+LLM_INFLIGHT.set(0)
+TASKS_RETAINED.set(0)
+TASK_RESULT_BYTES.set(0)
+KEY_QUEUED_TASKS.set(0)
@@ -0,0 +1,31 @@
+"""
+查看各阶段提示词指纹，清理过期的阶段缓存
+
+用法：
+    python -m backend.prompt.fingerprints            # 查看各阶段指纹及缓存条数
+    python -m backend.prompt.fingerprints --purge    # 删除指纹与当前提示词不一致的阶段缓存
+"""
+import argparse
+
+from backend.database import stage_cache_db
+from .registry import PromptRegistry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看提示词指纹，清理过期的阶段缓存")
+    parser.add_argument("--purge", action="store_true", help="删除指纹与当前提示词不一致的阶段缓存")
+    args = parser.parse_args()
+
+    current = PromptRegistry.fingerprints()
+    summary = stage_cache_db.summarize(current)
+    print(f"{'stage':<16}{'fingerprint':<20}{'current':>10}{'stale':>10}")
+    for stage, fingerprint in current.items():
+        counts = summary.get(stage, {})
+        print(f"{stage:<16}{fingerprint:<20}{counts.get('current', 0):>10}{counts.get('stale', 0):>10}")
+    print(f"pipeline version: {PromptRegistry.version()}")
+    if args.purge:
+        print(f"已删除 {stage_cache_db.purge_stale(current)} 条过期缓存")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+提示词注册表
+各阶段的提示词模板以占位符渲染后计算摘要，与模型ID、temperature一起组成阶段指纹。
+指纹写入任务结果与阶段缓存，某一阶段的提示词修改后只有该阶段的缓存失效，其余阶段继续复用
+"""
+import hashlib
+from functools import lru_cache
+from typing import Callable, Dict, Tuple
+
+import backend.config as config
+from .layout_prompt import build_prompt as build_layout_prompt
+from .core_segmentation_prompt import build_prompt as build_core_segmentation_prompt
+from .edge_extract_prompt import build_prompt as build_others_prompt
+from .core_extract_prompt import build_prompt as build_core_prompt
+
+# 阶段 -> (提示词构造函数, 渲染模板时使用的占位参数)，阶段名与用量统计一致
+STAGE_PROMPTS: Dict[str, Tuple[Callable[..., str], Tuple[str, ...]]] = {
+    "layout": (build_layout_prompt, ("{text}",)),
+    "segmentation": (build_core_segmentation_prompt, ("{text}",)),
+    "edge": (build_others_prompt, ("{text}",)),
+    "core": (build_core_prompt, ("{question}", "{references}", "{ev_definition}")),
+}
+
+
+def _digest(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+class PromptRegistry:
+    """提示词指纹管理类"""
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def template_fingerprint(stage: str) -> str:
+        """
+        提示词模板本身的摘要，模板是代码中的常量，每个进程只计算一次
+
+        Args:
+            stage: 阶段名
+
+        Returns:
+            str: 16位十六进制摘要
+        """
+        build, placeholders = STAGE_PROMPTS[stage]
+        return _digest(build(*placeholders))
+
+    @staticmethod
+    def fingerprint(stage: str) -> str:
+        """
+        阶段指纹，由模板摘要、模型ID与temperature组成，模型配置在调用时读取
+
+        Args:
+            stage: 阶段名
+
+        Returns:
+            str: 16位十六进制摘要
+        """
+        settings = config.settings
+        return _digest(stage, PromptRegistry.template_fingerprint(stage), settings.model_id, repr(settings.llm_temperature))
+
+    @staticmethod
+    def fingerprints() -> Dict[str, str]:
+        """
+        Returns:
+            Dict[str, str]: 各阶段的指纹
+        """
+        return {stage: PromptRegistry.fingerprint(stage) for stage in STAGE_PROMPTS}
+
+    @staticmethod
+    def version() -> str:
+        """
+        整个抽取流程的版本，任一阶段指纹变化时随之变化
+
+        Returns:
+            str: 16位十六进制摘要
+        """
+        return _digest(*(f"{stage}={fp}" for stage, fp in sorted(PromptRegistry.fingerprints().items())))
+
@@ -2,29 +2,42 @@
 API安全认证模块
 """
 import secrets
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 
 from fastapi import HTTPException, Depends
 from fastapi.responses import JSONResponse
 from fastapi.security import APIKeyHeader
 from pydantic import BaseModel
 # 导入数据库操作模块
-from database.api_key_db import (
+from backend.database.api_key_db import (
     insert_api_key as db_create_api_key,
     query_all_api_keys as db_get_all_api_keys,
     delete_api_key as db_delete_api_key,
-    query_api_key as db_get_api_key
+    query_api_key as db_get_api_key,
+    get_pepper as db_get_pepper,
+    get_generation as db_get_generation
 )
-import config
+from backend.database.key_hash import lookup_digest, hash_secret, verify_secret
+import backend.config as config
 
 logger = config.setup_logging() 
 
 # API密钥头部名称
 API_KEY_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
-# 内存中的API密钥缓存
+# 内存中的API密钥缓存，键为key_id（密钥的HMAC摘要），不保存明文密钥
 api_key_cache: Dict[str, Dict] = {}
+# 计算key_id的服务端密钥、缓存对应的密钥变更代数、上次检查代数的时间及上次因未命中而强制检查的时间
+_cache_state = {"pepper": None, "generation": None, "checked_at": 0.0, "miss_checked_at": 0.0}
+_cache_lock = threading.Lock()
+
+
+class KeyStoreUnavailable(Exception):
+    """无法从数据库读取服务端密钥，暂时无法校验API密钥"""
+
 
 class APIKeyManager:
     """API密钥管理器"""
@@ -37,20 +50,28 @@ class APIKeyManager:
         Returns:
             int: 加载的API密钥数量
         """
-        global api_key_cache
         try:
-            # 从数据库获取所有API密钥
-            api_keys = db_get_all_api_keys()
-
-            # 清空当前缓存，但不改变引用
-            api_key_cache.clear()
-
-            # 将API密钥加载到内存缓存
-            for api_key_info in api_keys:
-                api_key_cache[api_key_info["api_key"]] = {
-                    "name": api_key_info["name"],
-                    "created_at": api_key_info["created_at"]
-                }
+            with _cache_lock:
+                # 先读代数再读密钥，期间的变更会在下次检查时重新加载
+                generation = db_get_generation()
+                _cache_state["pepper"] = db_get_pepper()
+                api_keys = db_get_all_api_keys()
+                # 已校验过加盐哈希的密钥保留校验结果
+                verified = {key_id for key_id, info in api_key_cache.items() if info.get("verified")}
+
+                # 清空当前缓存，但不改变引用
+                api_key_cache.clear()
+
+                # 将API密钥加载到内存缓存
+                for api_key_info in api_keys:
+                    api_key_cache[api_key_info["key_id"]] = {
+                        "name": api_key_info["name"],
+                        "created_at": api_key_info["created_at"],
+                        "key_hash": api_key_info["key_hash"],
+                        "verified": api_key_info["key_id"] in verified
+                    }
+                _cache_state["generation"] = generation
+                _cache_state["checked_at"] = time.monotonic()
 
             logger.info(f"已加载 {len(api_key_cache)} 个API密钥到内存缓存")
             return len(api_key_cache)
@@ -60,48 +81,111 @@ class APIKeyManager:
             return 0
 
     @staticmethod
-    def add_api_key_to_cache(api_key: str, name: str, created_at: str) -> None:
+    def refresh_if_stale(force: bool = False) -> bool:
         """
-        将API密钥添加到内存缓存
+        检查数据库中的密钥变更代数，其他进程创建或删除密钥后重新加载缓存；
+        未强制时每API_KEY_REFRESH_INTERVAL秒最多检查一次
+
+        Args:
+            force (bool): 是否忽略检查间隔
+
+        Returns:
+            bool: 是否重新加载了缓存
+        """
+        now = time.monotonic()
+        if not force and now - _cache_state["checked_at"] < config.settings.api_key_refresh_interval:
+            return False
+        _cache_state["checked_at"] = now
+        generation = db_get_generation()
+        if generation == _cache_state["generation"] or generation < 0:
+            return False
+        APIKeyManager.load_api_keys_to_cache()
+        return True
+
+    @staticmethod
+    def key_id(api_key: str) -> str:
+        """
+        计算API密钥的key_id
 
         Args:
             api_key (str): API密钥
+
+        Returns:
+            str: HMAC摘要
+
+        Raises:
+            KeyStoreUnavailable: 服务端密钥加载失败
+        """
+        if _cache_state["pepper"] is None:
+            APIKeyManager.load_api_keys_to_cache()
+        if _cache_state["pepper"] is None:
+            raise KeyStoreUnavailable("API密钥存储暂不可用")
+        return lookup_digest(_cache_state["pepper"], api_key)
+
+    @staticmethod
+    def add_api_key_to_cache(key_id: str, key_hash: str, name: str, created_at: str) -> None:
+        """
+        将API密钥添加到内存缓存
+
+        Args:
+            key_id (str): 密钥的HMAC摘要
+            key_hash (str): 密钥的加盐哈希
             name (str): 密钥名称
             created_at (str): 创建时间
         """
-        api_key_cache[api_key] = {
+        api_key_cache[key_id] = {
             "name": name,
-            "created_at": created_at
+            "created_at": created_at,
+            "key_hash": key_hash,
+            "verified": True
         }
 
     @staticmethod
-    def remove_api_key_from_cache(api_key: str) -> bool:
+    def remove_api_key_from_cache(key_id: str) -> bool:
         """
         从内存缓存中删除API密钥
 
         Args:
-            api_key (str): 要删除的API密钥
+            key_id (str): 要删除的密钥的HMAC摘要
 
         Returns:
             bool: 删除成功返回True，否则返回False
         """
-        if api_key in api_key_cache:
-            del api_key_cache[api_key]
-            return True
-        return False
+        return api_key_cache.pop(key_id, None) is not None
 
     @staticmethod
     def is_api_key_valid(api_key: str) -> bool:
         """
-        验证API密钥是否有效（从内存缓存中检查）
+        验证API密钥是否有效：计算HMAC摘要后在内存缓存中查找，未命中时检查其他进程是否新建了密钥，
+        该检查每API_KEY_REFRESH_INTERVAL秒最多一次，大量无效密钥不会逐个读取数据库；
+        每个密钥在本进程首次使用时校验一次加盐哈希
 
         Args:
             api_key (str): API密钥
 
         Returns:
             bool: 有效返回True，否则返回False
+
+        Raises:
+            KeyStoreUnavailable: 服务端密钥加载失败
         """
-        return api_key in api_key_cache
+        APIKeyManager.refresh_if_stale()
+        key_id = APIKeyManager.key_id(api_key)
+        info = api_key_cache.get(key_id)
+        if info is None:
+            now = time.monotonic()
+            if now - _cache_state["miss_checked_at"] >= config.settings.api_key_refresh_interval:
+                _cache_state["miss_checked_at"] = now
+                if APIKeyManager.refresh_if_stale(force=True):
+                    info = api_key_cache.get(key_id)
+        if info is None:
+            return False
+        if not info["verified"]:
+            if not verify_secret(api_key, info["key_hash"]):
+                logger.warning(f"API密钥 {key_id[:12]} 的加盐哈希校验失败")
+                return False
+            info["verified"] = True
+        return True
 
     @staticmethod
     def get_api_key_info(api_key: str) -> Optional[Dict]:
@@ -114,7 +198,9 @@ class APIKeyManager:
         Returns:
             Optional[Dict]: API密钥信息，无效返回None
         """
-        return api_key_cache.get(api_key)
+        if not APIKeyManager.is_api_key_valid(api_key):
+            return None
+        return api_key_cache.get(APIKeyManager.key_id(api_key))
 
 
 # API密钥请求模型
@@ -131,8 +217,10 @@ class APIKeyResponse(BaseModel):
 
 # API密钥信息模型
 class APIKeyInfo(BaseModel):
+    key_id: Optional[str] = None  # 密钥的HMAC摘要，只对请求者自己的密钥返回，用于配置LLM_TENANT_WEIGHTS
     name: str
     created_at: str
+    usage: Optional[Dict] = None  # 配额使用情况：当日token、运行与排队的任务数、剩余请求令牌
 
 
 # API密钥列表响应模型
@@ -150,7 +238,11 @@ def validate_from_header(api_key_header: str = Depends(api_key_header)):
     返回:
     - 验证通过返回API密钥，否则抛出异常
     """
-    if api_key_header and APIKeyManager.is_api_key_valid(api_key_header):
+    try:
+        valid = bool(api_key_header) and APIKeyManager.is_api_key_valid(api_key_header)
+    except KeyStoreUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if valid:
         return api_key_header
     else:
         raise HTTPException(
@@ -172,11 +264,13 @@ def create_new_api_key(name: str) -> Optional[Dict]:
     """
     api_key = secrets.token_urlsafe(32)
     created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    key_id = APIKeyManager.key_id(api_key)
+    key_hash = hash_secret(api_key)
 
-    # 保存到数据库
-    if db_create_api_key(api_key, name, created_at):
+    # 保存到数据库，明文密钥只在本次返回
+    if db_create_api_key(key_id, key_hash, name, created_at):
         # 同步到内存缓存
-        APIKeyManager.add_api_key_to_cache(api_key, name, created_at)
+        APIKeyManager.add_api_key_to_cache(key_id, key_hash, name, created_at)
         return {
             "api_key": api_key,
             "name": name,
@@ -189,19 +283,27 @@ def create_new_api_key(name: str) -> Optional[Dict]:
             headers={"WWW-Authenticate": "API Key"}
         )
 
-def list_all_api_keys() -> List[APIKeyInfo]:
+def list_all_api_keys(own_key_id: Optional[str] = None,
+                      usage: Optional[Callable[[str], Dict]] = None) -> List[APIKeyInfo]:
     """
-    获取所有API密钥列表（从内存缓存中获取）
+    获取所有API密钥列表（从内存缓存中获取），其他密钥的key_id不返回
+
+    Args:
+        own_key_id (Optional[str]): 请求者密钥的key_id，只有该条目返回key_id
+        usage (Optional[Callable[[str], Dict]]): 按key_id获取配额使用情况的函数
 
     Returns:
         List[Dict]: API密钥列表
     """
+    APIKeyManager.refresh_if_stale()
     return [
         APIKeyInfo(
+            key_id=key if key == own_key_id else None,
             name=value["name"],
-            created_at=value["created_at"]
+            created_at=value["created_at"],
+            usage=usage(key) if usage else None
         )
-        for key, value in api_key_cache.items()
+        for key, value in list(api_key_cache.items())
     ]
 
 
@@ -210,16 +312,18 @@ def remove_api_key(api_key: str) -> bool:
     删除API密钥（同时删除数据库和内存缓存中的记录）
 
     Args:
-        api_key (str): 要删除的API密钥
+        api_key (str): 要删除的API密钥，不接受key_id，只有持有密钥本身才能删除
 
     Returns:
         bool: 删除成功返回True，否则返回False
     """
+    APIKeyManager.refresh_if_stale(force=True)
+    key_id = APIKeyManager.key_id(api_key)
     # 从数据库删除
-    db_success = db_delete_api_key(api_key)
+    db_success = db_delete_api_key(key_id)
 
     # 从内存缓存删除
-    cache_success = APIKeyManager.remove_api_key_from_cache(api_key)
+    cache_success = APIKeyManager.remove_api_key_from_cache(key_id)
 
     # 数据库操作失败则抛出异常
     return db_success and cache_success
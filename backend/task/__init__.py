@@ -0,0 +1,40 @@
+from .worker_pool import CancelFlag, TaskCancelledError, get_executor, submit, run_in_pool, shutdown
+from .task_store import tasks, TaskStore
+from .extract_task import process_extraction_task, submit_extraction_task
+from .dedup import extraction_key, text_sha256, file_sha256
+from .upload_spool import UploadTooLarge, InvalidUpload, spool_upload, spool_multipart, remove_spooled, cleanup_spool_dir
+from .result_codec import CompressedRows, compress_rows, expand_rows, encode_body
+from .retention import sweep, start_sweeper, stop_sweeper
+from .quota import KeyQuota, QuotaExceeded, current_key
+
+__all__ = [
+    "CancelFlag",
+    "TaskCancelledError",
+    "get_executor",
+    "submit",
+    "run_in_pool",
+    "shutdown",
+    "tasks",
+    "TaskStore",
+    "process_extraction_task",
+    "submit_extraction_task",
+    "extraction_key",
+    "text_sha256",
+    "file_sha256",
+    "UploadTooLarge",
+    "InvalidUpload",
+    "spool_upload",
+    "spool_multipart",
+    "remove_spooled",
+    "cleanup_spool_dir",
+    "CompressedRows",
+    "compress_rows",
+    "expand_rows",
+    "encode_body",
+    "sweep",
+    "start_sweeper",
+    "stop_sweeper",
+    "KeyQuota",
+    "QuotaExceeded",
+    "current_key"
+]
@@ -0,0 +1,33 @@
+"""
+抽取任务去重
+相同内容、相同模型与提示词版本的抽取结果相同，新的请求复用已完成或进行中的任务，
+避免同一份指南被并发重复抽取
+"""
+import hashlib
+
+from backend.prompt import PromptRegistry
+
+
+def extraction_key(content_sha256: str) -> str:
+    """
+    抽取结果的去重键
+
+    Args:
+        content_sha256: 上传文件或文本的sha256
+
+    Returns:
+        str: 由内容摘要与抽取流程版本（各阶段提示词、模型ID与temperature的指纹）组成的键
+    """
+    return f"{content_sha256}:{PromptRegistry.version()}"
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,196 @@
+"""
+抽取任务的执行与提交，REST接口与MCP工具共用
+"""
+import os
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Optional
+
+import backend.config as config
+from backend.database import task_db
+from backend.extract_service import extract_text_from_pdf, extract
+from backend.llm import UsageTracker, stream_hub
+from backend.metrics import TASK_QUEUE_DEPTH, ACTIVE_TASKS, TASKS_TOTAL, TASK_DURATION
+from backend.prompt import PromptRegistry
+from backend.tracing import start_span
+from .quota import KeyQuota, QuotaExceeded
+from .result_codec import compress_rows
+from .task_store import tasks
+from .upload_spool import remove_spooled
+from .worker_pool import CancelFlag, TaskCancelledError
+
+logger = config.setup_logging()
+
+
+def _read_text(file_path: str) -> str:
+    if file_path.lower().endswith(".pdf"):
+        return extract_text_from_pdf(file_path)
+    with open(file_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _remove_file(file_path: Optional[str], remove_file: bool) -> None:
+    if remove_file and file_path and os.path.exists(file_path):
+        # 同时释放暂存文件的文件锁
+        remove_spooled(file_path)
+
+
+def submit_extraction_task(task_id: str, file_path: Optional[str], filename: str,
+                           text: Optional[str] = None, remove_file: bool = True,
+                           owner: Optional[str] = None) -> Future:
+    """
+    提交抽取任务到共享线程池，同一API密钥的任务超过并发上限时排队，参数同process_extraction_task
+
+    Args:
+        owner: 提交任务的API密钥（key_id），None不限制
+
+    Returns:
+        Future: 任务的Future
+    """
+    if owner and task_id in tasks:
+        tasks[task_id]["owner"] = owner
+    # 取消标记随参数传入，任务记录被删除后工作线程仍可据此退出
+    cancel_flag = tasks[task_id].get("cancel_flag") if task_id in tasks else None
+    TASK_QUEUE_DEPTH.inc()
+    return KeyQuota.submit(owner, task_id, process_extraction_task, task_id, file_path, filename, text, remove_file,
+                           cancel_flag)
+
+
+def process_extraction_task(task_id: str, file_path: Optional[str], filename: str,
+                            text: Optional[str] = None, remove_file: bool = True,
+                            cancel_flag: Optional[CancelFlag] = None):
+    """
+    在后台线程中处理知识抽取任务
+
+    Args:
+        task_id: 任务ID
+        file_path: 待抽取的文件路径，PDF按页提取文本，其他文件按UTF-8文本读取
+        filename: 文件名
+        text: 待抽取的文本，提供时不读取文件
+        remove_file: 任务结束后是否删除文件（上传的临时文件）
+        cancel_flag: 取消标记，取消后在下一个检查点停止抽取并关闭进行中的大模型连接
+    """
+    TASK_QUEUE_DEPTH.dec()
+    task = tasks.get(task_id)
+    cancel_flag = cancel_flag or CancelFlag()
+    if task is None or cancel_flag.cancelled:
+        # 排队期间任务已被删除，不再读取文件与调用大模型
+        logger.info(f"任务 {task_id} 在开始前已取消")
+        _remove_file(file_path, remove_file)
+        TASKS_TOTAL.inc(status="cancelled")
+        stream_hub.close(task_id)
+        return
+    start_time_str = task["start_time_str"]
+    start_time = task["start_time"]
+    ACTIVE_TASKS.inc()
+    persist = config.settings.task_persist
+    if persist:
+        task_db.upsert_task(task_id, task)
+    def progress_callback(progress: int, message: str):
+        """进度回调函数，同时作为取消检查点"""
+        cancel_flag.check()
+        if task_id in tasks:
+            tasks[task_id].update({
+                "progress": progress,
+                "message": message
+            })
+            if persist:
+                task_db.update_progress(task_id, progress, message, tasks[task_id]["status"])
+
+    with start_span("extract_task", task_id=task_id, filename=filename) as span:
+        # 记录链路ID，便于按任务查询耗时分布
+        task["trace_id"] = span.trace_id
+        # 记录本次抽取使用的提示词指纹，结果与阶段缓存据此判断是否仍然有效
+        fingerprints = PromptRegistry.fingerprints()
+        task["prompt_fingerprints"] = fingerprints
+        try:
+            # 排队期间所属密钥的每日token可能已用尽
+            if KeyQuota.daily_tokens_exhausted(task.get("owner")):
+                raise QuotaExceeded("API密钥当日的大模型token已用尽")
+            if text is None:
+                # 更新任务状态
+                progress_callback(5, "开始处理文件")
+                text = _read_text(file_path)
+                progress_callback(10, "文本提取完成，开始调用大模型API")
+            task["status"] = "processing"
+            # 调用API抽取信息（支持进度更新）
+            df = extract(text, filename, progress_callback, task_id, fingerprints, cancel_flag)
+            progress_callback(90, "大模型处理完成，正在整理结果")
+            # 转换DataFrame为字典列表
+            with start_span("serialize"):
+                data = df.to_dict('records')
+
+            # 清理临时文件
+            _remove_file(file_path, remove_file)
+            # 计算处理时长
+            duration = time.time() - start_time
+            # 获取结束时间
+            end_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            # 完成任务
+            task.update({
+                "status": "completed",
+                "progress": 100,
+                "start_time_str":start_time_str,
+                "end_time": time.time(),
+                "end_time_str": end_time_str,
+                "message": f"任务完成，成功从 {filename} 抽取了 {len(data)} 条记录",
+                "result": {
+                    "filename": filename,
+                    # 字典编码并压缩，内存占用约为字典列表的十分之一
+                    "data": compress_rows(data),
+                    "count": len(data),
+                    "prompt_fingerprints": fingerprints
+                },
+                "duration": duration,
+                "usage": UsageTracker.get_task_usage(task_id)
+            })
+            TASKS_TOTAL.inc(status="completed")
+            TASK_DURATION.observe(duration, status="completed")
+
+        except TaskCancelledError:
+            span.set_attribute("cancelled", True)
+            _remove_file(file_path, remove_file)
+            duration = time.time() - start_time
+            task.update({
+                "status": "cancelled",
+                "end_time": time.time(),
+                "end_time_str": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "message": "任务已取消",
+                "duration": duration,
+                "usage": UsageTracker.get_task_usage(task_id)
+            })
+            logger.info(f"任务 {task_id} 已取消，耗时 {duration:.2f}s")
+            TASKS_TOTAL.inc(status="cancelled")
+            TASK_DURATION.observe(duration, status="cancelled")
+
+        except Exception as e:
+            span.set_error(e)
+            # 清理临时文件
+            _remove_file(file_path, remove_file)
+            # 计算处理时长
+            duration = time.time() - start_time
+            end_time_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            task.update({
+                "status": "failed",
+                "progress": 100,
+                "start_time_str": start_time_str,
+                "end_time": time.time(),
+                "end_time_str": end_time_str,
+                "message": f"处理文件时出错: {str(e)}",
+                "duration": duration,
+                "usage": UsageTracker.get_task_usage(task_id)
+            })
+            TASKS_TOTAL.inc(status="failed")
+            TASK_DURATION.observe(duration, status="failed")
+        finally:
+            if task_id in tasks:
+                if persist:
+                    task_db.upsert_task(task_id, task)
+            else:
+                # 任务记录已被删除，不再写回数据库；中断的调用在删除后才记录的用量一并清理
+                UsageTracker.remove_task_usage(task_id)
+            ACTIVE_TASKS.dec()
+            # 通知流式输出的订阅者任务已结束
+            stream_hub.close(task_id)
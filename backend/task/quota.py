@@ -0,0 +1,241 @@
+"""
+API密钥配额
+- 请求速率：每个密钥一个令牌桶，在鉴权中间件中扣减，超出时返回429
+- 并发任务数：抽取任务按密钥分组调度，同一密钥同时处理的任务超过上限时在该密钥的队列中排队，
+  不占用共享线程池的线程，其他密钥的任务不受影响
+- 每日token：大模型调用的用量按任务所属密钥累计到数据库（多个工作进程共用），用尽后中间件拒绝新的提交，
+  排队中的任务开始时失败
+令牌桶与调度队列在进程内维护，每个工作进程分别限制
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+import backend.config as config
+from backend.database import quota_db
+from backend.llm import UsageTracker, current_tenant
+from backend.metrics import QUOTA_REJECTIONS, KEY_QUEUED_TASKS
+from . import worker_pool
+
+logger = config.setup_logging()
+
+# 当前请求或任务所属的密钥，鉴权中间件与抽取任务设置；用量据此归属，大模型调用据此公平排队
+current_key = current_tenant
+
+
+class QuotaExceeded(Exception):
+    """超出密钥配额"""
+
+
+class TokenBucket:
+    """令牌桶，按固定速率补充，容量为burst"""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        """
+        尝试取出一个令牌
+
+        Returns:
+            float: 0表示成功，否则为需要等待的秒数
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def available(self) -> float:
+        self._refill(time.monotonic())
+        return self.tokens
+
+
+_lock = threading.Lock()
+_buckets: Dict[str, TokenBucket] = {}
+# 各密钥正在处理的任务数与排队的任务
+_running: Dict[str, int] = {}
+_queues: Dict[str, Deque[Tuple[Future, str, Callable, tuple]]] = {}
+# 任务ID到所属密钥，用于归属任务中大模型调用的用量
+_task_owner: Dict[str, str] = {}
+
+
+def _today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+class KeyQuota:
+    """API密钥配额管理器"""
+
+    @staticmethod
+    def check_rate(key_id: str) -> float:
+        """
+        扣减密钥的请求令牌
+
+        Args:
+            key_id: 密钥的HMAC摘要
+
+        Returns:
+            float: 0表示放行，否则为建议的重试等待秒数
+        """
+        settings = config.settings
+        if settings.key_rate_per_minute <= 0:
+            return 0.0
+        with _lock:
+            bucket = _buckets.get(key_id)
+            if bucket is None or bucket.rate != settings.key_rate_per_minute / 60 or bucket.capacity != max(settings.key_rate_burst, 1):
+                bucket = _buckets[key_id] = TokenBucket(settings.key_rate_per_minute / 60, settings.key_rate_burst)
+            wait = bucket.acquire()
+        if wait:
+            QUOTA_REJECTIONS.inc(reason="rate")
+        return wait
+
+    @staticmethod
+    def tokens_today(key_id: str) -> int:
+        return quota_db.query_tokens(key_id, _today())
+
+    @staticmethod
+    def daily_tokens_exhausted(key_id: Optional[str]) -> bool:
+        """
+        Args:
+            key_id: 密钥的HMAC摘要，None（如MCP提交的任务）不限制
+
+        Returns:
+            bool: 当日token是否已用尽
+        """
+        limit = config.settings.key_daily_tokens
+        if not key_id or limit <= 0:
+            return False
+        exhausted = KeyQuota.tokens_today(key_id) >= limit
+        if exhausted:
+            QUOTA_REJECTIONS.inc(reason="daily_tokens")
+        return exhausted
+
+    @staticmethod
+    def submit(owner: Optional[str], task_id: str, fn: Callable, *args) -> Future:
+        """
+        按密钥的并发上限提交任务：未达上限时直接提交到共享线程池，否则在该密钥的队列中等待，
+        同一密钥的任务结束后按提交顺序启动下一个
+
+        Args:
+            owner: 所属密钥，None不限制
+            task_id: 任务ID
+            fn: 任务函数
+            *args: 任务参数
+
+        Returns:
+            Future: 任务的Future，排队中的任务可取消
+        """
+        future: Future = Future()
+        if owner:
+            _task_owner[task_id] = owner
+        with _lock:
+            limit = config.settings.key_max_concurrent_tasks
+            if owner and limit > 0 and _running.get(owner, 0) >= limit:
+                _queues.setdefault(owner, deque()).append((future, task_id, fn, args))
+                KEY_QUEUED_TASKS.inc()
+                logger.info(f"任务 {task_id} 超出密钥并发上限 {limit}，排队等待")
+                return future
+            if owner:
+                _running[owner] = _running.get(owner, 0) + 1
+        KeyQuota._dispatch(owner, task_id, future, fn, args)
+        return future
+
+    @staticmethod
+    def _dispatch(owner: Optional[str], task_id: str, future: Future, fn: Callable, args: tuple) -> None:
+        if not future.set_running_or_notify_cancel():
+            KeyQuota._release(owner, task_id)
+            return
+        # 任务在独立的上下文中执行，其中的大模型调用归属所属密钥，不受线程池中上一个任务的影响
+        context = contextvars.Context()
+        context.run(current_key.set, owner)
+        inner = worker_pool.submit(context.run, fn, *args)
+
+        def done(f: Future) -> None:
+            KeyQuota._release(owner, task_id)
+            if f.cancelled():
+                future.cancel()
+            elif f.exception() is not None:
+                future.set_exception(f.exception())
+            else:
+                future.set_result(f.result())
+
+        inner.add_done_callback(done)
+
+    @staticmethod
+    def _release(owner: Optional[str], task_id: str) -> None:
+        """任务结束，释放密钥的并发名额并启动该密钥排队中的下一个任务"""
+        _task_owner.pop(task_id, None)
+        if not owner:
+            return
+        with _lock:
+            queue = _queues.get(owner)
+            if not queue:
+                _running[owner] = max(_running.get(owner, 1) - 1, 0)
+                if not _running[owner]:
+                    del _running[owner]
+                return
+            future, next_task_id, fn, args = queue.popleft()
+            if not queue:
+                del _queues[owner]
+            KEY_QUEUED_TASKS.dec()
+        # 名额直接转交给排队的任务，_running不变
+        KeyQuota._dispatch(owner, next_task_id, future, fn, args)
+
+    @staticmethod
+    def usage(key_id: str, tokens_today: Optional[int] = None) -> Dict:
+        """
+        密钥的配额使用情况
+
+        Args:
+            key_id: 密钥的HMAC摘要
+            tokens_today: 已查询的当日token用量，None时查询数据库
+
+        Returns:
+            Dict: tokens_today、daily_token_limit、running_tasks、queued_tasks、rate_tokens_available
+        """
+        settings = config.settings
+        with _lock:
+            bucket = _buckets.get(key_id)
+            running = _running.get(key_id, 0)
+            queued = len(_queues.get(key_id, ()))
+            available = bucket.available() if bucket else float(settings.key_rate_burst)
+        return {
+            "tokens_today": KeyQuota.tokens_today(key_id) if tokens_today is None else tokens_today,
+            "daily_token_limit": settings.key_daily_tokens or None,
+            "running_tasks": running,
+            "queued_tasks": queued,
+            "max_concurrent_tasks": settings.key_max_concurrent_tasks or None,
+            "rate_tokens_available": round(available, 2) if settings.key_rate_per_minute > 0 else None
+        }
+
+    @staticmethod
+    def usage_all() -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: 所有密钥当日的token用量
+        """
+        return quota_db.query_day(_today())
+
+
+def _record_tokens(record: Dict) -> None:
+    """用量回调：将大模型调用的token数累计到任务所属密钥或当前请求的密钥"""
+    owner = _task_owner.get(record.get("task_id") or "") or current_key.get()
+    tokens = record["prompt_tokens"] + record["completion_tokens"]
+    if owner and tokens:
+        quota_db.add_tokens(owner, _today(), tokens)
+
+
+UsageTracker.add_listener(_record_tokens)
@@ -0,0 +1,263 @@
+"""
+抽取结果的压缩存储
+完成任务的结果行中entity、property、entityTag等字符串大量重复，按列做字典编码：
+每列只保存字符串表中的下标，按固定行数分块压缩（默认gzip，安装zstandard时可选zstd），
+内存中只保留压缩后的字节，按页读取时只解码该页覆盖的块；同时提供响应体按Accept-Encoding选择br/gzip压缩的工具函数
+"""
+import gzip
+import json
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import backend.config as config
+
+logger = config.setup_logging()
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 结果压缩方式，none为不压缩（保留字典列表）
+RESULT_CODECS = ("none", "gzip", "zstd")
+# 小于该字节数的响应不压缩
+MIN_COMPRESS_BYTES = 1024
+# 结果行按块压缩时每块的行数
+BLOCK_ROWS = 1024
+
+
+def _compress(payload: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(payload)
+    return gzip.compress(payload, compresslevel=6)
+
+
+def _decompress(blob: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+class CompressedRows:
+    """
+    字典编码并压缩的结果行，可像列表一样取长度、迭代与切片（切片返回字典列表）。
+    按BLOCK_ROWS行分块，每块独立编码与压缩，读取一页只解码其覆盖的块；最近解码的块保留在内存中，
+    顺序翻页时同一块只解码一次
+    """
+
+    __slots__ = ("codec", "columns", "count", "block_rows", "blocks", "_cached")
+
+    def __init__(self, rows: List[Dict], codec: str = "gzip", block_rows: int = BLOCK_ROWS):
+        """
+        Args:
+            rows: 结果行（字典列表）
+            codec: 压缩方式，gzip或zstd，zstd不可用时退回gzip
+            block_rows: 每块的行数
+        """
+        if codec == "zstd" and zstandard is None:
+            logger.warning("未安装zstandard，结果压缩改用gzip")
+            codec = "gzip"
+        columns: List[str] = []
+        for row in rows:
+            for column in row:
+                if column not in columns:
+                    columns.append(column)
+        self.codec = codec
+        self.columns = tuple(columns)
+        self.count = len(rows)
+        self.block_rows = max(block_rows, 1)
+        self.blocks = [self._encode_block(rows[start:start + self.block_rows])
+                       for start in range(0, self.count, self.block_rows)]
+        # (块序号, 解码后的行)
+        self._cached: Optional[Tuple[int, List[Dict]]] = None
+
+    def _encode_block(self, rows: List[Dict]) -> bytes:
+        strings: List = []
+        index: Dict = {}
+        codes = []
+        for column in self.columns:
+            column_codes = []
+            for row in rows:
+                value = row.get(column)
+                # 按(类型, 值)去重，避免1与"1"、True与1合并
+                key = (type(value).__name__, value)
+                code = index.get(key)
+                if code is None:
+                    code = index[key] = len(strings)
+                    strings.append(value)
+                column_codes.append(code)
+            codes.append(column_codes)
+        payload = json.dumps({"strings": strings, "codes": codes}, ensure_ascii=False, separators=(",", ":"))
+        return _compress(payload.encode("utf-8"), self.codec)
+
+    def _block(self, number: int) -> List[Dict]:
+        cached = self._cached
+        if cached is not None and cached[0] == number:
+            return cached[1]
+        payload = json.loads(_decompress(self.blocks[number], self.codec))
+        strings, codes = payload["strings"], payload["codes"]
+        size = len(codes[0]) if codes else 0
+        rows = [{column: strings[codes[i][n]] for i, column in enumerate(self.columns)} for n in range(size)]
+        self._cached = (number, rows)
+        return rows
+
+    def iter_batches(self, offset: int = 0, limit: Optional[int] = None) -> Iterator[List[Dict]]:
+        """
+        按块逐批解码结果行，每次只有一块在内存中展开
+
+        Args:
+            offset: 起始行
+            limit: 最大行数，None为不限制
+
+        Returns:
+            Iterator[List[Dict]]: 每块中落在范围内的行
+        """
+        start = max(offset, 0)
+        end = self.count if limit is None else min(start + limit, self.count)
+        while start < end:
+            number, skip = divmod(start, self.block_rows)
+            rows = self._block(number)[skip:skip + end - start]
+            start += len(rows)
+            yield rows
+
+    def slice(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """
+        解码部分结果行
+
+        Args:
+            offset: 起始行
+            limit: 最大行数，None为不限制
+
+        Returns:
+            List[Dict]: 结果行
+        """
+        rows: List[Dict] = []
+        for batch in self.iter_batches(offset, limit):
+            rows.extend(batch)
+        return rows
+
+    def to_list(self) -> List[Dict]:
+        return self.slice()
+
+    @property
+    def nbytes(self) -> int:
+        """压缩后的字节数"""
+        return sum(len(block) for block in self.blocks)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Dict]:
+        for batch in self.iter_batches():
+            yield from batch
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self.count)
+            rows = self.slice(start, max(stop - start, 0))
+            return rows[::step] if step != 1 else rows
+        if item < 0:
+            item += self.count
+        if not 0 <= item < self.count:
+            raise IndexError(item)
+        return self.slice(item, 1)[0]
+
+
+def compress_rows(rows: List[Dict], codec: Optional[str] = None):
+    """
+    按RESULT_COMPRESSION配置压缩结果行
+
+    Args:
+        rows: 结果行
+        codec: 压缩方式，默认取配置
+
+    Returns:
+        CompressedRows或原列表（none时）
+    """
+    codec = codec or config.settings.result_compression
+    if codec not in RESULT_CODECS:
+        raise ValueError(f"RESULT_COMPRESSION需为{'、'.join(RESULT_CODECS)}之一: {codec}")
+    if codec == "none":
+        return rows
+    return CompressedRows(rows, codec)
+
+
+def expand_rows(rows) -> List[Dict]:
+    """将压缩的结果行还原为字典列表，未压缩时原样返回"""
+    if isinstance(rows, CompressedRows):
+        return rows.to_list()
+    return rows
+
+
+def rows_nbytes(rows) -> int:
+    """
+    结果行占用的字节数，压缩存储时为压缩后的大小，未压缩时按JSON序列化长度估算
+
+    Args:
+        rows: 结果行
+
+    Returns:
+        int: 字节数
+    """
+    if isinstance(rows, CompressedRows):
+        return rows.nbytes
+    return len(json.dumps(rows, ensure_ascii=False).encode("utf-8"))
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    按Accept-Encoding选择响应压缩方式，优先br（需安装brotli），其次gzip
+
+    Args:
+        accept_encoding: 请求头Accept-Encoding
+
+    Returns:
+        Optional[str]: br、gzip，客户端都不接受时返回None
+    """
+    # 编码名到q值，*只匹配未单独列出的编码，单独以q=0列出的编码不会因*被选中
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, *params = [item.strip() for item in part.split(";")]
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    def accepts(encoding: str) -> bool:
+        return weights.get(encoding, weights.get("*", 0.0)) > 0
+
+    if brotli is not None and accepts("br"):
+        return "br"
+    if accepts("gzip"):
+        return "gzip"
+    return None
+
+
+def encode_body(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """
+    按客户端接受的编码压缩响应体
+
+    Args:
+        body: 响应体
+        accept_encoding: 请求头Accept-Encoding
+
+    Returns:
+        Tuple[bytes, Optional[str]]: 压缩后的响应体与Content-Encoding，未压缩时为None
+    """
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding == "br":
+        return brotli.compress(body, quality=5), encoding
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6), encoding
+    return body, None
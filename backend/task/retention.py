@@ -0,0 +1,201 @@
+"""
+任务保留策略
+后台线程定期清理内存中已结束的任务：先按状态的保留时长清理过期任务，再按最大任务数与结果总字节数
+从最早结束的任务开始清理；同时删除不再被任何工作进程使用的上传暂存文件（工作进程异常退出时遗留），
+以及数据库中超过保留时长的任务记录与长期未访问的阶段缓存
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import backend.config as config
+from backend.database import task_db, stage_cache_db
+from backend.llm import UsageTracker
+from backend.metrics import TASKS_EVICTED, TASKS_RETAINED, TASK_RESULT_BYTES, STORAGE_PURGED
+from .result_codec import rows_nbytes
+from .task_store import tasks, TaskStore
+from .upload_spool import get_spool_dir, spool_in_use, SPOOL_SUFFIX
+
+logger = config.setup_logging()
+
+# 已结束的任务状态
+FINISHED_STATUS = ("completed", "failed", "cancelled")
+
+_sweeper: Optional[threading.Thread] = None
+_stop_event = threading.Event()
+
+
+def _result_bytes(task: dict) -> int:
+    """任务结果的字节数，首次计算后记录在任务中"""
+    if "result_bytes" not in task:
+        result = task.get("result") or {}
+        task["result_bytes"] = rows_nbytes(result.get("data") or []) if result else 0
+    return task["result_bytes"]
+
+
+def _finished_at(task: dict) -> float:
+    end_time = task.get("end_time")
+    if end_time is None:
+        end_time = task.get("start_time", 0) + (task.get("duration") or 0)
+    return end_time
+
+
+def evict_tasks(now: Optional[float] = None) -> Dict[str, int]:
+    """
+    按保留策略清理内存中已结束的任务
+
+    Args:
+        now: 当前时间戳，默认取time.time()
+
+    Returns:
+        Dict[str, int]: 各清理原因（ttl、count、bytes）的任务数
+    """
+    settings = config.settings
+    now = time.time() if now is None else now
+    ttl = {"completed": settings.task_ttl_completed, "failed": settings.task_ttl_failed,
+           "cancelled": settings.task_ttl_failed}
+    evicted = {"ttl": 0, "count": 0, "bytes": 0}
+
+    def evict(task_id: str, task: dict, reason: str) -> None:
+        if TaskStore.remove(task_id):
+            # 与删除接口一致，同时清理任务的大模型用量统计
+            UsageTracker.remove_task_usage(task_id)
+            evicted[reason] += 1
+            TASKS_EVICTED.inc(status=task.get("status"), reason=reason)
+
+    # 在快照上遍历，避免与提交、删除任务的线程同时修改字典
+    finished = sorted(((task_id, task) for task_id, task in list(tasks.items())
+                       if task.get("status") in FINISHED_STATUS),
+                      key=lambda item: _finished_at(item[1]))
+    retained = []
+    for task_id, task in finished:
+        limit = ttl.get(task.get("status"))
+        if limit and now - _finished_at(task) > limit:
+            evict(task_id, task, "ttl")
+        else:
+            retained.append((task_id, task))
+
+    if settings.task_max_count and len(retained) > settings.task_max_count:
+        excess = len(retained) - settings.task_max_count
+        for task_id, task in retained[:excess]:
+            evict(task_id, task, "count")
+        retained = retained[excess:]
+
+    total_bytes = sum(_result_bytes(task) for _, task in retained)
+    if settings.task_max_result_bytes:
+        while retained and total_bytes > settings.task_max_result_bytes:
+            task_id, task = retained.pop(0)
+            total_bytes -= _result_bytes(task)
+            evict(task_id, task, "bytes")
+
+    TASKS_RETAINED.set(len(tasks))
+    TASK_RESULT_BYTES.set(total_bytes)
+    return evicted
+
+
+def cleanup_orphan_spool(now: Optional[float] = None) -> int:
+    """
+    删除没有被任何工作进程使用（持有文件锁）、且超过宽限期的上传暂存文件；宽限期内的文件可能仍在上传
+
+    Args:
+        now: 当前时间戳，默认取time.time()
+
+    Returns:
+        int: 删除的文件数
+    """
+    now = time.time() if now is None else now
+    grace = config.settings.spool_orphan_grace
+    spool_dir = get_spool_dir()
+    removed = 0
+    for name in os.listdir(spool_dir):
+        path = os.path.join(spool_dir, name)
+        if not name.endswith(SPOOL_SUFFIX):
+            continue
+        try:
+            if now - os.path.getmtime(path) < grace or spool_in_use(path):
+                continue
+            os.unlink(path)
+            removed += 1
+        except OSError:
+            continue
+    if removed:
+        STORAGE_PURGED.inc(removed, target="spool")
+        logger.info(f"已清理 {removed} 个遗留的上传暂存文件")
+    return removed
+
+
+def purge_storage(now: Optional[float] = None) -> Dict[str, int]:
+    """
+    清理数据库中超过保留时长的任务记录与长期未访问的阶段缓存
+
+    Args:
+        now: 当前时间戳，默认取time.time()
+
+    Returns:
+        Dict[str, int]: tasks、stage_cache的删除条数
+    """
+    settings = config.settings
+    now = time.time() if now is None else now
+    purged = {"tasks": 0, "stage_cache": 0}
+    if settings.task_db_ttl:
+        purged["tasks"] = task_db.purge_finished(now - settings.task_db_ttl)
+    if settings.stage_cache_ttl:
+        purged["stage_cache"] = stage_cache_db.purge_unused(now - settings.stage_cache_ttl)
+    for target, count in purged.items():
+        if count:
+            STORAGE_PURGED.inc(count, target=target)
+    return purged
+
+
+def sweep(now: Optional[float] = None) -> Dict[str, int]:
+    """
+    执行一次完整的清理
+
+    Args:
+        now: 当前时间戳，默认取time.time()
+
+    Returns:
+        Dict[str, int]: 各类清理的数量
+    """
+    stats = evict_tasks(now)
+    stats["spool"] = cleanup_orphan_spool(now)
+    stats.update(purge_storage(now))
+    if any(stats.values()):
+        logger.info(f"保留策略清理完成: {stats}")
+    return stats
+
+
+def _run(interval: float) -> None:
+    while not _stop_event.wait(interval):
+        try:
+            sweep()
+        except Exception as e:
+            # 单次清理失败不影响后续执行
+            logger.error(f"保留策略清理失败: {e}")
+
+
+def start_sweeper(interval: Optional[float] = None) -> bool:
+    """
+    启动清理线程，重复调用只启动一个
+
+    Args:
+        interval: 执行间隔(秒)，默认取RETENTION_SWEEP_INTERVAL
+
+    Returns:
+        bool: 是否在运行
+    """
+    global _sweeper
+    interval = config.settings.retention_sweep_interval if interval is None else interval
+    if interval <= 0:
+        return False
+    if _sweeper is None or not _sweeper.is_alive():
+        _stop_event.clear()
+        _sweeper = threading.Thread(target=_run, args=(interval,), name="retention-sweeper", daemon=True)
+        _sweeper.start()
+    return True
+
+
+def stop_sweeper() -> None:
+    """停止清理线程"""
+    _stop_event.set()
@@ -0,0 +1,234 @@
+"""
+任务存储
+REST接口与MCP工具提交的抽取任务保存在同一个进程内字典中，两种接口均可查询、删除对方提交的任务；
+已从内存中清理的任务，查询与结果读取回退到数据库
+"""
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from backend.database import task_db
+from .result_codec import CompressedRows
+from .worker_pool import CancelFlag
+
+# 存储任务状态的字典，键为任务ID
+tasks: Dict[str, dict] = {}
+
+# 去重键到任务ID的索引，任务被删除或失败后不再复用
+_dedup_index: Dict[str, str] = {}
+_dedup_lock = threading.Lock()
+
+# 可复用的任务状态
+REUSABLE_STATUS = ("pending", "processing", "completed")
+# 没有API密钥的订阅者，以提交来源记录
+ANONYMOUS_SUBSCRIBERS = ("api", "mcp")
+
+
+def _subscriber(source: str, owner: Optional[str]) -> str:
+    return owner or source
+
+
+class TaskStore:
+    """任务存储管理类"""
+
+    @staticmethod
+    def create(filename: str, source: str = "api", owner: Optional[str] = None) -> str:
+        """
+        创建任务
+
+        Args:
+            filename: 文件名，用于标记任务
+            source: 提交来源，api或mcp
+            owner: 提交任务的API密钥（key_id）
+
+        Returns:
+            str: 任务ID
+        """
+        task_id = str(uuid.uuid4())
+        tasks[task_id] = {
+            "status": "pending",
+            "filename": filename,
+            "source": source,
+            "progress": 0,
+            "message": "任务已创建",
+            "result": None,
+            "start_time": time.time(),
+            "start_time_str": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            # 取消标记，删除运行中的任务时通知工作线程停止
+            "cancel_flag": CancelFlag(),
+            # 订阅者：提交或复用该任务的API密钥（MCP提交的记为mcp），最后一个订阅者删除时才取消任务
+            "subscribers": {_subscriber(source, owner)}
+        }
+        return task_id
+
+    @staticmethod
+    def create_or_reuse(filename: str, source: str, dedup_key: Optional[str],
+                        owner: Optional[str] = None) -> Tuple[str, bool]:
+        """
+        按去重键查找已完成或进行中的任务，存在则复用并将调用方加入订阅者，否则创建新任务；
+        查找与创建在同一把锁内完成，相同内容的并发请求只会创建一个任务
+
+        Args:
+            filename: 文件名，用于标记任务
+            source: 提交来源，api或mcp
+            dedup_key: 去重键，为空时总是创建新任务
+            owner: 提交任务的API密钥（key_id）
+
+        Returns:
+            Tuple[str, bool]: 任务ID，以及是否复用了已有任务
+        """
+        if not dedup_key:
+            return TaskStore.create(filename, source, owner), False
+        with _dedup_lock:
+            task_id = _dedup_index.get(dedup_key)
+            task = tasks.get(task_id) if task_id else None
+            if task is not None and task.get("status") in REUSABLE_STATUS:
+                task.setdefault("subscribers", set()).add(_subscriber(source, owner))
+                return task_id, True
+            task_id = TaskStore.create(filename, source, owner)
+            tasks[task_id]["dedup_key"] = dedup_key
+            _dedup_index[dedup_key] = task_id
+            return task_id, False
+
+    @staticmethod
+    def get(task_id: str) -> Optional[dict]:
+        """
+        获取任务，内存中没有时读取数据库中的任务记录（不含结果行）
+
+        Returns:
+            Optional[dict]: 任务字典，数据库中的记录只读，修改不会生效；任务不存在返回None
+        """
+        task = tasks.get(task_id)
+        if task is None:
+            task = task_db.query_task(task_id, include_rows=False)
+        return task
+
+    @staticmethod
+    def unsubscribe(task_id: str, source: str, owner: Optional[str] = None) -> Optional[int]:
+        """
+        调用方退订任务；最后一个订阅者退订后任务不再被去重复用，由调用方取消并删除
+
+        Args:
+            task_id: 任务ID
+            source: 调用来源，api或mcp
+            owner: 调用方的API密钥（key_id）
+
+        Returns:
+            Optional[int]: 剩余的订阅者数，任务不存在或调用方无权退订时返回None
+        """
+        with _dedup_lock:
+            task = tasks.get(task_id)
+            if task is None:
+                return None
+            subscribers = task.setdefault("subscribers", set())
+            subscriber = _subscriber(source, owner)
+            if subscriber in subscribers:
+                subscribers.discard(subscriber)
+            elif any(s not in ANONYMOUS_SUBSCRIBERS for s in subscribers):
+                # 有API密钥订阅的任务，只能由这些密钥删除
+                return None
+            else:
+                # 只有匿名订阅者（MCP提交）的任务，两种接口均可删除
+                subscribers.clear()
+            if not subscribers and _dedup_index.get(task.get("dedup_key")) == task_id:
+                del _dedup_index[task["dedup_key"]]
+            return len(subscribers)
+
+    @staticmethod
+    def cancel(task_id: str) -> bool:
+        """
+        通知排队中或处理中的任务停止：排队的任务开始时直接结束，处理中的任务在下一个检查点退出，
+        进行中的大模型流式连接立即关闭
+
+        Returns:
+            bool: 任务是否仍在运行
+        """
+        task = tasks.get(task_id)
+        if task is None or task.get("status") not in ("pending", "processing"):
+            return False
+        cancel_flag = task.get("cancel_flag")
+        if cancel_flag is not None:
+            cancel_flag.cancel()
+        return True
+
+    @staticmethod
+    def remove(task_id: str) -> bool:
+        """
+        删除任务
+
+        Returns:
+            bool: 任务是否存在
+        """
+        task = tasks.pop(task_id, None)
+        if task is None:
+            return False
+        with _dedup_lock:
+            if _dedup_index.get(task.get("dedup_key")) == task_id:
+                del _dedup_index[task["dedup_key"]]
+        return True
+
+    @staticmethod
+    def result_page(task_id: str, offset: int = 0, limit: Optional[int] = None) -> Optional[Tuple[List[dict], int]]:
+        """
+        分页读取任务的抽取结果
+
+        Args:
+            task_id: 任务ID
+            offset: 起始行
+            limit: 最大行数，None为不限制
+
+        Returns:
+            Optional[Tuple[List[dict], int]]: 结果行与总行数，任务不存在或没有结果时返回None
+        """
+        if task_id not in tasks:
+            stored = TaskStore._stored_result(task_id)
+            if stored is None:
+                return None
+            return task_db.query_rows(task_id, offset, -1 if limit is None else limit), stored.get("count", 0)
+        result = tasks[task_id].get("result")
+        if not result:
+            return None
+        rows = result.get("data") or []
+        end = None if limit is None else offset + limit
+        return rows[offset:end], len(rows)
+
+    @staticmethod
+    def iter_result(task_id: str, offset: int = 0, limit: Optional[int] = None,
+                    batch_size: int = 500) -> Optional[Tuple[Iterator[List[dict]], int]]:
+        """
+        分批读取任务的抽取结果，压缩存储的结果按块逐批解码，不一次展开全部结果行
+
+        Args:
+            task_id: 任务ID
+            offset: 起始行
+            limit: 最大行数，None为不限制
+            batch_size: 未压缩结果每批的行数
+
+        Returns:
+            Optional[Tuple[Iterator[List[dict]], int]]: 逐批的结果行与总行数，任务不存在或没有结果时返回None
+        """
+        if task_id not in tasks:
+            stored = TaskStore._stored_result(task_id)
+            if stored is None:
+                return None
+            return task_db.iter_rows(task_id, offset, limit, batch_size), stored.get("count", 0)
+        result = tasks[task_id].get("result")
+        if not result:
+            return None
+        rows = result.get("data") or []
+        if isinstance(rows, CompressedRows):
+            return rows.iter_batches(offset, limit), len(rows)
+        end = len(rows) if limit is None else min(offset + limit, len(rows))
+        return (rows[start:min(start + batch_size, end)] for start in range(offset, end, batch_size)), len(rows)
+
+    @staticmethod
+    def _stored_result(task_id: str) -> Optional[dict]:
+        """数据库中任务结果的元数据（含count），任务不存在或没有结果时返回None"""
+        stored = task_db.query_task(task_id, include_rows=False)
+        return (stored or {}).get("result") or None
+
+    @staticmethod
+    def is_running(task_id: str) -> bool:
+        return tasks.get(task_id, {}).get("status") in ("pending", "processing")
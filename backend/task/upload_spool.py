@@ -0,0 +1,297 @@
+"""
+上传文件落盘
+上传的PDF按块异步写入暂存目录，不在内存中保留完整文件，写盘在线程中执行不阻塞事件循环；
+multipart请求体由spool_multipart边接收边解析，文件内容直接写入暂存文件，不经过框架的临时文件；
+写入的同时计算sha256作为缓存与去重的键，超过大小上限立即中止并删除已写入的部分。
+暂存文件由抽取任务在结束时删除，服务启动时与清理线程删除异常退出遗留的文件。
+暂存目录由多个工作进程共用：创建暂存文件的进程持有该文件的共享文件锁直到删除，
+进程退出时锁由操作系统释放，清理时据此判断文件是否仍被某个进程使用
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional
+
+import backend.config as config
+
+logger = config.setup_logging()
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    # python-multipart 0.0.13之前的包名
+    from multipart.multipart import MultipartParser, parse_options_header
+
+try:
+    import fcntl
+except ImportError:
+    # 不支持文件锁的平台只能识别本进程使用中的文件
+    fcntl = None
+
+PDF_MAGIC = b"%PDF-"
+# 暂存文件保留.pdf后缀，抽取任务据此按PDF解析
+SPOOL_SUFFIX = ".pdf"
+
+
+# 本进程持有锁的暂存文件，路径到文件描述符
+_held: Dict[str, int] = {}
+_held_lock = threading.Lock()
+
+
+class UploadTooLarge(ValueError):
+    """上传文件超过大小上限"""
+
+
+class InvalidUpload(ValueError):
+    """上传内容不是有效的PDF文件"""
+
+
+def get_spool_dir() -> str:
+    """
+    暂存目录，未配置时使用系统临时目录下的子目录
+
+    Returns:
+        str: 暂存目录的路径（已创建）
+    """
+    spool_dir = config.settings.upload_spool_dir or os.path.join(tempfile.gettempdir(), "medical_guideline_uploads")
+    os.makedirs(spool_dir, exist_ok=True)
+    return spool_dir
+
+
+async def spool_upload(upload, max_bytes: Optional[int] = None, chunk_size: Optional[int] = None) -> dict:
+    """
+    将上传文件分块写入暂存目录
+
+    Args:
+        upload: 提供异步read(size)方法的上传文件对象（FastAPI的UploadFile）
+        max_bytes: 大小上限(字节)，默认取UPLOAD_MAX_BYTES，0为不限制
+        chunk_size: 每次读取的字节数，默认取UPLOAD_CHUNK_SIZE
+
+    Returns:
+        dict: path（暂存文件路径）、size（字节数）、sha256
+
+    Raises:
+        UploadTooLarge: 超过大小上限
+        InvalidUpload: 文件头不是PDF
+    """
+    chunk_size = max(chunk_size or config.settings.upload_chunk_size, 1)
+
+    async def chunks():
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    return await _spool_chunks(chunks(), max_bytes)
+
+
+async def spool_multipart(body: AsyncIterator[bytes], content_type: str, field: str = "file",
+                          max_bytes: Optional[int] = None) -> dict:
+    """
+    边接收边解析multipart/form-data请求体，将指定字段的文件直接写入暂存目录；
+    超过大小上限时立即停止接收，不再读取请求体的剩余部分
+
+    Args:
+        body: 请求体的异步字节流（Request.stream()）
+        content_type: 请求头Content-Type
+        field: 文件字段名
+        max_bytes: 大小上限(字节)，默认取UPLOAD_MAX_BYTES，0为不限制
+
+    Returns:
+        dict: path（暂存文件路径）、size（字节数）、sha256、filename（上传的文件名）
+
+    Raises:
+        UploadTooLarge: 超过大小上限
+        InvalidUpload: 不是multipart请求、缺少文件字段、文件名不是.pdf或文件头不是PDF
+    """
+    media_type, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if media_type != b"multipart/form-data" or not boundary:
+        raise InvalidUpload("请求需为包含文件字段的multipart/form-data")
+    part = {"headers": {}, "header_field": b"", "header_value": b"", "is_file": False}
+    meta: Dict = {"filename": None}
+    pending = []
+
+    def on_part_begin():
+        part.update(headers={}, header_field=b"", header_value=b"", is_file=False)
+
+    def on_header_field(data, start, end):
+        part["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["header_value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["header_field"].lower()] = part["header_value"]
+        part["header_field"] = part["header_value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        if disposition.get(b"name", b"").decode("utf-8") != field or meta["filename"] is not None:
+            return
+        filename = disposition.get(b"filename", b"").decode("utf-8")
+        if not filename.endswith(".pdf"):
+            raise InvalidUpload("只支持PDF文件")
+        meta["filename"] = filename
+        part["is_file"] = True
+
+    def on_part_data(data, start, end):
+        if part["is_file"]:
+            pending.append(bytes(data[start:end]))
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+
+    async def file_chunks():
+        async for chunk in body:
+            parser.write(chunk)
+            if pending:
+                data = b"".join(pending)
+                pending.clear()
+                yield data
+        parser.finalize()
+        if pending:
+            yield b"".join(pending)
+            pending.clear()
+        if meta["filename"] is None:
+            raise InvalidUpload(f"缺少文件字段{field}")
+
+    spooled = await _spool_chunks(file_chunks(), max_bytes)
+    spooled["filename"] = meta["filename"]
+    return spooled
+
+
+async def _spool_chunks(chunks: AsyncIterator[bytes], max_bytes: Optional[int]) -> dict:
+    """将字节块写入新的暂存文件，同时校验PDF文件头、大小上限并计算sha256"""
+    max_bytes = config.settings.upload_max_bytes if max_bytes is None else max_bytes
+    path = os.path.join(get_spool_dir(), f"{uuid.uuid4().hex}{SPOOL_SUFFIX}")
+    digest = hashlib.sha256()
+    size = 0
+    # 文件头可能分散在多个很小的块中，攒够PDF_MAGIC长度再校验
+    head = b""
+    f = await asyncio.to_thread(open, path, "wb")
+    _hold(path)
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            if len(head) < len(PDF_MAGIC):
+                head += chunk[:len(PDF_MAGIC) - len(head)]
+                if not PDF_MAGIC.startswith(head):
+                    raise InvalidUpload("文件内容不是有效的PDF")
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise UploadTooLarge(f"文件超过大小上限 {max_bytes} 字节")
+            digest.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+        if size == 0:
+            raise InvalidUpload("文件内容为空")
+        if len(head) < len(PDF_MAGIC):
+            raise InvalidUpload("文件内容不是有效的PDF")
+    except BaseException:
+        # 包括客户端断开导致的取消，不遗留写了一半的文件
+        await asyncio.to_thread(f.close)
+        remove_spooled(path)
+        raise
+    await asyncio.to_thread(f.close)
+    return {"path": path, "size": size, "sha256": digest.hexdigest()}
+
+
+def _hold(path: str) -> None:
+    """持有暂存文件的共享锁，标记文件正在被本进程使用"""
+    fd = os.open(path, os.O_RDONLY)
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+    with _held_lock:
+        _held[path] = fd
+
+
+def _release(path: str) -> None:
+    with _held_lock:
+        fd = _held.pop(path, None)
+    if fd is not None:
+        os.close(fd)
+
+
+def spool_in_use(path: str) -> bool:
+    """
+    暂存文件是否仍被某个工作进程使用（持有共享锁）
+
+    Args:
+        path: 暂存文件路径
+
+    Returns:
+        bool: 是否在使用中
+    """
+    with _held_lock:
+        if path in _held:
+            return True
+    if fcntl is None:
+        return False
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return True
+    finally:
+        os.close(fd)
+    return False
+
+
+def remove_spooled(path: Optional[str]) -> None:
+    """删除暂存文件并释放其文件锁，文件不存在时忽略"""
+    if not path:
+        return
+    _release(path)
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除暂存文件失败 {path}: {e}")
+
+
+def cleanup_spool_dir(max_age_seconds: float = 0) -> int:
+    """
+    清理暂存目录中遗留的上传文件，服务启动时调用
+
+    Args:
+        max_age_seconds: 只清理修改时间早于该秒数的文件，0为全部清理
+
+    Returns:
+        int: 删除的文件数
+    """
+    spool_dir = get_spool_dir()
+    now = time.time()
+    removed = 0
+    for name in os.listdir(spool_dir):
+        if not name.endswith(SPOOL_SUFFIX):
+            continue
+        path = os.path.join(spool_dir, name)
+        try:
+            if max_age_seconds and now - os.path.getmtime(path) < max_age_seconds:
+                continue
+            # 其他工作进程正在使用的文件不删除
+            if spool_in_use(path):
+                continue
+            os.unlink(path)
+            removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info(f"已清理 {removed} 个遗留的上传暂存文件")
+    return removed
@@ -0,0 +1,71 @@
+"""
+共享的任务线程池
+REST接口提交的抽取任务与MCP工具调用共用同一个线程池，统一限制并发的抽取数量
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+import backend.config as config
+# 取消标记与llm、unstruct等模块共用，此处保留原有的导入路径
+from backend.utils.cancel_util import CancelFlag, TaskCancelledError
+
+logger = config.setup_logging()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    获取共享线程池，首次调用时按task_max_workers创建
+
+    Returns:
+        ThreadPoolExecutor: 共享线程池
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.settings.task_max_workers,
+                                           thread_name_prefix="extract-worker")
+            logger.info(f"任务线程池已创建，最大并发 {config.settings.task_max_workers}")
+        return _executor
+
+
+def submit(fn: Callable, *args, **kwargs) -> Future:
+    """
+    向共享线程池提交任务
+
+    Args:
+        fn: 任务函数
+        *args: 位置参数
+        **kwargs: 关键字参数
+
+    Returns:
+        Future: 任务的Future
+    """
+    return get_executor().submit(fn, *args, **kwargs)
+
+
+async def run_in_pool(fn: Callable, *args, **kwargs):
+    """
+    在共享线程池中执行阻塞函数并等待结果，不阻塞事件循环
+
+    Args:
+        fn: 阻塞函数
+        *args: 位置参数
+        **kwargs: 关键字参数
+
+    Returns:
+        函数的返回值
+    """
+    return await asyncio.wrap_future(submit(fn, *args, **kwargs))
+
+
+def shutdown(wait: bool = True) -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=not wait)
+            _executor = None
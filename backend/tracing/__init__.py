@@ -0,0 +1,16 @@
+from .tracer import Span, Tracer, tracer, start_span, current_span
+from .exporters import LogJsonExporter, InMemoryExporter, OTLPJsonFileExporter
+from .configure import setup_tracing, get_memory_exporter
+
+__all__ = [
+    "Span",
+    "Tracer",
+    "tracer",
+    "start_span",
+    "current_span",
+    "LogJsonExporter",
+    "InMemoryExporter",
+    "OTLPJsonFileExporter",
+    "setup_tracing",
+    "get_memory_exporter"
+]
@@ -0,0 +1,40 @@
+"""
+按配置注册span导出器
+"""
+from typing import Optional
+
+import backend.config as config
+
+from .exporters import InMemoryExporter, LogJsonExporter, OTLPJsonFileExporter
+from .tracer import tracer
+
+_memory_exporter: Optional[InMemoryExporter] = None
+
+
+def setup_tracing(exporters: Optional[str] = None) -> None:
+    """
+    根据配置重新注册导出器，可重复调用
+
+    Args:
+        exporters: 逗号分隔的导出器名称（log、memory、otlp_file），None时读取settings.trace_exporters，为空则关闭追踪
+    """
+    global _memory_exporter
+    settings = config.settings
+    names = settings.trace_exporters if exporters is None else exporters
+    tracer.clear_exporters()
+    _memory_exporter = None
+    for name in [name.strip() for name in names.split(",") if name.strip()]:
+        if name == "log":
+            tracer.add_exporter(LogJsonExporter())
+        elif name == "memory":
+            _memory_exporter = InMemoryExporter(settings.trace_memory_max_spans)
+            tracer.add_exporter(_memory_exporter)
+        elif name == "otlp_file":
+            tracer.add_exporter(OTLPJsonFileExporter(settings.trace_file))
+        else:
+            raise ValueError(f"未知的span导出器: {name}")
+
+
+def get_memory_exporter() -> Optional[InMemoryExporter]:
+    """获取已注册的内存导出器，未启用时返回None"""
+    return _memory_exporter
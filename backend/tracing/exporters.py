@@ -0,0 +1,128 @@
+"""
+span导出器
+- LogJsonExporter：每个span以一行JSON写入日志
+- InMemoryExporter：保存在内存中，供测试与调试读取
+- OTLPJsonFileExporter：按OpenTelemetry OTLP/JSON格式逐行写入文件，可由OpenTelemetry Collector的otlpjsonfile接收器读取
+"""
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from .tracer import Span
+
+SERVICE_NAME = "medical_guideline_extract"
+
+
+class LogJsonExporter:
+    """以JSON格式写入日志"""
+
+    def __init__(self, logger_name: str = "trace"):
+        self.logger = logging.getLogger(logger_name)
+
+    def export(self, span: Span) -> None:
+        self.logger.info(json.dumps(span.to_dict(), ensure_ascii=False, default=str))
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemoryExporter:
+    """保存在内存中的导出器"""
+
+    def __init__(self, max_spans: Optional[int] = None):
+        """
+        Args:
+            max_spans: 最多保留的span数，超出后丢弃最早的span，None为不限制
+        """
+        self._lock = threading.Lock()
+        self._spans = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def get_finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def get_trace(self, trace_id: str) -> List[Dict]:
+        """
+        获取指定链路的全部span，按开始时间排序
+
+        Args:
+            trace_id: 链路ID
+
+        Returns:
+            List[Dict]: span字典列表
+        """
+        with self._lock:
+            spans = [span for span in self._spans if span.trace_id == trace_id]
+        return [span.to_dict() for span in sorted(spans, key=lambda span: span.start_time)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span: Span) -> Dict:
+    otlp = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(int(span.start_time * 1e9)),
+        "endTimeUnixNano": str(int(span.end_time * 1e9)),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()],
+        # STATUS_CODE_OK=1，STATUS_CODE_ERROR=2
+        "status": {"code": 2, "message": span.status_message} if span.status == "error" else {"code": 1}
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+
+class OTLPJsonFileExporter:
+    """OTLP/JSON文件导出器，每个span一行ExportTraceServiceRequest"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "backend.tracing"},
+                    "spans": [_otlp_span(span)]
+                }]
+            }]
+        }
+        line = json.dumps(request, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,149 @@
+"""
+轻量级链路追踪
+以上下文管理器创建span，记录起止时间、父子关系与属性，结束时交给已注册的导出器
+"""
+import contextvars
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# 当前线程/协程上下文中活动的span
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """一次计时区间"""
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict = dict(attributes or {})
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.status = "ok"
+        self.status_message: Optional[str] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.end_time - self.start_time if self.end_time is not None else None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict) -> None:
+        self.attributes.update(attributes)
+
+    def set_error(self, error: BaseException) -> None:
+        self.status = "error"
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "status": self.status,
+            "status_message": self.status_message,
+            "attributes": self.attributes
+        }
+
+
+class _NoopSpan:
+    """未启用追踪时使用的空span，避免热路径上的开销"""
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict) -> None:
+        pass
+
+    def set_error(self, error: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """span管理与导出"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._exporters: List = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._exporters)
+
+    def add_exporter(self, exporter) -> None:
+        with self._lock:
+            self._exporters = self._exporters + [exporter]
+
+    def remove_exporter(self, exporter) -> None:
+        with self._lock:
+            self._exporters = [e for e in self._exporters if e is not exporter]
+
+    def clear_exporters(self) -> None:
+        with self._lock:
+            exporters, self._exporters = self._exporters, []
+        for exporter in exporters:
+            exporter.shutdown()
+
+    def _export(self, span: Span) -> None:
+        for exporter in self._exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                # 导出失败不影响业务流程
+                pass
+
+    @contextmanager
+    def start_span(self, name: str, **attributes) -> Iterator:
+        """
+        创建span，上下文内新建的span自动作为其子span
+
+        Args:
+            name: span名称
+            **attributes: span属性
+
+        Yields:
+            Span: 当前span，未启用追踪时为空span
+        """
+        if not self._exporters:
+            yield NOOP_SPAN
+            return
+        span = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            span.end_time = time.time()
+            _current_span.reset(token)
+            self._export(span)
+
+
+# 全局追踪器
+tracer = Tracer()
+
+
+def start_span(name: str, **attributes):
+    """在全局追踪器上创建span"""
+    return tracer.start_span(name, **attributes)
+
+
+def current_span():
+    """获取当前上下文中活动的span"""
+    return _current_span.get() or NOOP_SPAN
@@ -1,16 +1,11 @@
 """
 核心内容抽取
 """
-import os
-import json
-import PyPDF2
-import pandas as pd
-import requests
-from backend.llm import chat
+from backend.llm import stream_chat
 from backend.prompt import build_core_prompt
 from typing import Callable, Optional
 import backend.config as config
-from backend.utils import remove_think_tag
+from backend.utils import remove_think_tag, CancelFlag, TaskCancelledError
 
 logger = config.setup_logging()
 
@@ -19,7 +14,8 @@ API_KEY = config.settings.api_key
 API_URL = config.settings.api_url
 MODEL_ID = config.settings.model_id
 
-def extract_info_streaming(core_text, reference, ev_definition, filename, progress_callback: Optional[Callable[[int, str], None]] = None):
+def extract_info_streaming(core_text, reference, ev_definition, filename, progress_callback: Optional[Callable[[int, str], None]] = None, task_id: Optional[str] = None,
+                           cancel_flag: Optional[CancelFlag] = None):
     """
     核心信息抽取
 
@@ -29,42 +25,23 @@ def extract_info_streaming(core_text, reference, ev_definition, filename, progre
         ev_definition: 推荐强度与证据质量定义文本
         filename: 文件名
         progress_callback: 进度回调函数，接收进度百分比和消息
+        task_id: 任务ID，用于用量统计
+        cancel_flag: 所属任务的取消标记，取消时中断流式调用
     """
     prompt = build_core_prompt(core_text, reference, ev_definition)
     logger.info(f"核心内容抽取准备: {filename}")
 
     try:
-        response = chat(prompt)
-        response.raise_for_status()
-
         logger.info(f"核心内容抽取： {filename}")
         logger.info("-" * 50)
-
-        # 累积完整结果的变量
-        full_response = ""
-        # 迭代处理流式响应
-        for line in response.iter_lines():
-            if line:
-                # 解析SSE格式（去除"data:"前缀）
-                line = line.decode('utf-8').lstrip('data: ')
-                if line == '[DONE]':  # 流式结束标记
-                    logger.info("流式响应处理完成")
-                    break
-                try:
-                    chunk = json.loads(line)
-                    # 提取当前片段的内容
-                    content = chunk["choices"][0]["delta"].get("content", "")
-                    if content:
-                        print(content, end='', flush=True)  # 实时打印
-                        full_response += content  # 累积内容
-                except json.JSONDecodeError:
-                    continue
-                except KeyError:
-                    continue
+        # 流式调用并累积完整结果
+        full_response = stream_chat(prompt, "core", filename, task_id, cancel_flag=cancel_flag)
         logger.info("-" * 50)
         response_body = remove_think_tag(full_response)
         logger.info(f"核心内容完成抽取： {filename} ")
         return response_body + "\n"
+    except TaskCancelledError:
+        raise
     except Exception as e:
         logger.error(f"核心内容抽取抛出异常: {e}", exc_info=True)
         raise
@@ -1,16 +1,11 @@
 """
 边缘信息抽取
 """
-import os
-import json
-import PyPDF2
-import pandas as pd
-import requests
-from backend.llm import chat
+from backend.llm import stream_chat
 from backend.prompt import build_others_prompt
 from typing import Callable, Optional
 import backend.config as config
-from backend.utils import remove_think_tag
+from backend.utils import remove_think_tag, CancelFlag, TaskCancelledError
 
 logger = config.setup_logging()
 
@@ -19,7 +14,8 @@ API_KEY = config.settings.api_key
 API_URL = config.settings.api_url
 MODEL_ID = config.settings.model_id
 
-def extract_info_streaming(text: str, filename: str|None = None, progress_callback: Optional[Callable[[int, str], None]] = None):
+def extract_info_streaming(text: str, filename: str|None = None, progress_callback: Optional[Callable[[int, str], None]] = None, task_id: Optional[str] = None,
+                           cancel_flag: Optional[CancelFlag] = None):
     """
     边缘信息抽取
 
@@ -27,6 +23,8 @@ def extract_info_streaming(text: str, filename: str|None = None, progress_callba
         text: 边缘信息文本
         filename: 文件名
         progress_callback: 进度回调函数，接收进度百分比和消息
+        task_id: 任务ID，用于用量统计
+        cancel_flag: 所属任务的取消标记，取消时中断流式调用
     """
     if progress_callback:
         progress_callback(25, f"边缘信息文本抽取开始")
@@ -35,41 +33,17 @@ def extract_info_streaming(text: str, filename: str|None = None, progress_callba
     logger.info(f"边缘信息抽取准备: {filename}")
 
     try:
-        response = chat(prompt)
-        response.raise_for_status()
-
         logger.info(f"开始流式处理 {filename} 的提取结果")
         logger.info("-" * 50)
 
-        # 累积完整结果的变量
-        full_response = ""
-        line_count = 0
-
-        # 迭代处理流式响应
-        for line in response.iter_lines():
-            if line:
-                # 解析SSE格式（去除"data:"前缀）
-                line = line.decode('utf-8').lstrip('data: ')
-                if line == '[DONE]':  # 流式结束标记
-                    logger.info("流式响应处理完成")
-                    break
-                try:
-                    chunk = json.loads(line)
-                    # 提取当前片段的内容
-                    content = chunk["choices"][0]["delta"].get("content", "")
-                    if content:
-                        print(content, end='', flush=True)  # 实时打印
-                        full_response += content  # 累积内容
-                        line_count += 1
-                        # 每处理10行更新一次进度（模拟）
-                        if line_count % 10 == 0 and progress_callback:
-                            progress = min(10 + (line_count // 10), 80)  # 10-80%之间
-                            progress_callback(progress, f"已处理 {line_count} 行响应数据")
-                except json.JSONDecodeError:
-                    continue
-                except KeyError:
-                    continue
+        def on_content(line_count: int):
+            # 每处理10行更新一次进度（模拟）
+            if line_count % 10 == 0 and progress_callback:
+                progress = min(10 + (line_count // 10), 80)  # 10-80%之间
+                progress_callback(progress, f"已处理 {line_count} 行响应数据")
 
+        # 流式调用并累积完整结果
+        full_response = stream_chat(prompt, "edge", filename, task_id, on_content, cancel_flag=cancel_flag)
         logger.info("-" * 50)
         response_body = remove_think_tag(full_response)
         if progress_callback:
@@ -77,6 +51,8 @@ def extract_info_streaming(text: str, filename: str|None = None, progress_callba
         logger.info(f"边缘信息完成抽取： {filename} ")
         return response_body
 
+    except TaskCancelledError:
+        raise
     except Exception as e:
         logger.error(f"边缘信息抽取抛出异常: {e}", exc_info=True)
         raise
@@ -1,9 +1,17 @@
 from .json_util import parse_json_result
 from .common_util import remove_think_tag
 from .common_util import parse_llm_response
+from .common_util import parse_bool
+from .cache_util import LRUCache
+from .cancel_util import CancelFlag, TaskCancelledError, check_cancelled
 
 __all__ = [
     "parse_json_result",
     "remove_think_tag",
-    "parse_llm_response"
+    "parse_llm_response",
+    "parse_bool",
+    "LRUCache",
+    "CancelFlag",
+    "TaskCancelledError",
+    "check_cancelled"
 ]
\ No newline at end of file
@@ -0,0 +1,47 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class LRUCache:
+    """
+    线程安全的LRU缓存，超出容量时淘汰最久未使用的条目
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[object] = None):
+        """
+        读取缓存，命中时将条目移到最近使用的位置
+
+        Args:
+            key: 缓存键
+            default: 未命中时的返回值
+
+        Returns:
+            缓存值或default
+        """
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key: Hashable, value: object) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,80 @@
+import threading
+from typing import Callable, List
+
+
+class TaskCancelledError(Exception):
+    """任务已被取消"""
+
+
+class CancelFlag:
+    """
+    线程间共享的取消标记，工作线程在进度回调、流式分片、阶段与原子之间等检查点调用check；
+    阻塞中的操作（流式连接、排队等待）可注册回调，取消时立即被打断
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                # 回调只用于打断阻塞操作，失败不影响取消本身
+                pass
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self) -> None:
+        """
+        Raises:
+            TaskCancelledError: 已取消时抛出，中断工作线程中的抽取流程
+        """
+        if self._event.is_set():
+            raise TaskCancelledError("任务已取消")
+
+    def wait(self, timeout: float) -> bool:
+        """
+        等待指定时长，期间被取消时提前返回
+
+        Returns:
+            bool: 是否已取消
+        """
+        return self._event.wait(timeout)
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        注册取消时执行的回调，已取消时立即执行
+
+        Args:
+            callback: 回调函数，在调用cancel的线程中执行
+
+        Returns:
+            Callable[[], None]: 注销回调的函数，阻塞操作结束后调用
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+def check_cancelled(cancel_flag: "CancelFlag | None") -> None:
+    """未传入取消标记时不做检查，否则同CancelFlag.check"""
+    if cancel_flag is not None:
+        cancel_flag.check()
@@ -32,4 +32,28 @@ def remove_think_tag(text):
     # 使用正则表达式匹配标签及其内容，并替换为空字符串
     pattern = '<think>.*?</think>'
     result = re.sub(pattern, '', text, flags=re.DOTALL)
-    return result.strip()  # 去除可能的前后空格
\ No newline at end of file
+    return result.strip()  # 去除可能的前后空格
+
+
+def parse_bool(text: str) -> bool:
+    """
+    解析大模型返回的布尔判断结果
+
+    Args:
+        text: 大模型返回的文本，如"True"、"False"、"是"
+
+    Returns:
+        bool: 判断结果
+
+    Raises:
+        ValueError: 无法识别为布尔值
+    """
+    answer = remove_think_tag(text).strip().strip("\"'`。.").strip().lower()
+    if answer in ("true", "yes", "是"):
+        return True
+    if answer in ("false", "no", "否"):
+        return False
+    match = re.search(r"\b(true|false)\b", answer)
+    if match:
+        return match.group(1) == "true"
+    raise ValueError(f"无法将大模型返回解析为布尔值: {text}")